@@ -75,15 +75,15 @@ def main(m=1, g=9.81, l=1, q1=.1, q2=.2, u1=0, u2=0, tend=10., nt=200,
     odesys = SymbolicSys(get_equations(m, g, l))
     tout = np.linspace(0, tend, nt)
     y0 = [q1, q2, u1, u2]
-    xout, yout, info = odesys.integrate(
-        tout, y0, integrator=integrator, **kwargs)
+    result = odesys.integrate(tout, y0, integrator=integrator, **kwargs)
+    xout, yout, info = result
     if verbose:
         print(info)
     if savetxt != 'None':
         np.savetxt(stack_1d_on_left(xout, yout), savetxt)
     if plot:
         import matplotlib.pyplot as plt
-        odesys.plot_result(xout, yout)
+        result.plot()
         if savefig != 'None':
             plt.savefig(savefig, dpi=dpi)
         else:
@@ -19,15 +19,16 @@ def main(y0='1,0', mu=1.0, tend=10., nt=50, savefig='None', plot=False,
     tout = np.linspace(0, tend, nt)
     y0 = list(map(float, y0.split(',')))
     kwargs = dict(eval(kwargs) if kwargs else {})
-    xout, yout, info = odesys.integrate(
-        tout, y0, [mu], integrator=integrator, **kwargs)
+    result = odesys.integrate(tout, y0, [mu], integrator=integrator,
+                              **kwargs)
+    xout, yout, info = result
     if verbose:
         print(info)
     if savetxt != 'None':
         np.savetxt(stack_1d_on_left(xout, yout), savetxt)
     if plot:
         import matplotlib.pyplot as plt
-        odesys.plot_result()
+        result.plot()
         plt.legend()
         if savefig != 'None':
             plt.savefig(savefig, dpi=dpi)
@@ -10,3 +10,4 @@ solvers such as ODEPACK in SciPy, CVode in sundials, GSL or odeint together.
 from __future__ import absolute_import
 
 from .core import OdeSys
+from .results import Result
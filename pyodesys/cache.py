@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed caches, e.g. of the derived expressions and generated
+callbacks of :class:`pyodesys.symbolic.SymbolicSys`: on disk (see its
+``cache`` option) so that a new process can skip the symbolic work, and in
+memory (see its ``registry`` option) so that structurally identical systems
+share their callbacks.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from collections import OrderedDict
+import os
+import pickle
+import tempfile
+import threading
+
+from .util import get_cache_dir
+
+
+class DiskCache(object):
+    """ Size bounded on-disk store of pickled objects.
+
+    When the total size of the entries exceeds ``max_size`` the least
+    recently used entries are removed. Entries are written atomically,
+    i.e. the cache may be shared between processes.
+
+    Parameters
+    ----------
+    path : str (default: 'objects' in :func:`pyodesys.util.get_cache_dir`)
+    max_size : int (default: ``$PYODESYS_CACHE_SIZE`` or 256 MiB)
+        in bytes
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> cache = DiskCache(tempfile.mkdtemp())
+    >>> cache.set('abc', [1, 2])
+    True
+    >>> cache.get('abc')
+    [1, 2]
+    >>> cache.get('def') is None
+    True
+
+    """
+
+    suffix = '.pkl'
+
+    def __init__(self, path=None, max_size=None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'objects')
+        if max_size is None:
+            max_size = int(os.environ.get('PYODESYS_CACHE_SIZE', 2**28))
+        self.path = path
+        self.max_size = max_size
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (type(self).__name__, self.path, self.max_size)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+    def get(self, key, default=None):
+        """ Returns the object stored under ``key`` (or ``default``). """
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as fh:
+                value = pickle.load(fh)
+            os.utime(path, None)  # recently used
+        except (IOError, OSError, EOFError, ValueError, AttributeError,
+                ImportError, pickle.UnpicklingError):
+            return default  # missing, evicted or stale (e.g. other version)
+        return value
+
+    def set(self, key, value):
+        """ Stores ``value`` under ``key``.
+
+        Returns
+        -------
+        False if ``value`` could not be pickled, otherwise True.
+        """
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:  # created by another process
+                pass
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.rename(tmp_path, self._file(key))
+        self.evict()
+        return True
+
+    def _entries(self):
+        """ List of (mtime, size, filename) of the entries. """
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for name in os.listdir(self.path):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:  # removed by another process
+            pass
+
+    def evict(self):
+        """ Removes the least recently used entries exceeding ``max_size``. """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            self._remove(name)
+            total -= size
+
+    def clear(self):
+        """ Removes all entries. """
+        for _, _, name in self._entries():
+            self._remove(name)
+
+
+class MemoryCache(object):
+    """ Size bounded in-process store of shared objects.
+
+    When the total size of the entries (as passed to :meth:`set`, e.g. the
+    number of lambdified expressions) exceeds ``max_size`` the least
+    recently used entries are dropped. Thread safe.
+
+    Parameters
+    ----------
+    max_size : int (default: ``$PYODESYS_REGISTRY_SIZE`` or 100000)
+
+    Attributes
+    ----------
+    hits : int
+    misses : int
+    evictions : int
+    size : int
+        total size of the entries
+
+    Examples
+    --------
+    >>> cache = MemoryCache(max_size=3)
+    >>> cache.set('a', 'A', size=2)
+    True
+    >>> cache.get('a'), cache.get('b')
+    ('A', None)
+    >>> cache.set('b', 'B', size=2)
+    True
+    >>> cache.get('a') is None  # evicted
+    True
+    >>> sorted(cache.stats.items())
+    [('entries', 1), ('evictions', 1), ('hits', 1), ('misses', 2), ('size', 2)]
+
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = int(os.environ.get('PYODESYS_REGISTRY_SIZE', 100000))
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, size), oldest first
+        self._lock = threading.Lock()
+        self.size = self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.max_size)
+
+    def get(self, key, default=None):
+        """ Returns the object stored under ``key`` (or ``default``). """
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = entry  # most recently used
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=1):
+        """ Stores ``value`` under ``key``. """
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """ Removes all entries. """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    @property
+    def stats(self):
+        """ dict with hits, misses, evictions, entries & size """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        evictions=self.evictions, entries=len(self._entries),
+                        size=self.size)
+
+
+registry = MemoryCache()  # default of SymbolicSys' registry option
+
+
+def cached(cache, key, build, dump=None, load=None):
+    """ Result of ``build()``, looked up in (and stored to) ``cache``.
+
+    Parameters
+    ----------
+    cache : :class:`DiskCache` or None
+        None: ``build()`` is always called
+    key : str
+    build : callable
+    dump : callable (optional)
+        converts the result into a picklable entry (None: not cached)
+    load : callable (optional)
+        converts an entry back into the result
+    """
+    if cache is None:
+        return build()
+    entry = cache.get(key)
+    if entry is not None:
+        return entry if load is None else load(entry)
+    result = build()
+    entry = result if dump is None else dump(result)
+    if entry is not None:
+        cache.set(key, entry)
+    return result
@@ -9,12 +9,19 @@ providing a module with two functions named ``integrate_adaptive`` and
 
 from __future__ import absolute_import, division, print_function
 
-import numpy as np
-
+from functools import partial
+import hashlib
+import multiprocessing
 import os
+import pickle
+import threading
+import time
 
-from .util import ensure_3args
+import numpy as np
+
+from .util import ensure_3args, group_columns, _process_pool
 from .plotting import plot_result, plot_phase_plane
+from .results import Result, DenseOutput
 
 
 class OdeSys(object):
@@ -40,9 +47,12 @@ class OdeSys(object):
         dependent variable (x). Signature rhs(x, y[:]) --> f[:] or
         rhs(x, y[:], p[:]) --> f[:] or
     jac: callback
-        Jacobian matrix (dfdy). Required for implicit methods.
+        Jacobian matrix (dfdy). Required for implicit methods. When not
+        given but ``band`` or ``sparsity`` is, it is approximated by finite
+        differences (see Notes).
     dfdx: callback
-        Signature dfdx(x, y[:], p[:]) -> out[:] (used by e.g. GSL)
+        Signature dfdx(x, y[:], p[:]) -> out[:] (used by e.g. GSL),
+        taken to be zero when not given.
     band: tuple of 2 integers or None (default: None)
         If jacobian is banded: number of sub- and super-diagonals
     names: iterable of strings (default: None)
@@ -54,6 +64,28 @@ class OdeSys(object):
         signature: f(x2[:], y2[:, :], params2[:]) -> x1[:], y1[:, :],
         params1[:]
         When modifying: insert at end.
+    f_batch: callback (optional)
+        batched version of ``f``, see Notes. Default: loop over ``f``.
+    jac_batch: callback (optional)
+        batched version of ``jac``, see Notes. Default: loop over ``jac``.
+    dfdx_batch: callback (optional)
+        batched version of ``dfdx``, see Notes. Default: loop over ``dfdx``.
+    fj: callback (optional)
+        Signature fj(x, y[:], p[:]) -> (f[:], jac[:, :], dfdx[:]) evaluating
+        all three in one pass (e.g. sharing common subexpressions), ``dfdx``
+        may be None. Used when an integrator asks for both the jacobian and
+        ``dfdx`` (e.g. GSL).
+    jac_csc: callback (optional)
+        Signature jac_csc(x, y[:], p[:]) -> data[:nnz], the entries of the
+        jacobian in the sparsity pattern (compressed sparse column order).
+    sparsity: pair of arrays (optional)
+        ``(colptrs, rowvals)``: the sparsity pattern (CSC) of the jacobian,
+        used by sparse linear algebra (see :meth:`_integrate_solve_ivp`).
+    jv: callback (optional)
+        Signature jv(x, y[:], v[:], p[:]) -> out[:], the jacobian-vector
+        product (directional derivative of ``f`` along ``v``), used by
+        Krylov (jacobian-free) integrators, e.g.
+        :class:`pyodesys.integrators.RosenbrockKrylov`.
 
     Attributes
     ----------
@@ -61,13 +93,21 @@ class OdeSys(object):
         for evaluating the vector of derivatives
     j_cb : callback
         for evaluating the Jacobian matrix of f
+    f_batch_cb : callback
+        batched version of ``f_cb``
+    j_batch_cb : callback
+        batched version of ``j_cb`` (None if ``j_cb`` is None)
+    dfdx_batch_cb : callback
+        batched version of ``dfdx_cb`` (None if ``dfdx_cb`` is None)
+    fj_cb : callback
+        fused evaluation of ``f``, ``jac`` & ``dfdx`` (or None)
+    j_csc_cb : callback
+        for evaluating the entries of the sparse jacobian (or None)
+    sparsity : pair of arrays or None
+        see ``sparsity`` above
+    jv_cb : callback
+        for evaluating jacobian-vector products (or None)
     names : iterable of strings
-    internal_xout : 1D array of floats
-        internal values of dependent variable before post-processing
-    internal_yout : 2D (or higher) array of floats
-        internal values of dependent variable before post-processing
-    internal_params : 1D array of floats
-        internal parameter values before post-processing
 
     Examples
     --------
@@ -81,15 +121,47 @@ class OdeSys(object):
     -----
     banded jacobians are supported by "scipy" and "cvode" integrators
 
+    In :meth:`integrate_batch` the pre- and post-processors are by default
+    called with arrays carrying a leading batch axis, i.e. processors should
+    index the last axis (e.g. ``y[..., 0]`` rather than ``y[0]``).
+
+    The batched callbacks evaluate N systems in one call (e.g. for use in
+    custom integrators stepping an ensemble). Their signature is
+    ``cb(x, Y[:, :], P[:, :]) -> out``, where ``x`` is a scalar or of shape
+    (N,), ``Y`` has shape (N, ny) and ``P`` has shape (N, nparams) (or is
+    empty). The output has shape (N, ny) for ``f_batch_cb`` and
+    ``dfdx_batch_cb``, and (N, ny, ny) for ``j_batch_cb`` (or
+    (N,) + jac.shape for a banded jacobian).
+
+    Finite difference jacobians (``jac`` not given) evaluate ``f`` once per
+    group of structurally orthogonal columns (see
+    :func:`pyodesys.util.group_columns`), e.g. ``1 + ml + mu`` times for a
+    banded jacobian, rather than once per column. Given ``sparsity`` also
+    ``jac_csc`` is approximated.
+
     """
 
     def __init__(self, f, jac=None, dfdx=None, roots=None, nroots=None,
                  band=None, names=None, pre_processors=None,
-                 post_processors=None):
-        self.f_cb = ensure_3args(f)
-        self.j_cb = ensure_3args(jac) if jac is not None else None
-        self.dfdx_cb = dfdx
-        self.roots_cb = roots
+                 post_processors=None, f_batch=None, jac_batch=None,
+                 dfdx_batch=None, fj=None, jac_csc=None, sparsity=None,
+                 jv=None):
+        if f is not None:  # else: provided by subclass (e.g. SymbolicSys)
+            self.f_cb = ensure_3args(f)
+            if jac is None and (band is not None or sparsity is not None):
+                jac = _FDJacobian(self.f_cb, band, sparsity)
+                if jac_csc is None and sparsity is not None:
+                    jac_csc = jac.data
+            self.j_cb = ensure_3args(jac) if jac is not None else None
+            self.dfdx_cb = dfdx
+            self.f_batch_cb = f_batch or _batch_loop(self.f_cb)
+            self.j_batch_cb = jac_batch or _batch_loop(self.j_cb)
+            self.dfdx_batch_cb = dfdx_batch or _batch_loop(self.dfdx_cb)
+            self.fj_cb = ensure_3args(fj) if fj is not None else None
+            self.roots_cb = roots
+            self.j_csc_cb = ensure_3args(jac_csc) if jac_csc else None
+            self.sparsity = sparsity
+            self.jv_cb = jv
         self.nroots = nroots
         if band is not None:
             if not band[0] >= 0 or not band[1] >= 0:
@@ -190,6 +262,7 @@ class OdeSys(object):
                 - 'gsl': :meth:`_integrate_gsl`
                 - 'odeint': :meth:`_integrate_odeint`
                 - 'cvode':  :meth:`_integrate_cvode`
+                - 'solve_ivp':  :meth:`_integrate_solve_ivp`
 
             See respective method for more information.
             If ``None``: ``os.environ.get('PYODESYS_INTEGRATOR', 'scipy')``
@@ -203,41 +276,514 @@ class OdeSys(object):
             when jacobian is derived at runtime (high computational cost).
         force_predefined: bool (default: False)
             override behaviour of ``len(xout) == 2`` => :meth:`adaptive`
+        dense_output: bool (default: False)
+            Integrate in adaptive mode (from ``xout[0]`` to ``xout[-1]``)
+            and provide a continuous solution (cubic Hermite interpolation
+            between the steps) as ``result.dense_output``, see
+            :class:`pyodesys.results.DenseOutput`. When more than two
+            values are given in ``xout``, ``yout`` is evaluated from the
+            dense output (i.e. the stepper is not constrained by ``xout``).
+            For 'scipy' the default ``name`` is 'dopri5' or 'vode' (BDF)
+            since 'lsoda' does not report its steps.
+        sink: str or array (optional)
+            Where to store ``yout``, either a filename (a ``numpy.memmap``
+            is created, and grown as needed in adaptive mode) or a
+            preallocated array of shape ``(nrows, ny)`` (``nrows`` at least
+            the number of output points). The output is post-processed and
+            written in chunks (see :meth:`integrate_iter`), with 'scipy' the
+            integrator is advanced as the chunks are written so yout is never
+            fully held in memory (other integrators compute the whole
+            internal output first). ``internal_yout`` of the result is not
+            kept unless there are no post-processors, in which case it is
+            the same array as ``yout``.
         \*\*kwargs:
             Additional keyword arguments for ``_integrate_$(integrator)``.
 
         Returns
         -------
-        Length 3 tuple: (xout, yout, info)
+        Instance of :class:`pyodesys.results.Result`, which unpacks as a
+        length 3 tuple: (xout, yout, info)
         xout: array of values of the independent variable
         yout: array of the dependent variable(s) for the different values of x
         info: dict ('nfev' is guaranteed to be a key)
+
+        Notes
+        -----
+        The system object is not modified by this method, i.e. the same
+        instance may be used to integrate from several threads concurrently.
+        """
+        sink = kwargs.pop('sink', None)
+        if sink is not None:
+            return self._integrate_sink(xout, y0, params, sink, **kwargs)
+        dense_output = kwargs.pop('dense_output', False)
+        intern_xout, intern_y0, intern_p = self.pre_process(xout, y0, params)
+        if dense_output:
+            if kwargs.get('force_predefined', False):
+                raise ValueError("dense_output requires adaptive mode")
+            integrator = kwargs.get('integrator', None) or os.environ.get(
+                'PYODESYS_INTEGRATOR', 'scipy')
+            if integrator == 'scipy' and kwargs.get('name', None) is None:
+                # lsoda does not report its steps
+                if self.j_cb is None:
+                    kwargs['name'] = 'dopri5'
+                else:
+                    kwargs['name'] = 'vode'
+                    kwargs['method'] = kwargs.get('method', 'bdf')
+            nfo = self._dispatch(intern_xout[[0, -1]], intern_y0, intern_p,
+                                 **kwargs)
+        else:
+            nfo = self._dispatch(intern_xout, intern_y0, intern_p, **kwargs)
+        internal_xout = np.asarray(nfo['internal_xout'], dtype=np.float64)
+        internal_yout = np.asarray(nfo['internal_yout'], dtype=np.float64)
+        dense = None
+        if dense_output:
+            dense = DenseOutput(self, internal_xout, internal_yout, y0,
+                                params, intern_p)
+        if dense_output and len(intern_xout) > 2:
+            xout, yout = np.asarray(xout, dtype=np.float64), dense(xout)
+        else:
+            xout, yout, _ = self.post_process(internal_xout, internal_yout,
+                                              intern_p)
+        return Result(xout, yout, params, nfo, internal_xout, internal_yout,
+                      intern_p, self, dense)
+
+    def integrate_iter(self, xout, y0, params=(), chunk_size=1000, info=None,
+                       **kwargs):
+        """ Integrate the system of ODE's, yielding the output in chunks.
+
+        Parameters
+        ----------
+        xout: array_like or pair (start and final time) or float
+            see :meth:`integrate`
+        y0: array_like
+            see :meth:`integrate`
+        params: array_like (default: tuple())
+            see :meth:`integrate`
+        chunk_size: int (default: 1000)
+            maximum number of rows in each yielded chunk
+        info: dict (optional)
+            updated with information from the integrator (see
+            :meth:`integrate`) once the generator is exhausted.
+        \*\*kwargs:
+            see :meth:`integrate`
+
+        Yields
+        ------
+        Length 2 tuples: (x_chunk, y_chunk) of post-processed output.
+
+        Notes
+        -----
+        Integrators providing a ``_iter_$(integrator)`` method (currently
+        'scipy') are advanced as the chunks are consumed, i.e. memory use
+        is bounded by ``chunk_size``. For other integrators the whole
+        integration is done before the first chunk is yielded. In adaptive
+        mode scipy's 'dopri5' & 'dop853' are interrupted once a chunk is
+        full and then restarted (i.e. the steps taken depend somewhat on
+        ``chunk_size``).
+
+        Examples
+        --------
+        >>> odesys = OdeSys(lambda x, y, p: [-p[0]*y[0]])
+        >>> for x, y in odesys.integrate_iter([0, 1], [1], [2], chunk_size=3):
+        ...     pass  # e.g. append to a file
+        >>> y.shape[1], y.shape[0] <= 3
+        (1, True)
+
         """
-        intern_xout, intern_y0, self.internal_params = self.pre_process(
-            xout, y0, params)
-        integrator = kwargs.pop('integrator', None)
+        intern_xout, intern_y0, intern_p = self.pre_process(xout, y0, params)
+        nfo = {}
+        for internal_xout, internal_yout in self._iter_internal(
+                intern_xout, intern_y0, intern_p, nfo, chunk_size, **kwargs):
+            x, y, _ = self.post_process(internal_xout, internal_yout,
+                                        intern_p)
+            yield x, y
+        if info is not None:
+            info.update(nfo)
+
+    def _iter_internal(self, intern_xout, intern_y0, intern_p, info,
+                       chunk_size, integrator=None, **kwargs):
+        if integrator is None:
+            integrator = os.environ.get('PYODESYS_INTEGRATOR', 'scipy')
+        iter_cb = getattr(self, '_iter_' + integrator, None) if isinstance(
+            integrator, str) else None
+        if iter_cb is None:
+            info.update(self._dispatch(intern_xout, intern_y0, intern_p,
+                                       integrator, **kwargs))
+            return _chunks(info.pop('internal_xout'),
+                           info.pop('internal_yout'), chunk_size)
+        return iter_cb(intern_xout, intern_y0, intern_p, info, chunk_size,
+                       **kwargs)
+
+    def _integrate_sink(self, xout, y0, params, sink, chunk_size=1024,
+                        **kwargs):
+        intern_xout, intern_y0, intern_p = self.pre_process(xout, y0, params)
+        adaptive = len(intern_xout) == 2 and not kwargs.get(
+            'force_predefined', False)
+        rows, nfo, xchunks, internal_xchunks = None, {}, [], []
+        for internal_xout, internal_yout in self._iter_internal(
+                intern_xout, intern_y0, intern_p, nfo, chunk_size, **kwargs):
+            x, y, _ = self.post_process(internal_xout, internal_yout,
+                                        intern_p)
+            y = np.asarray(y)
+            if rows is None:  # post-processed width (may differ from ny)
+                rows = _RowSink(sink, y.shape[1], None if adaptive else
+                                len(intern_xout), chunk_size)
+            rows.write(y)
+            xchunks.append(np.atleast_1d(x))
+            internal_xchunks.append(internal_xout)
+        yout = rows.finalize()
+        return Result(np.concatenate(xchunks), yout, params, nfo,
+                      np.concatenate(internal_xchunks),
+                      None if self.post_processors else yout, intern_p, self)
+
+    def pre_process_batch(self, xout, Y0, P=(), vectorized_processors=True):
+        """ Transforms a batch of inputs to internal values.
+
+        The returned arrays are stacked along a leading axis of length
+        ``n`` (the number of runs): ``(n, nx)``, ``(n, ny)`` and
+        ``(n, nparams)``.
+        """
+        Y0 = np.asarray(Y0, dtype=np.float64)
+        P = np.asarray(P, dtype=np.float64)
+        n = max(Y0.shape[0] if Y0.ndim == 2 else 1,
+                P.shape[0] if P.ndim == 2 else 1)
+        Y0 = np.broadcast_to(Y0, (n, Y0.shape[-1]))
+        P = np.broadcast_to(P, (n, P.shape[-1] if P.ndim > 0 else 0))
+        if not vectorized_processors:
+            intern = [self.pre_process(xout, y0, p) for y0, p in zip(Y0, P)]
+            return tuple(np.array(arr) for arr in zip(*intern))
+
+        try:
+            nx = len(xout)
+            if nx == 1:
+                xout = (0*xout[0], xout[0])
+        except TypeError:
+            xout = (0*xout, xout)
+        xout = np.asarray(xout, dtype=np.float64)
+        X = np.broadcast_to(xout, (n, xout.size))
+        for pre_processor in self.pre_processors:
+            X, Y0, P = pre_processor(X, Y0, P)
+        X, Y0, P = map(np.asarray, (X, Y0, P))
+        return (np.array(np.broadcast_to(X, (n, X.shape[-1]))),
+                np.array(np.broadcast_to(Y0, (n, Y0.shape[-1]))),
+                np.array(np.broadcast_to(
+                    P, (n, P.shape[-1] if P.ndim > 0 else 0))))
+
+    def post_process_batch(self, X, Yout, P, vectorized_processors=True):
+        """ Transforms a batch of internal values to output.
+
+        ``X``, ``Yout`` and ``P`` carry a leading axis of length ``n``.
+        """
+        if not vectorized_processors:
+            out = [self.post_process(x, y, p) for x, y, p in zip(X, Yout, P)]
+            return tuple(np.array(arr) for arr in zip(*out))
+        return self.post_process(X, Yout, P)
+
+    def integrate_batch(self, xout, Y0, P=(), vectorized_processors=True,
+                        executor=None, nworkers=None, chunksize=None,
+                        **kwargs):
+        """ Integrate the system for a batch of initial values & parameters.
+
+        All runs report the solution at the same (user given) values
+        of the independent variable, i.e. the integration is always done
+        in predefined mode (see :meth:`predefined`).
+
+        Parameters
+        ----------
+        xout: array_like or float
+            see :meth:`integrate`
+        Y0: array_like
+            2D array of initial values, shape ``(n, ny)`` (``n > 0``,
+            empty batches raise ``ValueError``). A 1D array is broadcast
+            against ``P``.
+        P: array_like (default: tuple())
+            2D array of parameter values, shape ``(n, nparams)``. A 1D array
+            is used for all runs.
+        vectorized_processors: bool (default: True)
+            When ``True`` the pre- and post-processors are called once with
+            the whole batch: arrays with a leading axis of length ``n``
+            (processors need to index the last axis, e.g. ``y[..., 0]``).
+            When ``False`` the processors are called once for every run.
+        executor: None, str or ``concurrent.futures.Executor`` instance
+            How to distribute the runs:
+                - None: all runs in the calling thread. If ``integrator``
+                  has a ``integrate_predefined_batch`` method (e.g.
+                  :class:`pyodesys.integrators.DormandPrince54`) the whole
+                  ensemble is integrated at once using the batched
+                  callbacks (see Notes in :class:`OdeSys`).
+                - 'thread': ``nworkers`` threads (suitable for integrators
+                  releasing the GIL, e.g. 'cvode', 'gsl' & 'odeint'). The
+                  output is written into preallocated arrays and
+                  ``info['throughput']`` (runs per second for each thread)
+                  and ``info['worker']`` (thread index of each run) are
+                  reported.
+                - 'process': a new ``ProcessPoolExecutor`` is used, its
+                  workers are started with 'spawn' (i.e. a calling script
+                  needs an ``if __name__ == '__main__':`` guard).
+                - ``Executor`` instance: e.g. a reused process pool (prefer
+                  'spawn' or 'forkserver' over 'fork' as start method).
+
+            When using processes the (internal) system needs to be picklable
+            (see :meth:`_worker_recipe`), it is rebuilt once per worker
+            process and cached there.
+        nworkers: int (default: None)
+            Number of workers (default: number of CPUs).
+        chunksize: int (default: None)
+            Number of runs handed to a worker at a time
+            (default: ``n // (4*nworkers)``, at least 1).
+        \*\*kwargs:
+            see :meth:`integrate`
+
+        Returns
+        -------
+        Length 3 tuple: (xout, yout, info)
+        xout: 2D array of shape ``(n, nx)``
+        yout: 3D array of shape ``(n, nx, ny)``
+        info: dict with arrays of per run values (e.g. ``info['nfev']``),
+            ``info['internal_xout']`` and ``info['internal_yout']`` are
+            stacked in the same manner as ``xout`` and ``yout``.
+
+        Examples
+        --------
+        >>> odesys = OdeSys(lambda x, y, p: [-p[0]*y[0]])
+        >>> xout, yout, info = odesys.integrate_batch(
+        ...     [0, 1, 2], [[1], [2]], [[1], [2]])
+        >>> yout.shape, info['success'].tolist()
+        ((2, 3, 1), [True, True])
+
+        """
+        if kwargs.get('force_predefined', True) is False:
+            raise ValueError("integrate_batch requires predefined mode")
+        if any(np.ndim(arr) == 2 and len(arr) == 0 for arr in (Y0, P)):
+            raise ValueError("Empty batch (no rows in Y0 or P)")
+        kwargs['force_predefined'] = True
+        intern_X, intern_Y0, intern_P = self.pre_process_batch(
+            xout, Y0, P, vectorized_processors)
+        integrator = kwargs.get('integrator', None)
+        if executor is None and getattr(integrator,
+                                        'integrate_predefined_batch', None):
+            info = self._integrate_batched(intern_X, intern_Y0, intern_P,
+                                           **kwargs)
+        elif executor is None:
+            info = _stack_infos(self._integrate_chunk(
+                intern_X, intern_Y0, intern_P, **kwargs))
+        elif executor == 'thread':
+            info = self._integrate_chunks_threads(
+                nworkers, chunksize, intern_X, intern_Y0, intern_P, **kwargs)
+        else:
+            info = _stack_infos(self._integrate_chunks_pool(
+                executor, nworkers, chunksize, intern_X, intern_Y0, intern_P,
+                **kwargs))
+        xout, yout, _ = self.post_process_batch(
+            info['internal_xout'], info['internal_yout'], intern_P,
+            vectorized_processors)
+        return np.asarray(xout), np.asarray(yout), info
+
+    def _integrate_batched(self, intern_X, intern_Y0, intern_P, integrator,
+                           atol=1e-8, rtol=1e-8, first_step=None,
+                           with_jacobian=None, force_predefined=True,
+                           **kwargs):
+        """ Integrate the whole batch with an ensemble integrator.
+
+        ``integrator`` provides ``integrate_predefined_batch`` (e.g.
+        :class:`pyodesys.integrators.DormandPrince54`) which is called
+        with the batched callbacks (see Notes in :class:`OdeSys`) taking
+        the indices of the members being evaluated as last argument.
+        """
+        if first_step is None:
+            first_step = 1e-14 + np.abs(intern_X[:, 0])*1e-14
+        if with_jacobian is None:
+            with_jacobian = getattr(integrator, 'with_jacobian', False)
+
+        def _f(x, Y, Fout, idx):
+            Fout[...] = self.f_batch_cb(x, Y, intern_P[idx])
+
+        if with_jacobian:
+            def _j(x, Y, Jout, idx, dfdx_out=None):
+                jmat = self.j_batch_cb(x, Y, intern_P[idx])
+                if self.band is not None:
+                    jmat = _dense_banded(jmat, *self.band)
+                Jout[...] = jmat
+                if dfdx_out is None:
+                    pass
+                elif self.dfdx_batch_cb is None:
+                    dfdx_out[...] = 0
+                else:
+                    dfdx_out[...] = self.dfdx_batch_cb(x, Y, intern_P[idx])
+        else:
+            _j = None
+
+        yout, info = integrator.integrate_predefined_batch(
+            _f, _j, intern_Y0, intern_X, dx0=first_step, atol=atol,
+            rtol=rtol, **kwargs)
+        info['internal_xout'] = intern_X
+        info['internal_yout'] = yout
+        return info
+
+    def _integrate_chunk(self, intern_X, intern_Y0, intern_P, **kwargs):
+        return [self._dispatch(intern_xout, intern_y0, intern_p, **kwargs)
+                for intern_xout, intern_y0, intern_p in zip(
+                    intern_X, intern_Y0, intern_P)]
+
+    def _integrate_chunks_threads(self, nworkers, chunksize, intern_X,
+                                  intern_Y0, intern_P, **kwargs):
+        n, nx = intern_X.shape
+        nworkers, chunksize = _nworkers_chunksize(nworkers, chunksize, n)
+        starts = iter(range(0, n, chunksize))
+        lock = threading.Lock()
+        infos, errors = [None]*n, []
+        out_x = np.empty((n, nx))
+        out_y = np.empty((n, nx, intern_Y0.shape[-1]))
+        worker = np.empty(n, dtype=int)
+        nruns, elapsed = np.zeros(nworkers), np.zeros(nworkers)
+
+        def work(widx):
+            while not errors:
+                with lock:
+                    start = next(starts, None)
+                if start is None:
+                    return
+                t0 = time.time()
+                try:
+                    for idx in range(start, min(start + chunksize, n)):
+                        nfo = self._dispatch(intern_X[idx], intern_Y0[idx],
+                                             intern_P[idx], **kwargs)
+                        out_x[idx, ...] = nfo.pop('internal_xout')
+                        out_y[idx, ...] = nfo.pop('internal_yout')
+                        infos[idx] = nfo
+                        worker[idx] = widx
+                        nruns[widx] += 1
+                except Exception as exc:
+                    errors.append(exc)
+                elapsed[widx] += time.time() - t0
+
+        threads = [threading.Thread(target=work, args=(widx,))
+                   for widx in range(nworkers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        info = _stack_infos(infos)
+        info['internal_xout'], info['internal_yout'] = out_x, out_y
+        info['worker'] = worker
+        info['throughput'] = nruns/np.where(elapsed > 0, elapsed, np.inf)
+        return info
+
+    def _integrate_chunks_pool(self, executor, nworkers, chunksize,
+                               intern_X, intern_Y0, intern_P, **kwargs):
+        n = intern_X.shape[0]
+        nworkers, chunksize = _nworkers_chunksize(nworkers, chunksize, n)
+        if executor == 'process':
+            with _process_pool(nworkers) as pool:
+                return self._integrate_chunks_pool(
+                    pool, nworkers, chunksize, intern_X, intern_Y0,
+                    intern_P, **kwargs)
+        elif isinstance(executor, str):
+            raise ValueError("Unknown executor: %s" % executor)
+
+        key, recipe = self._worker_recipe()
+        futures = [executor.submit(
+            _integrate_chunk_in_worker, key, recipe,
+            intern_X[i:i+chunksize], intern_Y0[i:i+chunksize],
+            intern_P[i:i+chunksize], kwargs) for i in range(0, n, chunksize)]
+        infos = []
+        for future in futures:
+            infos.extend(future.result())
+        return infos
+
+    def _worker_recipe(self):
+        """ Picklable representation of the internal system.
+
+        Returns a pair ``(key, recipe)`` where ``recipe()`` creates an
+        instance (without pre-/post-processors) for use in worker processes
+        and ``key`` identifies it in the per-process cache (a hash of the
+        pickled recipe). The callbacks need to be picklable (e.g. functions
+        defined at module level).
+        """
+        recipe = partial(
+            OdeSys, self.f_cb, self.j_cb, self.dfdx_cb, self.roots_cb,
+            self.nroots, self.band, fj=self.fj_cb, jac_csc=self.j_csc_cb,
+            sparsity=self.sparsity, jv=self.jv_cb)
+        return hashlib.sha1(pickle.dumps(recipe)).hexdigest(), recipe
+
+    def _inplace_callback(self, name, params):
+        """ Callback with ``params`` bound, writing into given arrays.
+
+        Parameters
+        ----------
+        name: str
+            one of 'f', 'j', 'dfdx', 'roots', 'fj', 'j_csc' & 'jv' (see
+            ``self.f_cb`` etc.), the latter gives ``cb(x, y, v, out)``
+        params: array_like
+
+        Returns
+        -------
+        ``cb(x, y, out)`` (``cb(x, y, fout, jout, dfdx_out)`` for 'fj', where
+        ``fout`` & ``dfdx_out`` may be None) or None if not available.
+
+        Notes
+        -----
+        Called once per integration, subclasses override this to avoid
+        (some of the) allocations in every call (see
+        :class:`pyodesys.symbolic.SymbolicSys`).
+        """
+        cb = getattr(self, name + '_cb')
+        if cb is None:
+            return None
+        if len(params) > 0 or name in ('f', 'j', 'fj', 'j_csc'):
+            # see ensure_3args
+            args = (params,)
+        else:
+            args = ()
+        if name == 'fj':
+            def inplace(x, y, fout, jout, dfdx_out):
+                f, j, dfdx = cb(x, y, *args)
+                if fout is not None:
+                    fout[...] = f
+                jout[...] = j
+                if dfdx_out is not None:
+                    dfdx_out[...] = 0 if dfdx is None else dfdx
+        elif name == 'jv':
+            def inplace(x, y, v, out):
+                out[...] = cb(x, y, v, params)
+        else:
+            def inplace(x, y, out):
+                out[...] = cb(x, y, *args)
+        return inplace
+
+    def _dispatch(self, intern_xout, intern_y0, intern_p, integrator=None,
+                  **kwargs):
         if integrator is None:
             integrator = os.environ.get('PYODESYS_INTEGRATOR', 'scipy')
         if isinstance(integrator, str):
-            nfo = getattr(self, '_integrate_' + integrator)(
-                intern_xout, intern_y0, **kwargs)
+            return getattr(self, '_integrate_' + integrator)(
+                intern_xout, intern_y0, intern_p, **kwargs)
         else:
             kwargs['with_jacobian'] = getattr(integrator,
                                               'with_jacobian', None)
-            nfo = self._integrate(integrator.integrate_adaptive,
-                                  integrator.integrate_predefined,
-                                  intern_xout, intern_y0, **kwargs)
-
-        self.internal_xout = np.asarray(
-            nfo['internal_xout'], dtype=np.float64).copy()
-        self.internal_yout = np.asarray(
-            nfo['internal_yout'], dtype=np.float64).copy()
-        return self.post_process(nfo['internal_xout'], nfo['internal_yout'],
-                                 self.internal_params)[:2] + (nfo,)
-
-    def _integrate_scipy(self, intern_xout, intern_y0, atol=1e-8, rtol=1e-8,
-                         first_step=None, with_jacobian=None,
-                         force_predefined=False, name=None, **kwargs):
+            if getattr(integrator, 'with_jv', False):
+                self._jv_kwargs(kwargs, intern_p)
+            return self._integrate(integrator.integrate_adaptive,
+                                   integrator.integrate_predefined,
+                                   intern_xout, intern_y0, intern_p,
+                                   expand_band=True, **kwargs)
+
+    def _jv_kwargs(self, kwargs, intern_p):
+        """ Callbacks for Krylov integrators (``with_jv``): ``jv``, ``dfdx``
+        & the ``preconditioner`` with the parameters bound. """
+        kwargs['jv'] = self._inplace_callback('jv', intern_p)
+        kwargs['dfdx'] = self._inplace_callback('dfdx', intern_p)
+        preconditioner = kwargs.get('preconditioner', None)
+        if preconditioner is not None:
+            kwargs['preconditioner'] = partial(_bind_params, preconditioner,
+                                               intern_p)
+
+    def _integrate_scipy(self, intern_xout, intern_y0, intern_p,
+                         atol=1e-8, rtol=1e-8, first_step=None,
+                         with_jacobian=None, force_predefined=False,
+                         name=None, **kwargs):
         """ Do not use directly (use ``integrate('scipy', ...)``).
 
         Uses `scipy.integrate.ode <http://docs.scipy.org/doc/scipy/reference/\
@@ -258,6 +804,24 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
         -------
         See :meth:`integrate`
         """
+        info = {}
+        xchunks, ychunks = [], []
+        for xchunk, ychunk in self._iter_scipy(
+                intern_xout, intern_y0, intern_p, info, None, atol, rtol,
+                first_step, with_jacobian, force_predefined, name, **kwargs):
+            xchunks.append(xchunk)
+            ychunks.append(ychunk)
+        info['internal_xout'] = np.concatenate(xchunks)
+        info['internal_yout'] = np.concatenate(ychunks)
+        return info
+
+    def _iter_scipy(self, intern_xout, intern_y0, intern_p, info,
+                    chunk_size=None, atol=1e-8, rtol=1e-8, first_step=None,
+                    with_jacobian=None, force_predefined=False, name=None,
+                    **kwargs):
+        """ Generator of chunks (at most ``chunk_size`` rows) of internal
+        output from :meth:`_integrate_scipy`, ``info`` is updated once
+        exhausted. """
         ny = len(intern_y0)
         nx = len(intern_xout)
         if name is None:
@@ -274,61 +838,102 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
                 with_jacobian = kwargs.get('method', 'adams') == 'bdf'
         from scipy.integrate import ode
 
-        def rhs(t, y, p=()):
+        # scipy copies the returned arrays, the buffers are reused
+        f, fout = self._inplace_callback('f', intern_p), np.empty(ny)
+
+        def rhs(t, y):
             rhs.ncall += 1
-            return self.f_cb(t, y, p)
+            f(t, y, fout)
+            return fout
         rhs.ncall = 0
 
-        if self.j_cb is not None:
-            def jac(t, y, p=()):
+        if with_jacobian and self.j_cb is not None:
+            j = self._inplace_callback('j', intern_p)
+            jout = np.empty((ny, ny) if self.band is None else (
+                1 + sum(self.band), ny))
+
+            def jac(t, y):
                 jac.ncall += 1
-                return self.j_cb(t, y, p)
+                j(t, y, jout)
+                return jout
             jac.ncall = 0
+        else:
+            jac = None
 
-        r = ode(rhs, jac=jac if with_jacobian else None)
+        adaptive = nx == 2 and not force_predefined
+        use_solout = adaptive and name in ('dopri5', 'dop853')
+        r = ode(rhs, jac=jac)
         if 'lband' in kwargs or 'uband' in kwargs or 'band' in kwargs:
             raise ValueError("lband and uband set locally (set `band` at"
                              " initialization instead)")
         if self.band is not None:
             kwargs['lband'], kwargs['uband'] = self.band
         r.set_integrator(name, atol=atol, rtol=rtol, **kwargs)
-        if len(self.internal_params) > 0:
-            r.set_f_params(self.internal_params)
-            r.set_jac_params(self.internal_params)
+        chunk_size = chunk_size or (256 if adaptive else nx)
+        if use_solout:
+            # no step mode, steps are reported through solout which
+            # interrupts the integration (resumed below) once a chunk is full
+            solout_steps = []
+
+            def solout(x, y):
+                solout_steps.append((x, y.copy()))
+                return -1 if len(solout_steps) > chunk_size else 0
+            r.set_solout(solout)
         r.set_initial_value(intern_y0, intern_xout[0])
-        if nx == 2 and not force_predefined:
-            # vode itask 2 (may overshoot)
-            ysteps = [intern_y0]
-            xsteps = [intern_xout[0]]
-            while r.t < intern_xout[1]:
-                r.integrate(intern_xout[1], step=True)
-                if not r.successful():
-                    raise RuntimeError("failed")
-                xsteps.append(r.t)
-                ysteps.append(r.y)
-            yout = np.array(ysteps)
-            intern_xout = np.array(xsteps)
+        if use_solout:
+            def steps():
+                nsteps = kwargs.get('nsteps', 500)  # (re)started runs
+                while True:
+                    r.integrate(intern_xout[1])
+                    chunk = solout_steps[1:]  # first call: initial value
+                    del solout_steps[:]
+                    for x, y in chunk:
+                        yield x, y
+                    nsteps -= len(chunk)
+                    if r.t >= intern_xout[1] or not r.successful():
+                        break
+                    if nsteps <= 0:
+                        raise RuntimeError("failed (larger nsteps needed)")
+        elif adaptive:
+            def steps():  # vode itask 2 (may overshoot)
+                while r.t < intern_xout[1]:
+                    r.integrate(intern_xout[1], step=True)
+                    yield r.t, r.y
         else:
-            yout = np.empty((nx, ny))
-            yout[0, :] = intern_y0
-            for idx in range(1, nx):
-                r.integrate(intern_xout[idx])
+            def steps():
+                for x in intern_xout[1:]:
+                    r.integrate(x)
+                    yield x, r.y
+
+        def rows():
+            yield intern_xout[0], intern_y0
+            for x, y in steps():
                 if not r.successful():
                     raise RuntimeError("failed")
-                yout[idx, :] = r.y
-        info = {
-            'internal_xout': intern_xout,
-            'internal_yout': yout,
-            'success': r.successful(),
-            'nfev': rhs.ncall,
-        }
-        if self.j_cb is not None:
+                yield x, y
+
+        xbuf, ybuf = np.empty(chunk_size), np.empty((chunk_size, ny))
+        nbuf = 0
+        for x, y in rows():
+            xbuf[nbuf], ybuf[nbuf, :] = x, y
+            nbuf += 1
+            if nbuf == chunk_size:
+                yield xbuf, ybuf
+                xbuf, ybuf = np.empty(chunk_size), np.empty((chunk_size, ny))
+                nbuf = 0
+        if nbuf > 0:
+            yield xbuf[:nbuf], ybuf[:nbuf]
+        info['success'] = r.successful()
+        info['nfev'] = rhs.ncall
+        if jac is not None:
             info['njev'] = jac.ncall
-        return info
 
     def _integrate(self, adaptive, predefined, intern_xout, intern_y0,
-                   atol=1e-8, rtol=1e-8, first_step=None, with_jacobian=None,
-                   force_predefined=False, **kwargs):
+                   intern_p, atol=1e-8, rtol=1e-8, first_step=None,
+                   with_jacobian=None, force_predefined=False,
+                   expand_band=False, **kwargs):
+        """ ``expand_band``: hand dense jacobians to the integrator also for
+        banded systems (for integrators without support for packed ones) """
         if first_step is None:
             first_step = 1e-14 + abs(intern_xout[0])*1e-14  # arbitrary, heur.
         nx = len(intern_xout)
@@ -336,38 +941,42 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
                           rtol=rtol, check_indexing=False)
         new_kwargs.update(kwargs)
 
-        def _f(x, y, fout):
-            if len(self.internal_params) > 0:
-                fout[:] = self.f_cb(x, y, self.internal_params)
-            else:
-                fout[:] = self.f_cb(x, y)
-
+        _f = self._inplace_callback('f', intern_p)
         if with_jacobian is None:
             raise ValueError("Need to pass with_jacobian")
         elif with_jacobian is True:
+            j = self._inplace_callback('j', intern_p)
+            dfdx = self._inplace_callback('dfdx', intern_p)
+            fj = self._inplace_callback('fj', intern_p)
+
             def _j(x, y, jout, dfdx_out=None, fy=None):
-                if len(self.internal_params) > 0:
-                    jout[:, :] = self.j_cb(x, y, self.internal_params)
+                if dfdx_out is None:
+                    j(x, y, jout)
+                elif fj is not None:
+                    fj(x, y, None, jout, dfdx_out)
                 else:
-                    jout[:, :] = self.j_cb(x, y)
-                if dfdx_out is not None:
-                    if len(self.internal_params) > 0:
-                        dfdx_out[:] = self.dfdx_cb(x, y, self.internal_params)
+                    j(x, y, jout)
+                    if dfdx is None:
+                        dfdx_out[:] = 0
                     else:
-                        dfdx_out[:] = self.dfdx_cb(x, y)
+                        dfdx(x, y, dfdx_out)
+
+            if expand_band and self.band is not None:
+                _j_packed = _j
+                packed = np.empty((1 + sum(self.band), len(intern_y0)))
+
+                def _j(x, y, jout, dfdx_out=None, fy=None):
+                    _j_packed(x, y, packed, dfdx_out, fy)
+                    jout[...] = _dense_banded(packed, *self.band)
         else:
             _j = None
 
         if self.roots_cb is not None:
-            def _roots(x, y, out):
-                if len(self.internal_params) > 0:
-                    out[:] = self.roots_cb(x, y, self.internal_params)
-                else:
-                    out[:] = self.roots_cb(x, y)
             if 'roots' in new_kwargs:
                 raise ValueError("cannot override roots")
             else:
-                new_kwargs['roots'] = _roots
+                new_kwargs['roots'] = self._inplace_callback('roots',
+                                                             intern_p)
                 if 'nroots' in new_kwargs:
                     raise ValueError("cannot override nroots")
                 new_kwargs['nroots'] = self.nroots
@@ -442,7 +1051,80 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
                                pycvodes.integrate_predefined,
                                *args, **kwargs)
 
-    def _plot(self, cb, internal_xout=None, internal_yout=None,
+    def _integrate_solve_ivp(self, intern_xout, intern_y0, intern_p,
+                             atol=1e-8, rtol=1e-8, first_step=None,
+                             with_jacobian=None, force_predefined=False,
+                             method='BDF', **kwargs):
+        """ Do not use directly (use ``integrate('solve_ivp', ...)``).
+
+        Uses `scipy.integrate.solve_ivp <http://docs.scipy.org/doc/scipy/\
+reference/generated/scipy.integrate.solve_ivp.html>`_. Given a sparse
+        jacobian (``j_csc_cb`` & ``sparsity``) the implicit methods
+        ('BDF' & 'Radau') use ``scipy.sparse.csc_matrix`` jacobians (sparse
+        LU decompositions), given only ``sparsity`` it is passed on as
+        ``jac_sparsity`` (finite differences).
+
+        Parameters
+        ----------
+        \*args:
+            see :meth:`integrate`
+        method: str (default: 'BDF')
+            one of 'RK45', 'RK23', 'DOP853', 'Radau', 'BDF' & 'LSODA'
+        \*\*kwargs:
+            keyword arguments passed onto ``solve_ivp``
+
+        Returns
+        -------
+        See :meth:`integrate`
+        """
+        from scipy.integrate import solve_ivp
+        ny = len(intern_y0)
+        if with_jacobian is None:
+            with_jacobian = method in ('Radau', 'BDF', 'LSODA')
+        f = self._inplace_callback('f', intern_p)
+
+        def rhs(t, y):
+            fout = np.empty(ny)  # may be kept by the stepper
+            f(t, y, fout)
+            return fout
+
+        jac = None
+        sparse = method in ('Radau', 'BDF') and self.sparsity is not None
+        if with_jacobian and sparse and self.j_csc_cb is not None:
+            from scipy.sparse import csc_matrix
+            colptrs, rowvals = self.sparsity
+            j_csc = self._inplace_callback('j_csc', intern_p)
+
+            def jac(t, y):
+                data = np.empty(len(rowvals))
+                j_csc(t, y, data)
+                return csc_matrix((data, rowvals, colptrs), shape=(ny, ny))
+        elif with_jacobian and self.j_cb is not None:
+            j = self._inplace_callback('j', intern_p)
+
+            def jac(t, y):
+                jout = np.empty((ny, ny) if self.band is None else (
+                    1 + sum(self.band), ny))
+                j(t, y, jout)
+                if self.band is None:
+                    return jout
+                return _dense_banded(jout, *self.band)
+        elif with_jacobian and sparse:
+            from scipy.sparse import csc_matrix
+            colptrs, rowvals = self.sparsity
+            kwargs['jac_sparsity'] = csc_matrix(
+                (np.ones(len(rowvals)), rowvals, colptrs), shape=(ny, ny))
+
+        adaptive = len(intern_xout) == 2 and not force_predefined
+        sol = solve_ivp(rhs, (intern_xout[0], intern_xout[-1]), intern_y0,
+                        method=method, t_eval=None if adaptive else
+                        intern_xout, jac=jac, atol=atol, rtol=rtol,
+                        first_step=first_step, **kwargs)
+        return {'success': sol.success, 'message': sol.message,
+                'nfev': sol.nfev, 'njev': sol.njev, 'nlu': sol.nlu,
+                'internal_xout': sol.t, 'internal_yout': sol.y.T}
+
+    def _plot(self, cb, result=None, internal_xout=None, internal_yout=None,
               internal_params=None, **kwargs):
         kwargs = kwargs.copy()
         if 'x' in kwargs or 'y' in kwargs or 'params' in kwargs:
@@ -453,35 +1135,43 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
 
         if 'names' not in kwargs:
             kwargs['names'] = getattr(self, 'names', None)
-        if (internal_xout, internal_yout, internal_params) == (None,)*3:
-            internal_xout = self.internal_xout
-            internal_yout = self.internal_yout
-            internal_params = self.internal_params
-        elif None in (internal_xout, internal_yout, internal_params):
-            raise ValueError("Pass either all or none of internal_* kwargs")
-        return cb(internal_xout, internal_yout, internal_params, **kwargs)
-
-    def plot_result(self, **kwargs):
-        """ Plots the integrated dependent variables from last integration.
-
-        See :func:`pyodesys.plotting.plot_result`
+        internal = (internal_xout, internal_yout, internal_params)
+        if result is not None:
+            if any(arr is not None for arr in internal):
+                raise ValueError("Pass either result or internal_* kwargs")
+            internal = (result.internal_xout, result.internal_yout,
+                        result.internal_params)
+        elif any(arr is None for arr in internal):
+            raise ValueError("Pass either result or all internal_* kwargs")
+        return cb(*internal, **kwargs)
+
+    def plot_result(self, result=None, **kwargs):
+        """ Plots the integrated dependent variables of a result.
+
+        Parameters
+        ----------
+        result: :class:`pyodesys.results.Result`
+            as returned by :meth:`integrate` (alternatively pass
+            ``internal_xout``, ``internal_yout`` & ``internal_params``)
+        \*\*kwargs:
+            See :func:`pyodesys.plotting.plot_result`
         """
-        return self._plot(plot_result, **kwargs)
+        return self._plot(plot_result, result, **kwargs)
 
-    def plot_phase_plane(self, indices=None, **kwargs):
-        """ Plots a phase portrait from last integration.
+    def plot_phase_plane(self, indices=None, result=None, **kwargs):
+        """ Plots a phase portrait of a result.
 
-        See :func:`pyodesys.plotting.plot_phase_plane`
+        See :meth:`plot_result` and :func:`pyodesys.plotting.plot_phase_plane`
         """
-        return self._plot(plot_phase_plane, indices=indices, **kwargs)
+        return self._plot(plot_phase_plane, result, indices=indices, **kwargs)
 
     def _jac_eigenvals_svd(self, xval, yvals, intern_p):
         from scipy.linalg import svd
         J = self.j_cb(xval, yvals, intern_p)
         return svd(J, compute_uv=False)
 
-    def stiffness(self, xyp=None, eigenvals_cb=None):
-        """ Running stiffness ratio from last integration.
+    def stiffness(self, xyp, eigenvals_cb=None):
+        """ Running stiffness ratio of a result.
 
         Calculate sittness ratio, i.e. the ratio between the largest and
         smallest absolute eigenvalue of the jacobian matrix (from SVD).
@@ -490,9 +1180,9 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
 
         Parameters
         ----------
-        xyp: length 3 tuple (default: None)
-            internal_xout, internal_yout, internal_params, taken
-            from last integration if not specified.
+        xyp: :class:`pyodesys.results.Result` or length 3 tuple
+            A result from :meth:`integrate` or a tuple (xout, yout, params)
+            which will be pre-processed.
         eigenvals_cb: callback (optional)
             signature (x, y, p) (internal variables)
 
@@ -502,9 +1192,9 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
                 raise NotImplementedError
             eigenvals_cb = self._jac_eigenvals_svd
 
-        if xyp is None:
-            x, y, intern_p = (self.internal_xout, self.internal_yout,
-                              self.internal_params)
+        if isinstance(xyp, Result):
+            x, y, intern_p = (xyp.internal_xout, xyp.internal_yout,
+                              xyp.internal_params)
         else:
             x, y, intern_p = self.pre_process(*xyp)
 
@@ -514,3 +1204,196 @@ set_integrator.html#scipy.integrate.ode.set_integrator>`_
 
         return (np.abs(singular_values).max(axis=-1) /
                 np.abs(singular_values).min(axis=-1))
+
+
+def _batch_args(x, Y, P):
+    """ Broadcast arguments of a batched callback, see :class:`OdeSys` """
+    Y = np.asarray(Y, dtype=np.float64)
+    N = Y.shape[0]
+    P = np.asarray(P, dtype=np.float64)
+    if P.ndim < 2:
+        P = np.broadcast_to(P.reshape(-1), (N, P.size))
+    return np.broadcast_to(np.asarray(x, dtype=np.float64), (N,)), Y, P
+
+
+def _batch_loop(cb):
+    """ Batched version of ``cb`` calling it once per system """
+    if cb is None:
+        return None
+
+    def batch_cb(x, Y, P=()):
+        X, Y, P = _batch_args(x, Y, P)
+        return np.array([cb(X[idx], Y[idx], P[idx])
+                         for idx in range(Y.shape[0])])
+    return batch_cb
+
+
+def _bind_params(preconditioner, params, x, y, hd):
+    return preconditioner(x, y, params, hd)
+
+
+class _FDJacobian(object):
+    """ Jacobian approximated by forward differences of ``f``, perturbing
+    the columns of a group (see :func:`pyodesys.util.group_columns`)
+    together. Packed (see ``band``) or dense, :meth:`data` gives the
+    entries of ``sparsity`` (CSC order). Buffers are reused per thread.
+    """
+
+    def __init__(self, f, band=None, sparsity=None):
+        self.f = f
+        self.band = band
+        self.sparsity = sparsity
+        self._plans = {}  # ny -> (rowvals, cols, groups, entries)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return self.f, self.band, self.sparsity
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _plan(self, ny):
+        try:
+            return self._plans[ny]
+        except KeyError:
+            pass
+        if self.sparsity is not None:
+            colptrs, rowvals = map(np.asarray, self.sparsity)
+        else:
+            ml, mu = self.band
+            rows = [np.arange(max(0, ci - mu), min(ny, ci + ml + 1))
+                    for ci in range(ny)]
+            colptrs = np.cumsum([0] + [r.size for r in rows])
+            rowvals = np.concatenate(rows)
+        cols = np.repeat(np.arange(ny), np.diff(colptrs))
+        groups = group_columns(colptrs, rowvals, ny)
+        entries = [np.flatnonzero(np.isin(cols, group)) for group in groups]
+        plan = self._plans[ny] = rowvals, cols, groups, entries
+        return plan
+
+    def data(self, x, y, params=()):
+        """ Entries of the sparsity pattern (CSC order) """
+        y = np.asarray(y, dtype=np.float64)
+        rowvals, cols, groups, entries = self._plan(y.size)
+        ytmp = getattr(self._local, 'ytmp', None)
+        if ytmp is None or ytmp.size != y.size:
+            ytmp = self._local.ytmp = np.empty(y.size)
+        f0 = np.asarray(self.f(x, y, params), dtype=np.float64)
+        h = (y + _fd_eps*np.maximum(np.abs(y), 1)) - y  # exact in fp
+        data = np.empty(rowvals.size)
+        for group, idx in zip(groups, entries):
+            ytmp[...] = y
+            ytmp[group] += h[group]
+            df = np.asarray(self.f(x, ytmp, params), dtype=np.float64) - f0
+            data[idx] = df[rowvals[idx]]/h[cols[idx]]
+        return data
+
+    def __call__(self, x, y, params=()):
+        ny = len(y)
+        rowvals, cols = self._plan(ny)[:2]
+        data = self.data(x, y, params)
+        if self.band is None:
+            jmat = np.zeros((ny, ny))
+            jmat[rowvals, cols] = data
+        else:
+            jmat = np.zeros((1 + sum(self.band), ny))
+            jmat[rowvals - cols + self.band[1], cols] = data
+        return jmat
+
+
+_fd_eps = np.sqrt(np.finfo(np.float64).eps)
+
+
+def _dense_banded(packed, ml, mu):
+    """ Dense matrices from (stacked) packed banded ones (see band) """
+    ny = packed.shape[-1]
+    dense = np.zeros(packed.shape[:-2] + (ny, ny))
+    for ri in range(ml + mu + 1):
+        offset = ri - mu
+        ci = np.arange(max(0, -offset), min(ny, ny - offset))
+        dense[..., ci + offset, ci] = packed[..., ri, ci]
+    return dense
+
+
+class _RowSink(object):
+    """ Rows of output written to a (growing) memmap file or a buffer """
+
+    def __init__(self, sink, ncols, nrows=None, chunk_size=1024):
+        self.ncols, self.chunk_size, self.nrows = ncols, chunk_size, 0
+        if isinstance(sink, str):
+            self.filename = sink
+            self.buffer = np.memmap(sink, dtype=np.float64, mode='w+',
+                                    shape=(nrows or chunk_size, ncols))
+        else:
+            self.filename = None
+            self.buffer = sink
+            if sink.ndim != 2 or sink.shape[1] != ncols:
+                raise ValueError("sink needs to be of shape (nrows, %d)" %
+                                 ncols)
+            if nrows is not None and sink.shape[0] < nrows:
+                raise ValueError("sink too small (%d rows)" % nrows)
+
+    def _grow(self, nrows):
+        self.buffer.flush()
+        del self.buffer
+        with open(self.filename, 'r+b') as fh:
+            fh.truncate(nrows*self.ncols*8)
+        self.buffer = np.memmap(self.filename, dtype=np.float64, mode='r+',
+                                shape=(nrows, self.ncols))
+
+    def write(self, rows):
+        stop = self.nrows + len(rows)
+        if stop > self.buffer.shape[0]:
+            if self.filename is None:
+                raise ValueError("sink too small (need more than %d rows)" %
+                                 self.buffer.shape[0])
+            self._grow(max(stop, 2*self.buffer.shape[0]))
+        self.buffer[self.nrows:stop, :] = rows
+        self.nrows = stop
+
+    def finalize(self):
+        if self.filename is None:
+            return self.buffer[:self.nrows]
+        if self.nrows != self.buffer.shape[0]:
+            self._grow(self.nrows)
+        self.buffer.flush()
+        return self.buffer
+
+
+def _chunks(xout, yout, chunk_size):
+    xout, yout = np.asarray(xout), np.asarray(yout)
+    for start in range(0, len(xout), chunk_size):
+        yield xout[start:start+chunk_size], yout[start:start+chunk_size]
+
+
+def _nworkers_chunksize(nworkers, chunksize, n):
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, n // (4*nworkers))
+    return nworkers, chunksize
+
+
+_worker_systems = {}  # populated in worker processes
+
+
+def _integrate_chunk_in_worker(key, recipe, intern_X, intern_Y0, intern_P,
+                               kwargs):
+    if key not in _worker_systems:
+        _worker_systems[key] = recipe()
+    return _worker_systems[key]._integrate_chunk(
+        intern_X, intern_Y0, intern_P, **kwargs)
+
+
+def _stack_infos(infos):
+    """ Merges a list of info dicts into a dict of per-run arrays. """
+    info = {}
+    for key in infos[0]:
+        if not all(key in nfo for nfo in infos):
+            continue
+        vals = [nfo[key] for nfo in infos]
+        try:
+            info[key] = np.array(vals)
+        except ValueError:  # ragged, e.g. root information
+            info[key] = vals
+    return info
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 """
-This module is for demonstration purposes only and the integrators here
-are not meant for production use. Consider them provisional, i.e., API here
-may break without prior deprecation.
+Integrators written in Python (using NumPy). ``RK4_example_integartor`` is
+for demonstration purposes only. :class:`DormandPrince54` integrates whole
+ensembles (see :meth:`pyodesys.OdeSys.integrate_batch`),
+:class:`RosenbrockKrylov` never forms the jacobian. Consider them
+provisional, i.e., API here may break without prior deprecation.
 """
 
+from __future__ import absolute_import, division, print_function
+
 import math
 import numpy as np
 
@@ -50,3 +54,545 @@ class RK4_example_integartor:
             yout.append(y + h/6 * (k[0] + 2*k[1] + 2*k[2] + k[3]))
             x_old = x
         return np.array(yout), {'nfev': (len(xout)-1)*4}
+
+
+class _EnsembleIntegrator:
+    """
+    Base class of integrators advancing an ensemble in lock-step array
+    operations. Every member has its own step size (steps are accepted or
+    rejected member-wise through masking) and members which have reached
+    their last output point are dropped from the working set.
+
+    The batched callbacks take the indices of the members being evaluated
+    as their last argument: ``rhs(x[:], Y[:, :], Fout[:, :], idx[:])`` and
+    ``jac(x[:], Y[:, :], Jout[:, :, :], idx[:], dfdx_out[:, :]=None)``.
+    Subclasses implement ``_init_work``, ``_step`` & ``_update_work``.
+    """
+
+    order = None  # order of the error estimator + 1
+    facmax = 10.0
+    facmin = 0.2
+    dead_band = None  # (low, high) relative step size changes to skip
+
+    @classmethod
+    def integrate_adaptive(cls, rhs, jac, y0, x0, xend, dx0, atol=1e-8,
+                           rtol=1e-8, nsteps=10000, **kwargs):
+        steps = [(x0, np.array(y0, dtype=np.float64))]
+        yout, info = cls._integrate(
+            _single(rhs), _single_jac(jac), [y0], [[x0, xend]], dx0, atol,
+            rtol, nsteps, steps, **kwargs)
+        xout, yout = map(np.array, zip(*steps))
+        return xout, yout, {k: v[0] for k, v in info.items()}
+
+    @classmethod
+    def integrate_predefined(cls, rhs, jac, y0, xout, dx0, atol=1e-8,
+                             rtol=1e-8, nsteps=10000, **kwargs):
+        yout, info = cls._integrate(_single(rhs), _single_jac(jac), [y0],
+                                    [xout], dx0, atol, rtol, nsteps, **kwargs)
+        return yout[0], {k: v[0] for k, v in info.items()}
+
+    @classmethod
+    def integrate_predefined_batch(cls, rhs, jac, Y0, X, dx0, atol=1e-8,
+                                   rtol=1e-8, nsteps=10000, **kwargs):
+        """ Integrate an ensemble.
+
+        Parameters
+        ----------
+        rhs: callable
+            batched right hand side (see class docstring)
+        jac: callable or None
+            batched jacobian (see class docstring)
+        Y0: array_like
+            initial values, shape (N, ny)
+        X: array_like
+            output points for each member, shape (N, nx)
+        dx0: float or array_like
+            initial step size(s)
+        atol, rtol: float or array_like
+            absolute and relative tolerance
+        nsteps: int
+            maximum number of steps (for each member)
+        \*\*kwargs:
+            method specific options
+
+        Returns
+        -------
+        Length 2 tuple: (Yout, info) where ``Yout`` is of shape (N, nx, ny)
+        and info is a dict of arrays of length N. Failed members are
+        flagged in ``info['success']`` and the rest of their output is NaN.
+        """
+        return cls._integrate(rhs, jac, Y0, X, dx0, atol, rtol, nsteps,
+                              **kwargs)
+
+    @classmethod
+    def _integrate(cls, rhs, jac, Y0, X, dx0, atol, rtol, nsteps, steps=None,
+                   **kwargs):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.array(Y0, dtype=np.float64)
+        (N, nx), ny = X.shape, y.shape[1]
+        Yout = np.empty((N, nx, ny))
+        Yout.fill(np.nan)
+        Yout[:, 0, :] = y
+        direction = np.where(X[:, -1] >= X[:, 0], 1.0, -1.0)
+        x = X[:, 0].copy()
+        h = np.abs(np.broadcast_to(np.asarray(dx0, dtype=np.float64),
+                                   (N,))).copy()
+        iout = np.ones(N, dtype=int)
+        naccepted, nrejected = np.zeros(N, dtype=int), np.zeros(N, dtype=int)
+        success = np.ones(N, dtype=bool)
+        act = np.flatnonzero(iout < nx)
+        work = cls._init_work(rhs, jac, x, y, act, atol=atol, rtol=rtol,
+                              **kwargs)
+        while act.size:
+            xa, ya, da = x[act], y[act], direction[act]
+            target = X[act, iout[act]]
+            dist = np.abs(target - xa)
+            hit = h[act] >= dist
+            hs = np.where(hit, dist, h[act])
+            ynew, err, pending = cls._step(rhs, jac, work, act, xa, ya,
+                                           da*hs)
+            scale = atol + rtol*np.maximum(np.abs(ya), np.abs(ynew))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                en = np.sqrt(np.mean((err/scale)**2, axis=1))
+                fac = np.clip(0.9*en**(-1/cls.order), cls.facmin, cls.facmax)
+            fac[~np.isfinite(fac)] = cls.facmin
+            acc = en <= 1  # False for NaN
+            fac[~acc] = np.minimum(fac[~acc], 1.0)
+            if cls.dead_band is not None:
+                fac[acc & (fac >= cls.dead_band[0]) &
+                    (fac <= cls.dead_band[1])] = 1.0
+
+            ia = act[acc]
+            x[ia] = np.where(hit[acc], target[acc], xa[acc] + (da*hs)[acc])
+            y[ia] = ynew[acc]
+            cls._update_work(work, act, acc, en, pending)
+            naccepted[ia] += 1
+            nrejected[act[~acc]] += 1
+            if steps is not None and acc[0]:
+                steps.append((x[0], y[0].copy()))
+            ih = act[acc & hit]
+            Yout[ih, iout[ih], :] = y[ih]
+            iout[ih] += 1
+            # keep previous step size if shortened to hit an output point
+            h[act] = np.where(acc & hit & (hs < h[act]), h[act], hs*fac)
+
+            underflow = xa + da*h[act] == xa
+            exhausted = naccepted[act] + nrejected[act] >= nsteps
+            success[act[underflow | exhausted]] = False
+            act = act[(iout[act] < nx) & success[act]]
+        info = {'n_steps': naccepted, 'n_rejected': nrejected,
+                'success': success}
+        info.update(work['info'])
+        return Yout, info
+
+
+class DormandPrince54(_EnsembleIntegrator):
+    """
+    Explicit Runge-Kutta 5(4) method of Dormand & Prince with error control.
+
+    :meth:`pyodesys.OdeSys.integrate_batch` hands the whole ensemble to
+    :meth:`integrate_predefined_batch` together with the batched callbacks
+    (see :class:`pyodesys.OdeSys`), see :class:`_EnsembleIntegrator`.
+
+    Only suitable for non-stiff problems.
+    """
+
+    with_jacobian = False
+    order = 5
+
+    C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+    A = [np.array(row) for row in (
+        [],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+    )]
+    E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525,
+                  -1/40])
+
+    @classmethod
+    def _init_work(cls, rhs, jac, x, y, act, **kwargs):
+        nfev = np.zeros(x.size, dtype=int)
+        K1 = np.empty(y.shape)  # first same as last
+        if act.size:
+            k1 = np.empty((act.size, y.shape[1]))
+            rhs(x[act], y[act], k1, act)
+            K1[act] = k1
+            nfev[act] += 1
+        return {'K1': K1, 'info': {'nfev': nfev}}
+
+    @classmethod
+    def _step(cls, rhs, jac, work, act, x, y, h):
+        hd = h[:, None]
+        k = [work['K1'][act]]
+        for s in range(1, 7):
+            ys = y + hd*np.tensordot(cls.A[s], k, axes=1)
+            k.append(np.empty_like(y))
+            rhs(x + cls.C[s]*h, ys, k[-1], act)
+        work['info']['nfev'][act] += 6
+        # last stage is evaluated at the 5th order solution
+        return ys, hd*np.tensordot(cls.E, k, axes=1), k[6]
+
+    @staticmethod
+    def _update_work(work, act, acc, en, k7):
+        work['K1'][act[acc]] = k7[acc]
+
+
+class Rosenbrock23(_EnsembleIntegrator):
+    """
+    Linearly implicit (Rosenbrock) W-method of order 3(2) for stiff problems.
+
+    The formula is ``ROS34PW2`` of Rang & Angermann (2005, four stages,
+    L-stable, stiffly accurate, embedded method of order 2). Being a
+    W-method it keeps its order (and that of the error estimate) also
+    with an approximate jacobian, i.e. jacobians may be reused across
+    steps. The stacked jacobians of the ensemble are evaluated in one call
+    and the matrices :math:`W = I - h \\gamma J` are LU factorized (with
+    partial pivoting) in one batched pass over the ensemble. The
+    factorizations are reused for the four stages and, when neither the
+    jacobian nor the step size change, across steps. Step size changes
+    within ``dead_band`` are skipped to allow for reuse.
+
+    Options (keyword arguments): ``jac_reuse`` (default: 5) and
+    ``reuse_tol`` (default: 1.0). A jacobian is reused for up to
+    ``jac_reuse`` steps as long as the scaled error norm of the previous
+    step is below ``reuse_tol`` (i.e. by default it is re-evaluated after a
+    rejected step, unless it is already current). Pass ``jac_reuse=1`` for
+    a fresh jacobian every step. The jacobian callback needs to provide a
+    dense matrix (:class:`pyodesys.OdeSys` expands banded jacobians for
+    it). The factorization & solves loop over the rows (vectorized over
+    the ensemble), i.e. this is meant for many systems of moderate size.
+
+    :meth:`pyodesys.OdeSys.integrate_batch` hands the whole ensemble to
+    :meth:`integrate_predefined_batch` together with the batched callbacks
+    (see :class:`pyodesys.OdeSys`), see :class:`_EnsembleIntegrator`.
+    """
+
+    with_jacobian = True
+    order = 3
+    facmax = 5.0
+    dead_band = (1.0, 1.2)
+
+    gamma = 0.435866521508459
+    A = np.array([
+        [0, 0, 0],
+        [0.87173304301691801, 0, 0],
+        [0.84457060015369423, -0.11299064236484185, 0],
+        [0, 0, 1]
+    ])
+    G = np.array([  # off-diagonal (gamma_ii == gamma)
+        [0, 0, 0],
+        [-0.87173304301691801, 0, 0],
+        [-0.90338057013044082, 0.054180672388095326, 0],
+        [0.24212380706095346, -1.2232505839045147, 0.54526025533510214]
+    ])
+    B = np.array([0.24212380706095346, -1.2232505839045147,
+                  1.5452602553351020, 0.435866521508459])
+    E = B - np.array([0.37810903145819369, -0.096042292212423178, 0.5,
+                      0.21793326075422950])  # B - embedded (order 2)
+    C = A.sum(axis=1)
+    D = gamma + G.sum(axis=1)
+
+    @classmethod
+    def _init_work(cls, rhs, jac, x, y, act, jac_reuse=5, reuse_tol=1.0,
+                   **kwargs):
+        N, ny = y.shape
+        F0 = np.empty(y.shape)
+        xF0 = np.full(N, np.nan)  # where F0 was evaluated
+        nfev, njev, nlu = [np.zeros(N, dtype=int) for _ in range(3)]
+        if act.size:
+            f0 = np.empty((act.size, ny))
+            rhs(x[act], y[act], f0, act)
+            F0[act], xF0[act] = f0, x[act]
+            nfev[act] += 1
+        return {
+            'F0': F0, 'xF0': xF0, 'J': np.empty((N, ny, ny)),
+            'T': np.empty((N, ny)), 'LU': np.empty((N, ny, ny)),
+            'piv': np.zeros((N, ny), dtype=int), 'hW': np.zeros(N),
+            'age': np.full(N, jac_reuse, dtype=int),  # steps since J eval.
+            'jac_reuse': jac_reuse, 'reuse_tol': reuse_tol,
+            'en': np.zeros(N),  # scaled error norm of last step
+            'info': {'nfev': nfev, 'njev': njev, 'n_lu': nlu}
+        }
+
+    @classmethod
+    def _step(cls, rhs, jac, work, act, x, y, h):
+        info = work['info']
+        ny = y.shape[1]
+        age = work['age'][act]
+        need_jac = (age >= work['jac_reuse']) | (
+            (age > 0) & ~(work['en'][act] <= work['reuse_tol']))
+        if np.any(need_jac):
+            ij = act[need_jac]
+            J, T = np.empty((ij.size, ny, ny)), np.empty((ij.size, ny))
+            jac(x[need_jac], y[need_jac], J, ij, T)
+            work['J'][ij], work['T'][ij] = J, T
+            work['age'][ij] = 0
+            info['njev'][ij] += 1
+        need_lu = need_jac | (work['hW'][act] != h)
+        if np.any(need_lu):
+            il = act[need_lu]
+            hg = (h[need_lu]*cls.gamma)[:, None, None]
+            work['LU'][il], work['piv'][il] = _lu_factor(
+                np.eye(ny) - hg*work['J'][il])
+            work['hW'][il] = h[need_lu]
+            info['n_lu'][il] += 1
+        stale = ~(work['xF0'][act] == x)  # F0 is kept after rejections
+        if np.any(stale):
+            i0 = act[stale]
+            f0 = np.empty((i0.size, ny))
+            rhs(x[stale], y[stale], f0, i0)
+            work['F0'][i0], work['xF0'][i0] = f0, x[stale]
+            info['nfev'][i0] += 1
+        LU, piv, J = work['LU'][act], work['piv'][act], work['J'][act]
+        T, hc = work['T'][act], h[:, None]
+        k = []
+        for s in range(4):
+            if s == 0:
+                F = work['F0'][act]
+            else:
+                F = np.empty_like(y)
+                rhs(x + cls.C[s]*h, y + np.tensordot(cls.A[s, :s], k, axes=1),
+                    F, act)
+            b = hc*F + (cls.D[s]*h*h)[:, None]*T
+            if s > 0:
+                b += hc*np.einsum('ijk,ik->ij', J, np.tensordot(
+                    cls.G[s, :s], k, axes=1))
+            k.append(_lu_solve(LU, piv, b))
+        info['nfev'][act] += 3
+        return (y + np.tensordot(cls.B, k, axes=1),
+                np.tensordot(cls.E, k, axes=1), None)
+
+    @staticmethod
+    def _update_work(work, act, acc, en, pending):
+        ia = act[acc]
+        work['xF0'][ia] = np.nan  # y has changed
+        work['age'][ia] += 1
+        work['en'][act] = en
+
+
+class RosenbrockKrylov(_EnsembleIntegrator):
+    """
+    Jacobian-free Rosenbrock method (the ``ode23s`` formula of the MATLAB
+    ODE suite, Shampine & Reichelt 1997) for large stiff problems.
+
+    The linear systems with :math:`W = I - h d J` are solved with
+    (restarted, right preconditioned) GMRES, which only needs products
+    :math:`J v`, i.e. the ``jv`` callback of :class:`pyodesys.OdeSys` (see
+    :meth:`pyodesys.symbolic.SymbolicSys.get_jv_callback`), the jacobian is
+    never formed nor factorized. The residuals of the linear solves are
+    bounded by ``eps_lin`` times the error tolerance.
+
+    Options (keyword arguments): ``preconditioner``, a callable
+    ``preconditioner(x, y, p, hd)`` returning a callable ``psolve(r)``
+    approximating :math:`(I - hd J)^{-1} r` (called once per step, e.g.
+    :meth:`pyodesys.symbolic.SymbolicSys.get_band_preconditioner`),
+    ``eps_lin`` (default: 0.05), ``krylov_dim`` (default: 30, iterations
+    between restarts) and ``max_restarts`` (default: 5). A step whose
+    linear solves do not converge is rejected.
+
+    Integrates one system at a time (i.e. :meth:`OdeSys.integrate_batch`
+    loops over the members).
+    """
+
+    with_jacobian = False
+    with_jv = True
+    integrate_predefined_batch = None  # jv is not batched
+    order = 3
+    facmax = 5.0
+
+    d = 1/(2 + math.sqrt(2))
+    e32 = 6 + math.sqrt(2)
+
+    @classmethod
+    def _init_work(cls, rhs, jac, x, y, act, jv=None, dfdx=None,
+                   preconditioner=None, eps_lin=0.05, krylov_dim=30,
+                   max_restarts=5, atol=1e-8, rtol=1e-8, **kwargs):
+        if jv is None:
+            raise ValueError("RosenbrockKrylov needs jv (see OdeSys)")
+        N, ny = y.shape
+        F0 = np.empty(y.shape)
+        info = dict((k, np.zeros(N, dtype=int)) for k in (
+            'nfev', 'njvev', 'n_lin_iters', 'n_prec_setups'))
+        if act.size:
+            f0 = np.empty((act.size, ny))
+            rhs(x[act], y[act], f0, act)
+            F0[act] = f0
+            info['nfev'][act] += 1
+        return {'F0': F0, 'jv': jv, 'dfdx': dfdx,
+                'preconditioner': preconditioner, 'eps_lin': eps_lin,
+                'krylov_dim': krylov_dim, 'max_restarts': max_restarts,
+                'atol': atol, 'rtol': rtol, 'info': info}
+
+    @classmethod
+    def _step(cls, rhs, jac, work, act, x, y, h):
+        ynew, err, F2 = [np.empty_like(y) for _ in range(3)]
+        for i in range(act.size):
+            ynew[i], err[i], F2[i] = cls._step_member(
+                rhs, work, act[i:i+1], x[i], y[i], h[i])
+        return ynew, err, F2
+
+    @classmethod
+    def _step_member(cls, rhs, work, idx, x, y, h):
+        info, ny = work['info'], y.size
+        hd = h*cls.d
+        jvout = np.empty(ny)
+
+        def f(xs, ys):
+            out = np.empty((1, ny))
+            rhs(np.array([xs]), ys[None, :], out, idx)
+            info['nfev'][idx] += 1
+            return out[0]
+
+        def matvec(v):
+            work['jv'](x, y, v, jvout)
+            info['njvev'][idx] += 1
+            return v - hd*jvout
+
+        psolve = None
+        if work['preconditioner'] is not None:
+            psolve = work['preconditioner'](x, y, hd)
+            info['n_prec_setups'][idx] += 1
+        # error in y from the residual r of the stages: ~ h*r
+        tol = work['eps_lin']*np.linalg.norm(np.broadcast_to(
+            work['atol'] + work['rtol']*np.abs(y), y.shape))/abs(h)
+        converged = [True]
+
+        def solve(b):
+            k, niter, ok = _gmres(matvec, b, psolve, tol, work['krylov_dim'],
+                                  work['max_restarts'])
+            info['n_lin_iters'][idx] += niter
+            converged[0] &= ok
+            return k
+
+        F0 = work['F0'][idx[0]]
+        hdT = 0
+        if work['dfdx'] is not None:
+            hdT = np.empty(ny)
+            work['dfdx'](x, y, hdT)
+            hdT *= hd
+        k1 = solve(F0 + hdT)
+        F1 = f(x + 0.5*h, y + 0.5*h*k1)
+        k2 = solve(F1 - k1) + k1
+        ynew = y + h*k2
+        F2 = f(x + h, ynew)
+        k3 = solve(F2 - cls.e32*(k2 - F1) - 2*(k1 - F0) + hdT)
+        err = h/6*(k1 - 2*k2 + k3)
+        if not converged[0]:
+            err.fill(np.nan)  # rejected (smaller step)
+        return ynew, err, F2
+
+    @staticmethod
+    def _update_work(work, act, acc, en, F2):
+        work['F0'][act[acc]] = F2[acc]
+
+
+def _gmres(matvec, b, psolve, tol, krylov_dim, max_restarts):
+    """ Restarted GMRES (right preconditioned) for ``matvec(x) = b``.
+
+    Returns
+    -------
+    Length 3 tuple: (x, number of iterations, converged)
+    """
+    n = b.size
+    m = min(krylov_dim, n)
+    x = np.zeros(n)
+    r = np.array(b, dtype=np.float64)
+    beta = np.linalg.norm(r)
+    niter = 0
+    for _ in range(max_restarts + 1):
+        if beta <= tol:
+            return x, niter, True
+        V, Z = np.zeros((m + 1, n)), np.zeros((m, n))
+        H = np.zeros((m + 1, m))
+        cs, sn, g = np.zeros(m), np.zeros(m), np.zeros(m + 1)
+        V[0], g[0] = r/beta, beta
+        for j in range(m):
+            Z[j] = V[j] if psolve is None else psolve(V[j])
+            w = matvec(Z[j])
+            niter += 1
+            for i in range(j + 1):  # modified Gram-Schmidt
+                H[i, j] = np.dot(w, V[i])
+                w = w - H[i, j]*V[i]
+            hnext = np.linalg.norm(w)
+            for i in range(j):  # previous Givens rotations
+                H[i, j], H[i+1, j] = (cs[i]*H[i, j] + sn[i]*H[i+1, j],
+                                      cs[i]*H[i+1, j] - sn[i]*H[i, j])
+            denom = math.hypot(H[j, j], hnext)
+            cs[j], sn[j] = (1.0, 0.0) if denom == 0 else (
+                H[j, j]/denom, hnext/denom)
+            H[j, j] = denom
+            g[j+1], g[j] = -sn[j]*g[j], cs[j]*g[j]
+            if hnext == 0 or abs(g[j+1]) <= tol:
+                break
+            V[j+1] = w/hnext
+        k = j + 1
+        coeffs = np.zeros(k)
+        for i in range(k - 1, -1, -1):  # back substitution
+            if H[i, i] != 0:
+                coeffs[i] = (g[i] - np.dot(H[i, i+1:k], coeffs[i+1:]))/H[i, i]
+        x = x + np.dot(coeffs, Z[:k])
+        r = b - matvec(x)
+        beta = np.linalg.norm(r)
+    return x, niter, beta <= tol
+
+
+def _lu_factor(A):
+    """ LU factorizations (partial pivoting) of stacked matrices ``A``
+    (shape (N, n, n)), see :func:`_lu_solve`.
+
+    Returns
+    -------
+    Length 2 tuple: (LU, piv), ``L`` (unit diagonal) & ``U`` are stored in
+    ``LU``, row ``k`` was interchanged with row ``piv[:, k]``.
+    """
+    LU = np.array(A, dtype=np.float64)
+    N, n = LU.shape[:2]
+    piv = np.empty((N, n), dtype=int)
+    rows = np.arange(N)
+    for k in range(n):
+        p = k + np.argmax(np.abs(LU[:, k:, k]), axis=1)
+        piv[:, k] = p
+        LU[rows, k, :], LU[rows, p, :] = LU[rows, p, :], LU[rows, k, :]
+        with np.errstate(divide='ignore', invalid='ignore'):  # singular
+            LU[:, k+1:, k] /= LU[:, k, k, None]
+        LU[:, k+1:, k+1:] -= LU[:, k+1:, k, None]*LU[:, k, None, k+1:]
+    return LU, piv
+
+
+def _lu_solve(LU, piv, b):
+    """ Solves the stacked systems factorized by :func:`_lu_factor` for the
+    right hand sides ``b`` (shape (N, n)). """
+    x = np.array(b, dtype=np.float64)
+    N, n = x.shape
+    rows = np.arange(N)
+    for k in range(n):
+        p = piv[:, k]
+        x[rows, k], x[rows, p] = x[rows, p], x[rows, k]
+    for k in range(n - 1):
+        x[:, k+1:] -= LU[:, k+1:, k]*x[:, k, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(n - 1, -1, -1):
+            x[:, k] /= LU[:, k, k]
+            x[:, :k] -= LU[:, :k, k]*x[:, k, None]
+    return x
+
+
+def _single(rhs):
+    """ Batched version (one member) of a right hand side f(x, y, fout). """
+    def batch_rhs(x, Y, Fout, idx):
+        rhs(x[0], Y[0], Fout[0])
+    return batch_rhs
+
+
+def _single_jac(jac):
+    """ Batched version (one member) of a jacobian callback. """
+    if jac is None:
+        return None
+
+    def batch_jac(x, Y, Jout, idx, dfdx_out=None):
+        jac(x[0], Y[0], Jout[0], None if dfdx_out is None else dfdx_out[0])
+    return batch_jac
@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+Native callbacks for :class:`pyodesys.symbolic.SymbolicSys`.
+
+The expressions (and jacobian, ``dfdx`` & roots) are printed as C code
+(after common subexpression elimination), compiled with the local C
+compiler (``$CC``, default: ``cc``, flags: ``$CFLAGS``, default: ``-O2``)
+into a Python extension module which is cached on disk (in
+``$PYODESYS_CACHE_DIR``, default: ``~/.cache/pyodesys``). The arrays are
+passed through the buffer protocol (no NumPy headers needed), the plain C
+functions are exported as well (``pyodesys_f``, ``pyodesys_f_batch``,
+``pyodesys_jac``, ... e.g. for use with ctypes).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from functools import partial, reduce
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+
+import numpy as np
+
+from .core import _batch_args
+from .symbolic import SymbolicSys, _inplace_fj
+from .util import get_cache_dir
+
+
+_module_template = """
+#include <Python.h>
+#include <math.h>
+
+#if PY_MAJOR_VERSION >= 3
+#define BUF_RO "y*"
+#else
+#define BUF_RO "s*"
+#endif
+
+static int check_len(Py_buffer *buf, Py_ssize_t n, const char *name) {
+    if (buf->len < n*(Py_ssize_t)sizeof(double)) {
+        PyErr_Format(PyExc_ValueError, "%%s too short", name);
+        return 0;
+    }
+    return 1;
+}
+%(functions)s
+static PyMethodDef methods[] = {
+%(methods)s
+    {NULL, NULL, 0, NULL}
+};
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef moduledef = {
+    PyModuleDef_HEAD_INIT, "%(modname)s", NULL, -1, methods
+};
+
+PyMODINIT_FUNC PyInit_%(modname)s(void) {
+    return PyModule_Create(&moduledef);
+}
+#else
+PyMODINIT_FUNC init%(modname)s(void) {
+    Py_InitModule("%(modname)s", methods);
+}
+#endif
+"""
+
+_func_template = """
+void pyodesys_%(name)s(double x, const double * const y,
+                       const double * const p, double * const out)
+{
+%(body)s
+}
+
+void pyodesys_%(name)s_batch(int n, const double * const x,
+                             const double * const y, const double * const p,
+                             double * const out)
+{
+    int i;
+    for (i = 0; i < n; ++i)
+        pyodesys_%(name)s(x[i], y + i*%(ny)d, p + i*%(np)d,
+                          out + i*%(nout)d);
+}
+
+static PyObject * py_%(name)s(PyObject *self, PyObject *args) {
+    double x;
+    Py_buffer y, p, out;
+    int ok;
+    if (!PyArg_ParseTuple(args, "d" BUF_RO BUF_RO "w*", &x, &y, &p, &out))
+        return NULL;
+    ok = (check_len(&y, %(ny)d, "y") && check_len(&p, %(np)d, "p") &&
+          check_len(&out, %(nout)d, "out"));
+    if (ok)
+        pyodesys_%(name)s(x, (const double *)y.buf, (const double *)p.buf,
+                          (double *)out.buf);
+    PyBuffer_Release(&y);
+    PyBuffer_Release(&p);
+    PyBuffer_Release(&out);
+    if (!ok)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject * py_%(name)s_batch(PyObject *self, PyObject *args) {
+    int n, ok;
+    Py_buffer x, y, p, out;
+    if (!PyArg_ParseTuple(args, "i" BUF_RO BUF_RO BUF_RO "w*", &n, &x, &y,
+                          &p, &out))
+        return NULL;
+    ok = (check_len(&x, n, "x") && check_len(&y, n*%(ny)d, "Y") &&
+          check_len(&p, n*%(np)d, "P") && check_len(&out, n*%(nout)d, "out"));
+    if (ok) {
+        Py_BEGIN_ALLOW_THREADS
+        pyodesys_%(name)s_batch(n, (const double *)x.buf,
+                                (const double *)y.buf, (const double *)p.buf,
+                                (double *)out.buf);
+        Py_END_ALLOW_THREADS
+    }
+    PyBuffer_Release(&x);
+    PyBuffer_Release(&y);
+    PyBuffer_Release(&p);
+    PyBuffer_Release(&out);
+    if (!ok)
+        return NULL;
+    Py_RETURN_NONE;
+}
+"""
+
+_method_template = """\
+    {"%(name)s", py_%(name)s, METH_VARARGS, NULL},
+    {"%(name)s_batch", py_%(name)s_batch, METH_VARARGS, NULL},"""
+
+
+def _cse(exprs, subs):
+    """ Common subexpression elimination of the non-zero ``exprs``.
+
+    Returns
+    -------
+    Length 3 tuple: (cses, nonzero indices, reduced exprs).
+    """
+    import sympy as sp
+    exprs = [sp.sympify(expr).xreplace(subs) for expr in exprs]
+    nonzero = [idx for idx, expr in enumerate(exprs) if expr != 0]
+    cses, reduced = sp.cse([exprs[idx] for idx in nonzero],
+                           symbols=sp.numbered_symbols('cse'))
+    return cses, nonzero, reduced
+
+
+def _c_function(name, exprs, x, y, p):
+    """ C source of ``name`` & ``name_batch`` evaluating ``exprs`` """
+    import sympy as sp
+    subs = dict([(yi, sp.Symbol('y[%d]' % i)) for i, yi in enumerate(y)] +
+                [(pi, sp.Symbol('p[%d]' % i)) for i, pi in enumerate(p)])
+    if x is not None:
+        subs[x] = sp.Symbol('x')
+    cses, nonzero, reduced = _cse(exprs, subs)
+    lines = ['    int i;'] + ['    const double %s = %s;' % (
+        sym, sp.ccode(expr)) for sym, expr in cses]
+    if len(nonzero) < len(exprs):  # e.g. sparse jacobian
+        lines.append('    for (i = 0; i < %d; ++i)\n        out[i] = 0;' %
+                     len(exprs))
+    lines += ['    out[%d] = %s;' % (idx, sp.ccode(expr))
+              for idx, expr in zip(nonzero, reduced)]
+    return _func_template % dict(name=name, body='\n'.join(lines),
+                                 ny=len(y), np=len(p), nout=len(exprs))
+
+
+def _ext_suffix():
+    return (sysconfig.get_config_var('EXT_SUFFIX') or
+            sysconfig.get_config_var('SO'))
+
+
+def _load_module(modname, path):
+    if sys.version_info[0] < 3:
+        import imp
+        return imp.load_dynamic(modname, path)
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(modname, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def compile_module(functions):
+    """ Compiles an extension module (cached on disk).
+
+    Parameters
+    ----------
+    functions: dict
+        Mapping of names to C source from :func:`_c_function`.
+
+    Returns
+    -------
+    Length 2 tuple: (module, path).
+    """
+    cc = os.environ.get('CC', 'cc')
+    flags = os.environ.get('CFLAGS', '-O2').split()
+    names = sorted(functions)
+    body = ''.join(functions[name] for name in names)
+    key = hashlib.sha1(repr((body, cc, flags, sys.version)).encode(
+        'utf-8')).hexdigest()
+    modname = 'pyodesys_' + key
+    path = os.path.join(get_cache_dir(), modname + _ext_suffix())
+    if not os.path.exists(path):
+        source = _module_template % dict(
+            functions=body, modname=modname, methods='\n'.join(
+                _method_template % dict(name=name) for name in names))
+        _build(source, path, cc, flags)
+    return _load_module(modname, path), path
+
+
+def _build(source, path, cc, flags):
+    build_dir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    src = os.path.join(build_dir, 'module.c')
+    with open(src, 'wt') as fh:
+        fh.write(source)
+    tmp_path = os.path.join(build_dir, os.path.basename(path))
+    includes = set(sysconfig.get_paths()[k] for k in ('include',
+                                                       'platinclude'))
+    ldflags = ['-undefined', 'dynamic_lookup'] if (
+        sys.platform == 'darwin') else []
+    try:
+        subprocess.check_output(
+            [cc] + flags + ['-I' + inc for inc in includes] + [
+                '-shared', '-fPIC', '-o', tmp_path, src, '-lm'] + ldflags,
+            stderr=subprocess.STDOUT)
+        os.rename(tmp_path, path)  # atomic, concurrent builds are fine
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError("Compilation failed:\n%s" % exc.output.decode(
+            'utf-8', 'replace'))
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+class NativeSys(SymbolicSys):
+    """ SymbolicSys with callbacks compiled to native code.
+
+    The callbacks are evaluated by compiled C functions (see
+    :mod:`pyodesys.native`), they accept an optional ``out`` argument
+    (contiguous array of ``float64``) which is then written in-place
+    (e.g. ``odesys.f_cb(x, y, p, out=fout)``). The batched callbacks (see
+    :class:`pyodesys.OdeSys`) loop over the systems in C (with the GIL
+    released).
+
+    Parameters
+    ----------
+    \*args:
+        See :class:`pyodesys.symbolic.SymbolicSys`
+    \*\*kwargs:
+        See :class:`pyodesys.symbolic.SymbolicSys`
+
+    Attributes
+    ----------
+    module_path : str
+        path to the compiled extension module
+
+    Examples
+    --------
+    >>> import sympy as sp
+    >>> x, y, k = sp.symbols('x y k')
+    >>> odesys = NativeSys([(y, -k*y)], x, [k])  # doctest: +SKIP
+    >>> odesys.f_cb(0, [2], [3])  # doctest: +SKIP
+    array([-6.])
+
+    Notes
+    -----
+    ``scipy.LowLevelCallable`` is not accepted by any of scipy's ODE
+    integrators, the callbacks are therefore exposed as Python functions.
+
+    """
+
+    _native = None
+
+    def _c_functions(self):
+        """ Shapes & C sources of f, jac, dfdx & roots (and fj) """
+        args = (self.indep, self.dep, self.params)
+        exprs = dict(f=self.exprs, jac=self.get_jac(), dfdx=self.get_dfdx(),
+                     roots=self.roots)
+        if self.fused and exprs['jac'] is not False:
+            exprs['fj'] = list(self.exprs) + list(exprs['jac']) + (
+                [] if exprs['dfdx'] is False else list(exprs['dfdx']))
+        shapes, functions = {}, {}
+        for name in ('f', 'jac', 'dfdx', 'roots', 'fj'):
+            if name not in exprs:
+                continue
+            if exprs[name] is None or exprs[name] is False:
+                continue
+            if hasattr(exprs[name], 'shape') and exprs[name].shape[1] != 1:
+                shapes[name] = tuple(exprs[name].shape)
+            else:
+                shapes[name] = (len(exprs[name]),)
+            functions[name] = _c_function(name, list(exprs[name]), *args)
+        return shapes, functions
+
+    def _native_functions(self):
+        """ Compiles (once) f, jac, dfdx & roots into one module. """
+        if self._native is not None:
+            return self._native
+        shapes, functions = self._cached('native', self._c_functions)
+        mod, self._module_path = compile_module(functions)
+        self._native = dict((name, (getattr(mod, name),
+                                    getattr(mod, name + '_batch'), shape))
+                            for name, shape in shapes.items())
+        return self._native
+
+    @property
+    def module_path(self):
+        self._native_functions()  # compiled on first use
+        return self._module_path
+
+    def _get_native_cb(self, name):
+        if name not in self._native_functions():
+            return None
+        cfunc, _, shape = self._native[name]
+
+        def cb(x, y, params=(), out=None):
+            if out is None:
+                out = np.empty(shape)
+            elif out.dtype != np.float64:
+                raise ValueError("out needs to be of dtype float64")
+            cfunc(x, np.ascontiguousarray(y, dtype=np.float64),
+                  np.ascontiguousarray(params, dtype=np.float64), out)
+            return out
+        return cb
+
+    def _get_native_batch_cb(self, name):
+        if name not in self._native_functions():
+            return None
+        _, batch, shape = self._native[name]
+
+        def batch_cb(x, Y, P=(), out=None):
+            X, Y, P = [np.ascontiguousarray(arr) for arr in
+                       _batch_args(x, Y, P)]
+            if out is None:
+                out = np.empty((Y.shape[0],) + shape)
+            elif out.dtype != np.float64:
+                raise ValueError("out needs to be of dtype float64")
+            batch(Y.shape[0], X, Y, P, out)
+            return out
+        return batch_cb
+
+    def get_f_ty_callback(self):
+        return self._get_native_cb('f')
+
+    def get_j_ty_callback(self):
+        return self._get_native_cb('jac')
+
+    def get_dfdx_callback(self):
+        return self._get_native_cb('dfdx')
+
+    def get_roots_callback(self):
+        return self._get_native_cb('roots')
+
+    def _inplace_callback(self, name, params):
+        native_name = 'jac' if name == 'j' else name
+        if native_name not in self._native_functions():
+            # e.g. 'j_csc' (lambdified)
+            return super(NativeSys, self)._inplace_callback(name, params)
+        cfunc, _, shape = self._native[native_name]
+        p = np.ascontiguousarray(params, dtype=np.float64)
+
+        def evaluate(x, y, out):
+            y = np.ascontiguousarray(y, dtype=np.float64)
+            if out.flags.c_contiguous:
+                cfunc(x, y, p, out)
+            else:
+                flat = np.empty(shape)
+                cfunc(x, y, p, flat)
+                out[...] = flat.reshape(out.shape)
+
+        if name != 'fj':
+            return evaluate
+        return _inplace_fj(evaluate, self.ny, self._native['jac'][2],
+                           'dfdx' in self._native)
+
+    def get_fj_callback(self):
+        cb = self._get_native_cb('fj')
+        if cb is None:
+            return None
+        nf, jshape = self.ny, self._native['jac'][2]
+        nj = jshape[0]*jshape[1]
+
+        def fj(x, y, params=()):
+            out = cb(x, y, params)
+            return (out[:nf], out[nf:nf+nj].reshape(jshape),
+                    out[nf+nj:] if 'dfdx' in self._native else None)
+        return fj
+
+    def get_f_ty_batch_callback(self):
+        return self._get_native_batch_cb('f')
+
+    def get_j_ty_batch_callback(self):
+        return self._get_native_batch_cb('jac')
+
+    def get_dfdx_batch_callback(self):
+        return self._get_native_batch_cb('dfdx')
+
+    def _worker_recipe(self):
+        key, recipe = super(NativeSys, self)._worker_recipe()
+        return key + '-native', partial(NativeSys, *recipe.args,
+                                        **recipe.keywords)
+
+
+_numba_template = """\
+# generated by pyodesys.native.NumbaLambdify, do not edit
+import math
+from numba import njit, prange
+
+
+@njit(cache=True)
+def cb(a, out):
+%(body)s
+
+
+@njit(cache=True, parallel=%(parallel)s)
+def cb_batch(A, out):
+    for i in prange(A.shape[0]):
+        cb(A[i, :], out[i, :])
+"""
+
+_numba_modules = {}
+
+
+def _numba_module(source):
+    """ Imports (and caches) a module generated from ``_numba_template``.
+
+    The module is written to :func:`get_cache_dir` so that numba's on-disk
+    cache (``cache=True``) can be reused, e.g. by worker processes.
+    """
+    import numba
+    key = hashlib.sha1(repr((source, numba.__version__)).encode(
+        'utf-8')).hexdigest()
+    if key not in _numba_modules:
+        modname = 'pyodesys_numba_' + key
+        path = os.path.join(get_cache_dir(), modname + '.py')
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(suffix='.py',
+                                            dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wt') as fh:
+                fh.write(source)
+            os.rename(tmp_path, path)
+        if modname not in sys.modules:  # numba's cache imports it by name
+            sys.modules[modname] = _load_module(modname, path)
+        _numba_modules[key] = sys.modules[modname]
+    return _numba_modules[key]
+
+
+class NumbaLambdify(object):
+    """ Callback evaluating ``exprs`` compiled by numba.
+
+    Drop-in replacement for ``sympy.lambdify`` (used by
+    :class:`pyodesys.symbolic.SymbolicSys` when ``$PYODESYS_SYM_BACKEND``
+    is ``numba``). The expressions are printed (after common subexpression
+    elimination) as a Python module in :func:`get_cache_dir` whose
+    functions are compiled with ``numba.njit(cache=True)``, i.e. the JIT
+    compilation is only paid once (also across processes).
+
+    Parameters
+    ----------
+    args : iterable of symbols
+    exprs : iterable of expressions or matrix
+    parallel : bool (default: False)
+        Compile the batched variant with ``parallel=True`` (looping over
+        the systems with ``numba.prange``), e.g. pass
+        ``lambdify=partial(NumbaLambdify, parallel=True)`` to
+        :class:`pyodesys.symbolic.SymbolicSys`. Numba's default threading
+        layer (workqueue, unless tbb is installed) is not fork-safe: once
+        the parallel variant has run, do not use executors forking the
+        process (e.g. a ``ProcessPoolExecutor`` with the 'fork' start
+        method), the parent would hang at exit. The process pools created
+        by pyodesys (``executor='process'``) spawn their workers.
+
+    Attributes
+    ----------
+    inplace : callable
+        ``inplace(a, out)`` with the 1D arrays ``a`` (the arguments) and
+        ``out`` (the flattened expressions).
+    inplace_batch : callable
+        ``inplace_batch(A, out)`` with the 2D arrays ``A`` (one row of
+        arguments per system) and ``out`` (one row per system).
+
+    Examples
+    --------
+    >>> import sympy as sp
+    >>> x, y = sp.symbols('x y')
+    >>> cb = NumbaLambdify([x, y], [x*y, x + y])  # doctest: +SKIP
+    >>> cb(2, 3)  # doctest: +SKIP
+    array([6., 5.])
+
+    """
+
+    def __init__(self, args, exprs, parallel=False):
+        import sympy as sp
+        from sympy.printing.pycode import pycode
+        self.shape = tuple(exprs.shape) if hasattr(exprs, 'shape') else (
+            len(exprs),)
+        self.nargs = len(args)
+        exprs = list(exprs)
+        subs = dict((arg, sp.Symbol('a[%d]' % i)) for i, arg in
+                    enumerate(args))
+        cses, nonzero, reduced = _cse(exprs, subs)
+
+        def code(expr):
+            return pycode(expr, fully_qualified_modules=True)
+        lines = ['    %s = %s' % (sym, code(expr)) for sym, expr in cses]
+        if len(nonzero) < len(exprs):
+            lines.append('    out[:] = 0')
+        lines += ['    out[%d] = %s' % (idx, code(expr))
+                  for idx, expr in zip(nonzero, reduced)]
+        self.source = _numba_template % dict(
+            body='\n'.join(lines or ['    pass']), parallel=bool(parallel))
+        self.nout = len(exprs)
+        self._load()
+
+    def _load(self):
+        mod = _numba_module(self.source)
+        self.inplace, self.inplace_batch = mod.cb, mod.cb_batch
+
+    def __getstate__(self):  # e.g. for pyodesys.cache.DiskCache
+        return dict((k, getattr(self, k)) for k in (
+            'shape', 'nargs', 'nout', 'source'))
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def __call__(self, *args):
+        if len(args) != self.nargs:
+            raise TypeError("Expected %d arguments, got %d" % (
+                self.nargs, len(args)))
+        try:
+            a = np.array(args, dtype=np.float64)
+        except ValueError:  # scalars mixed with arrays
+            a = None
+        if a is not None and a.ndim == 1:
+            out = np.empty(self.nout)
+            self.inplace(a, out)
+            return out.reshape(self.shape)
+        bshape = reduce(lambda shape, arg: np.broadcast(
+            np.empty(shape, dtype=np.bool_), arg).shape, args, ())
+        A = np.empty(bshape + (self.nargs,))
+        for idx, arg in enumerate(args):
+            A[..., idx] = arg
+        A = A.reshape((-1, self.nargs))
+        out = np.empty((A.shape[0], self.nout))
+        self.inplace_batch(A, out)
+        nb = len(bshape)
+        return out.reshape(bshape + self.shape).transpose(
+            tuple(range(nb, nb + len(self.shape))) + tuple(range(nb)))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Result of a numerical integration, see :meth:`pyodesys.OdeSys.integrate`.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+
+class Result(object):
+    """ Immutable record of an integration.
+
+    Instances unpack as the length 3 tuple ``(xout, yout, info)`` for
+    backward compatibility.
+
+    Attributes
+    ----------
+    xout : 1D array of floats
+        values of the independent variable
+    yout : 2D (or higher) array of floats
+        values of the dependent variables
+    params : array_like
+        parameter values passed to :meth:`pyodesys.OdeSys.integrate`
+    info : dict
+        information from the integrator
+    internal_xout : 1D array of floats
+        internal values of independent variable before post-processing
+    internal_yout : 2D (or higher) array of floats
+        internal values of dependent variables before post-processing
+    internal_params : 1D array of floats
+        internal parameter values before post-processing
+    odesys : :class:`pyodesys.OdeSys`
+        the system which was integrated
+    dense_output : :class:`DenseOutput` or None
+        continuous solution (when requested, see
+        :meth:`pyodesys.OdeSys.integrate`)
+
+    Examples
+    --------
+    >>> from pyodesys import OdeSys
+    >>> odesys = OdeSys(lambda x, y, p: [-p[0]*y[0]])
+    >>> result = odesys.integrate([0, 1, 2], [1], [2])
+    >>> xout, yout, info = result
+    >>> result.yout.shape
+    (3, 1)
+
+    """
+
+    __slots__ = ('xout', 'yout', 'params', 'info', 'internal_xout',
+                 'internal_yout', 'internal_params', 'odesys', 'dense_output')
+
+    def __init__(self, xout, yout, params, info, internal_xout, internal_yout,
+                 internal_params, odesys, dense_output=None):
+        for name, value in zip(self.__slots__, (
+                xout, yout, params, info, internal_xout, internal_yout,
+                internal_params, odesys, dense_output)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Result is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Result is immutable")
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, key):
+        return (self.xout, self.yout, self.info)[key]
+
+    def __iter__(self):
+        return iter((self.xout, self.yout, self.info))
+
+    def plot(self, **kwargs):
+        """ See :meth:`pyodesys.OdeSys.plot_result` """
+        return self.odesys.plot_result(self, **kwargs)
+
+    def plot_phase_plane(self, indices=None, **kwargs):
+        """ See :meth:`pyodesys.OdeSys.plot_phase_plane` """
+        return self.odesys.plot_phase_plane(indices, self, **kwargs)
+
+    def stiffness(self, eigenvals_cb=None):
+        """ See :meth:`pyodesys.OdeSys.stiffness` """
+        return self.odesys.stiffness(self, eigenvals_cb)
+
+
+class DenseOutput(object):
+    """ Continuous solution from the steps of an adaptive integration.
+
+    Piecewise cubic Hermite interpolation (using the values and first
+    derivatives at the steps) of the internal dependent variables, the
+    derivatives are evaluated in one call to the batched right hand side
+    (see :class:`pyodesys.OdeSys`).
+
+    Calling an instance with (an array of) values of the independent
+    variable gives the (post-processed) dependent variables.
+
+    Parameters
+    ----------
+    odesys : :class:`pyodesys.OdeSys`
+    internal_xout : 1D array of floats
+        steps of the independent variable (internal values)
+    internal_yout : 2D array of floats
+        dependent variables at the steps (internal values)
+    y0 : array_like
+        initial values (as passed to :meth:`pyodesys.OdeSys.integrate`)
+    params : array_like
+        parameters (as passed to :meth:`pyodesys.OdeSys.integrate`)
+    internal_params : 1D array of floats
+
+    Examples
+    --------
+    >>> from pyodesys import OdeSys
+    >>> odesys = OdeSys(lambda x, y, p: [-p[0]*y[0]])
+    >>> result = odesys.integrate([0, 2], [1], [2], dense_output=True,
+    ...                           atol=1e-10, rtol=1e-10)
+    >>> yout = result.dense_output([0.5, 1.5])
+    >>> np.allclose(yout[:, 0], np.exp([-1, -3]), rtol=1e-4)
+    True
+
+    """
+
+    def __init__(self, odesys, internal_xout, internal_yout, y0, params,
+                 internal_params):
+        from scipy.interpolate import CubicHermiteSpline
+        self.odesys, self.y0, self.params = odesys, y0, params
+        self.internal_params = internal_params
+        dydx = odesys.f_batch_cb(internal_xout, internal_yout,
+                                 internal_params)
+        if internal_xout[-1] < internal_xout[0]:
+            internal_xout, internal_yout, dydx = (
+                internal_xout[::-1], internal_yout[::-1], dydx[::-1])
+        self.interpolant = CubicHermiteSpline(internal_xout, internal_yout,
+                                              dydx, axis=0)
+
+    def __call__(self, x):
+        scalar = np.ndim(x) == 0
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y0, params = self.y0, self.params
+        for pre_processor in self.odesys.pre_processors:
+            x, y0, params = pre_processor(x, y0, params)
+        _, yout, _ = self.odesys.post_process(
+            x, self.interpolant(x), self.internal_params)
+        return yout[0] if scalar else yout
@@ -2,18 +2,58 @@
 
 from __future__ import absolute_import, division, print_function
 
+from functools import partial
+import hashlib
+import inspect
 from itertools import chain, repeat
+import numbers
 import os
+import re
+import sys
+import threading
+import types
 
 import numpy as np
 
-from .core import OdeSys
+from . import cache as _cache
+from .cache import DiskCache, cached
+from .core import OdeSys, _batch_args, _batch_loop
 from .util import (
-    banded_jacobian, transform_exprs_dep,
-    transform_exprs_indep, ensure_3args
+    banded_jacobian, reverse_cuthill_mckee, sparse_jacobian,
+    transform_exprs_dep, transform_exprs_indep, ensure_3args
 )
 
 
+class _SymengineLambdify(object):
+    """ symengine's Lambdify (with CSE) called like :func:`sympy.lambdify`
+
+    Arrays among the (unpacked) arguments are broadcast and the shape of
+    ``exprs`` is put first in the output. Instances are picklable.
+    """
+
+    def __init__(self, args, exprs, **kwargs):
+        import symengine as se
+        if 'cse' not in kwargs:
+            kwargs['cse'] = True
+        self.lambdified = se.Lambdify(args, exprs, **kwargs)
+
+    def __call__(self, *args):
+        try:
+            inp = np.array(args, dtype=np.float64)
+        except ValueError:  # scalars mixed with arrays
+            inp = None
+        if inp is not None and inp.ndim == 1:
+            return self.lambdified(inp)
+        inp = np.stack(np.broadcast_arrays(*args), axis=-1)
+        out = self.lambdified(inp)
+        nb = inp.ndim - 1
+        return np.moveaxis(out, tuple(range(nb)),
+                           tuple(range(out.ndim - nb, out.ndim)))
+
+    def inplace(self, a, out):
+        self.lambdified(a, out=out)
+
+
 def _lambdify(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
     if backend == 'sympy':
@@ -27,6 +67,11 @@ def _lambdify(backend=None):
     elif backend == 'pysym':
         import pysym as ps
         return ps.Lambdify
+    elif backend == 'symengine':
+        return _SymengineLambdify
+    elif backend == 'numba':
+        from .native import NumbaLambdify
+        return NumbaLambdify
     else:
         raise NotImplementedError('Unknown symbolic package: %s' %
                                   backend)
@@ -34,7 +79,7 @@ def _lambdify(backend=None):
 
 def _lambdify_unpack(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
-    if backend == 'sympy':
+    if backend in ('sympy', 'symengine', 'numba'):
         return True
     elif backend == 'pysym':
         return False
@@ -43,11 +88,19 @@ def _lambdify_unpack(backend=None):
                                   backend)
 
 
+def _lambdify_array(backend=None):
+    backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
+    return backend == 'sympy'
+
+
 def _Matrix(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
-    if backend == 'sympy':
+    if backend in ('sympy', 'numba'):  # numba: sympy for symbolics
         import sympy as sp
         return sp.Matrix
+    elif backend == 'symengine':
+        import symengine as se
+        return se.DenseMatrix
     elif backend == 'pysym':
         import pysym as ps
         return ps.Matrix
@@ -58,7 +111,7 @@ def _Matrix(backend=None):
 
 def _Symbol(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
-    if backend == 'sympy':
+    if backend in ('sympy', 'numba'):
         import sympy as sp
 
         def Symbol(*args, **kwargs):
@@ -66,6 +119,12 @@ def _Symbol(backend=None):
                 kwargs['real'] = True
             return sp.Symbol(*args, **kwargs)
         return Symbol
+    elif backend == 'symengine':
+        import symengine as se
+
+        def Symbol(name, real=True):  # symengine has no assumptions
+            return se.Symbol(name)
+        return Symbol
     elif backend == 'pysym':
         import pysym as ps
         return ps.Symbol
@@ -76,9 +135,12 @@ def _Symbol(backend=None):
 
 def _Dummy(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
-    if backend == 'sympy':
+    if backend in ('sympy', 'numba'):
         import sympy as sp
         return sp.Dummy
+    elif backend == 'symengine':
+        import symengine as se
+        return se.Dummy
     elif backend == 'pysym':
         import pysym as ps
         return ps.Dummy
@@ -89,7 +151,7 @@ def _Dummy(backend=None):
 
 def _symarray(backend=None):
     backend = os.environ.get('PYODESYS_SYM_BACKEND', 'sympy')
-    if backend == 'sympy':
+    if backend in ('sympy', 'numba'):
         import sympy as sp
 
         def symarray(prefix, shape, Symbol=None, real=True):
@@ -111,6 +173,16 @@ def _symarray(backend=None):
                 )('%s_%s' % (prefix, '_'.join(map(str, index))))
             return arr
         return symarray
+    elif backend == 'symengine':
+        import symengine as se
+
+        def symarray(prefix, shape, Symbol=None, real=True):
+            arr = np.empty(shape, dtype=object)
+            for index in np.ndindex(shape):
+                arr[index] = (Symbol or se.Symbol)('%s_%s' % (
+                    prefix, '_'.join(map(str, index))))
+            return arr
+        return symarray
     elif backend == 'pysym':
         import pysym as ps
         return ps.symarray
@@ -119,6 +191,128 @@ def _symarray(backend=None):
                                   backend)
 
 
+def _inplace_fj(evaluate, ny, jshape, has_dfdx):
+    """ Splits the output of ``evaluate(x, y, out)`` (f, jac & dfdx
+    flattened) into the arrays passed to ``fj(x, y, fout, jout, dfdx_out)``
+    """
+    nj = jshape[0]*jshape[1]
+    buf = np.empty(ny + nj + (ny if has_dfdx else 0))
+
+    def fj(x, y, fout, jout, dfdx_out):
+        evaluate(x, y, buf)
+        if fout is not None:
+            fout[:] = buf[:ny]
+        jout[...] = buf[ny:ny+nj].reshape(jshape)
+        if dfdx_out is not None:
+            dfdx_out[:] = buf[ny+nj:] if has_dfdx else 0
+    return fj
+
+
+def _insert_params(indices, values, x, y, p):
+    """ Pre-/post-processor inserting (fixed) parameter values """
+    p = np.asarray(p, dtype=np.float64)
+    return x, y, np.insert(p, indices - np.arange(indices.size), values,
+                           axis=-1)
+
+
+def _delete_params(indices, x, y, p):
+    """ Pre-/post-processor removing (fixed) parameter values """
+    return x, y, np.delete(np.asarray(p), indices, axis=-1)
+
+
+def _tolist(arr):
+    """ Elements of lists are faster to access in lambdified code """
+    return arr.tolist() if isinstance(arr, np.ndarray) else arr
+
+
+def _structural_repr(*args):
+    """ Representation of (nested) symbolic data """
+    try:
+        from sympy import srepr
+        return srepr(args)
+    except (ImportError, AttributeError):  # e.g. symengine expressions
+        return str(args)
+
+
+def _number_dummies(rep):
+    """ Dummy symbols in ``rep`` (see :func:`_structural_repr`) numbered by
+    order of appearance """
+    numbers = {}
+    return re.sub(r"Dummy\('[^']*', dummy_index=\d+\)|\b_Dummy_\d+\b",
+                  lambda m: 'Dummy(%d)' % numbers.setdefault(
+                      m.group(0), len(numbers)), rep)
+
+
+def _structural_key(*args):
+    """ Hash of (nested) symbolic data, e.g. for caching of callbacks. """
+    return hashlib.sha1(_structural_repr(*args).encode('utf-8')).hexdigest()
+
+
+def _get_cache(cache):
+    """ :class:`pyodesys.cache.DiskCache` (or None) from the ``cache``
+    option of :class:`SymbolicSys` """
+    if cache is True:
+        return DiskCache()
+    return cache or None
+
+
+def _backend_id(Matrix):
+    """ Symbolic package (and its version) of ``Matrix`` """
+    pkg = Matrix.__module__.split('.')[0]
+    return pkg, getattr(sys.modules.get(pkg), '__version__', None)
+
+
+def _get_registry(registry):
+    """ :class:`pyodesys.cache.MemoryCache` (or None) from the ``registry``
+    option of :class:`SymbolicSys` """
+    if registry is None:
+        return _cache.registry
+    return registry or None
+
+
+def _callable_token(cb):
+    """ Identifies ``cb`` in this process (e.g. closures with other values
+    captured differ), see :func:`_callable_id` """
+    if isinstance(cb, partial):
+        return (_callable_token(cb.func), cb.args,
+                sorted((cb.keywords or {}).items()))
+    code = getattr(cb, '__code__', None)
+    if code is None:
+        return id(cb)
+    return id(code), tuple(id(cell.cell_contents) for cell in
+                           cb.__closure__ or ())
+
+
+def _callable_id(cb):
+    """ Identifies ``cb`` (e.g. a lambdify function) across processes """
+    if isinstance(cb, partial):
+        return (_callable_id(cb.func), cb.args,
+                sorted((cb.keywords or {}).items()))
+    name = getattr(cb, '__name__', type(cb).__name__)
+    return getattr(cb, '__module__', None), getattr(cb, '__qualname__', name)
+
+
+_lazy_lock = threading.RLock()  # guards building of lazy callbacks
+
+
+def _lazy_callback(attr, getter):
+    """ Property building (on first access) and caching ``attr`` by
+    calling the method named ``getter`` (see :meth:`SymbolicSys.warmup`).
+    """
+    def get(self):
+        try:
+            return self._callbacks[attr]
+        except KeyError:
+            with _lazy_lock:
+                if attr not in self._callbacks:
+                    self._callbacks[attr] = getattr(self, getter)()
+            return self._callbacks[attr]
+
+    def set(self, value):
+        self._callbacks[attr] = value
+    return property(get, set, doc="See :class:`OdeSys` (built lazily).")
+
+
 class SymbolicSys(OdeSys):
     """ ODE System from symbolic expressions
 
@@ -138,15 +332,20 @@ class SymbolicSys(OdeSys):
             calculate jacobian from exprs
         if False:
             do not compute jacobian (use explicit steppers)
-        if instance of ImmutableMatrix:
+        if instance of ImmutableMatrix (or a nested list):
             user provided expressions for the jacobian
     roots: iterable of expressions
         equations to look for root's for during integration
         (currently available through cvode)
     lambdify: callback
-        default: :py:func:`sympy.lambdify`
+        default: :py:func:`sympy.lambdify`, the returned callbacks may offer
+        an ``inplace(args, out)`` method (see :meth:`_inplace_callback`)
     lambdify_unpack: bool (default: True)
         whether or not unpacking of args needed when calling lambdify callback
+    lambdify_array: bool (default: True for sympy when lambdify not given)
+        whether ``lambdify`` is called as ``lambdify([x, y, p], exprs)``
+        with the expressions indexing into ``y`` and ``p`` (e.g. ``y[3]``),
+        i.e. the callbacks take arrays rather than one argument per element
     Matrix: class
         default: :py:class:`sympy.Matrix`
     Symbol: class
@@ -155,6 +354,34 @@ class SymbolicSys(OdeSys):
         default: :py:class:`sympy.Dummy`
     symarray: callback
         default: :py:class:`sympy.symarray`
+    fused: bool (default: False)
+        Also generate ``fj_cb`` (see :class:`OdeSys`) evaluating
+        ``self.exprs``, the jacobian and ``dfdx`` from one lambdified
+        callback (common subexpressions eliminated jointly).
+    sparse: bool (default: False)
+        Also generate ``j_csc_cb`` & ``sparsity`` (see :class:`OdeSys`)
+        from the non-zero entries of the jacobian, e.g. for sparse LU
+        decompositions in ``integrate(..., integrator='solve_ivp')``.
+    cache: bool or :class:`pyodesys.cache.DiskCache` (default: False)
+        Store the derived expressions & lambdified callbacks on disk, keyed
+        by the structure of the system (``dep``, ``exprs``, ``indep``,
+        ``params``, ``band``, ...) and the symbolic backend. True: a
+        :class:`pyodesys.cache.DiskCache` in the default location.
+    registry: :class:`pyodesys.cache.MemoryCache` or False
+        In-process store of lambdified callbacks (same keys as ``cache``),
+        shared between structurally identical systems (e.g. differing only
+        in parameter values). Default: :data:`pyodesys.cache.registry`.
+    jac_executor: None, str or ``concurrent.futures.Executor`` instance
+        distributes the derivation of the rows of the jacobian (e.g.
+        'process'), see :func:`pyodesys.util.sparse_jacobian`.
+    reorder: bool (default: False)
+        Reorders the dependent variables to minimise the bandwidth of the
+        jacobian (see :func:`pyodesys.util.reverse_cuthill_mckee`) and sets
+        ``band`` (unless no narrower than the system). The given ordering is
+        kept unless the reordered jacobian is narrower. The permutation is
+        applied by pre- and post-processors, i.e. ``y0`` & ``yout`` keep
+        the given order while ``dep``, ``exprs`` and the callbacks use the
+        new one.
     \*\*kwargs:
         See :py:class:`OdeSys`
 
@@ -166,41 +393,137 @@ class SymbolicSys(OdeSys):
         independent variable
     params : iterable of symbols
         parameters
+    permutation : array of ints or None
+        ``dep[i]`` is the ``permutation[i]``:th of the given dependent
+        variables (see ``reorder``)
 
     Notes
     -----
-    Works for a moderate number of unknowns, :py:func:`sympy.lambdify` has
-    an upper limit on number of arguments.
+    The jacobian (and ``dfdx``) is derived and the callbacks (``f_cb``,
+    ``j_cb``, ...) are lambdified on first use, e.g. integrating with an
+    explicit stepper never derives the jacobian. Call :meth:`warmup` to
+    build them all up front.
+
+    With the sympy backend the callbacks index into the arrays of dependent
+    variables and parameters (see ``lambdify_array``), i.e. there is no
+    upper limit on the number of unknowns. The defaults of ``lambdify``,
+    ``Matrix``, ``Symbol``, ... are taken from the package named by
+    ``$PYODESYS_SYM_BACKEND``: "sympy" (default), "symengine" (faster for
+    large systems), "pysym" or "numba".
 
     """
 
     def __init__(self, dep_exprs, indep=None, params=(), jac=True, dfdx=True,
-                 roots=None, lambdify=None, lambdify_unpack=None, Matrix=None,
-                 Symbol=None, Dummy=None, symarray=None, **kwargs):
+                 roots=None, lambdify=None, lambdify_unpack=None,
+                 lambdify_array=None, Matrix=None, Symbol=None, Dummy=None,
+                 symarray=None, fused=False, sparse=False, cache=False,
+                 registry=None, jac_executor=None, reorder=False, **kwargs):
         self.dep, self.exprs = zip(*dep_exprs)
         self.indep = indep
         self.params = params
         self._jac = jac
         self._dfdx = dfdx
         self.roots = roots
+        self.fused = fused
+        self.sparse = sparse
+        self.jac_executor = jac_executor
+        self._callbacks = {}  # see _lazy_callback
+        self._specializations = {}  # see specialize
+        self._lambdified = {}  # see _inplace_callback
         self.lambdify = lambdify or _lambdify()
         self.lambdify_unpack = (_lambdify_unpack() if lambdify_unpack is None
                                 else lambdify_unpack)
+        self.lambdify_array = ((lambdify is None and _lambdify_array()) if
+                               lambdify_array is None else lambdify_array)
         self.Matrix = Matrix or _Matrix()
         self.Symbol = Symbol or _Symbol()
         self.Dummy = Dummy or _Dummy()
         self.symarray = symarray or _symarray()
+        if isinstance(jac, list):
+            self._jac = self.Matrix(jac)
         # we need self.band before super().__init__
         self.band = kwargs.get('band', None)
+        if sparse and self.band is not None:
+            raise ValueError("sparse and band are mutually exclusive")
+        self.cache = _get_cache(cache)
+        self.registry = _get_registry(registry)
+        self._cache_key = None
         if kwargs.get('names', None) is True:
             kwargs['names'] = [y.name for y in self.dep]
+        self.permutation = None
+        if reorder:
+            if self.band is not None or sparse or jac is not True:
+                raise ValueError("reorder sets band (excludes band, sparse "
+                                 "& a given jac)")
+            self._reorder(kwargs)
+        self._given = jac, self._dfdx  # see _get_cache_key
         super(SymbolicSys, self).__init__(
-            self.get_f_ty_callback(),
-            self.get_j_ty_callback(),
-            self.get_dfdx_callback(),
-            self.get_roots_callback(),
-            nroots=None if roots is None else len(roots),
-            **kwargs)
+            None, nroots=None if roots is None else len(roots), **kwargs)
+
+    def _reorder(self, kwargs):
+        """ Reorders ``dep`` & ``exprs`` to minimise the bandwidth of the
+        jacobian (see ``reorder``). """
+        perm, band = reverse_cuthill_mckee(self.exprs, self.dep)
+        if sum(band) + 1 >= self.ny:
+            return  # not narrower than the dense jacobian
+        self.band = kwargs['band'] = band
+        if perm == list(range(self.ny)):
+            return  # the given ordering is (already) the narrowest
+        self.permutation = perm = np.array(perm)
+        inverse = np.argsort(perm)
+        self.dep = tuple(self.dep[idx] for idx in perm)
+        self.exprs = tuple(self.exprs[idx] for idx in perm)
+        if not isinstance(self._dfdx, bool):
+            self._dfdx = [self._dfdx[idx] for idx in perm]
+
+        def pre_processor(x, y, p):
+            return x, np.asarray(y)[..., perm], p
+
+        def post_processor(x, y, p):
+            return x, np.asarray(y)[..., inverse], p
+
+        kwargs['pre_processors'] = list(kwargs.get(
+            'pre_processors', None) or []) + [pre_processor]
+        kwargs['post_processors'] = [post_processor] + list(kwargs.get(
+            'post_processors', None) or [])
+
+    f_cb = _lazy_callback('f_cb', 'get_f_ty_callback')
+    j_cb = _lazy_callback('j_cb', 'get_j_ty_callback')
+    dfdx_cb = _lazy_callback('dfdx_cb', 'get_dfdx_callback')
+    roots_cb = _lazy_callback('roots_cb', 'get_roots_callback')
+    f_batch_cb = _lazy_callback('f_batch_cb', '_get_f_batch_cb')
+    j_batch_cb = _lazy_callback('j_batch_cb', '_get_j_batch_cb')
+    dfdx_batch_cb = _lazy_callback('dfdx_batch_cb', '_get_dfdx_batch_cb')
+    fj_cb = _lazy_callback('fj_cb', '_get_fj_cb')
+    j_csc_cb = _lazy_callback('j_csc_cb', 'get_j_csc_callback')
+    sparsity = _lazy_callback('sparsity', 'get_jac_sparsity')
+    jv_cb = _lazy_callback('jv_cb', 'get_jv_callback')
+
+    def _get_f_batch_cb(self):
+        return self.get_f_ty_batch_callback() or _batch_loop(self.f_cb)
+
+    def _get_j_batch_cb(self):
+        return self.get_j_ty_batch_callback() or _batch_loop(self.j_cb)
+
+    def _get_dfdx_batch_cb(self):
+        return self.get_dfdx_batch_callback() or _batch_loop(self.dfdx_cb)
+
+    def _get_fj_cb(self):
+        return self.get_fj_callback() if self.fused else None
+
+    def warmup(self):
+        """ Derives and lambdifies all callbacks now (rather than on first
+        use), e.g. before a service starts accepting requests. ``jv_cb``
+        (only used by Krylov integrators) is still built on first use.
+
+        Returns
+        -------
+        self
+        """
+        for attr in ('f_cb', 'j_cb', 'dfdx_cb', 'roots_cb', 'f_batch_cb',
+                     'j_batch_cb', 'dfdx_batch_cb', 'fj_cb', 'j_csc_cb'):
+            getattr(self, attr)
+        return self
 
     @classmethod
     def from_callback(cls, cb, ny, nparams=0, *args, **kwargs):
@@ -236,6 +559,8 @@ class SymbolicSys(OdeSys):
             raise NotImplementedError('roots currently unsupported')
         if 'params' not in new_kw:
             new_kw['params'] = ori.params
+        if 'band' not in new_kw and ori.band is not None:
+            new_kw['band'] = ori.band
 
         if len(ori.pre_processors) > 0:
             if 'pre_processors' not in new_kw:
@@ -251,11 +576,122 @@ class SymbolicSys(OdeSys):
 
         return cls(zip(ori.dep, ori.exprs), ori.indep, **new_kw)
 
+    def specialize(self, param_values, simplify=None):
+        """ System with (some of) the parameters replaced by numbers.
+
+        The expressions (and an already derived jacobian) are rewritten
+        with the values substituted, i.e. terms vanish for values like 0
+        and the jacobian of the new system has no entries for them. One
+        instance is kept per set of values.
+
+        Parameters
+        ----------
+        param_values: dict or array_like
+            values by parameter (symbol or index), or values of all
+            parameters
+        simplify: callback (optional)
+            applied to the substituted expressions, e.g. ``sympy.simplify``
+
+        Returns
+        -------
+        :class:`SymbolicSys` taking the remaining parameters (in order).
+        The pre- and post-processors of this system are kept (they are
+        passed all parameters, at their original positions).
+
+        Examples
+        --------
+        >>> odesys = SymbolicSys.from_callback(lambda x, y, p: [
+        ...     -p[0]*y[0] + p[1]*y[1], p[0]*y[0] - p[1]*y[1]], 2, 2)
+        >>> specialized = odesys.specialize({1: 0})
+        >>> specialized.exprs
+        (-p_0*y_0, p_0*y_0)
+        >>> specialized is odesys.specialize([None, 0])
+        True
+
+        """
+        if isinstance(param_values, dict):
+            items = param_values.items()
+        else:
+            items = [(idx, val) for idx, val in enumerate(param_values)
+                     if val is not None]
+        fixed = {}
+        for key, val in items:
+            idx = int(key) if isinstance(key, numbers.Integral) else list(
+                self.params).index(key)
+            val = float(val)
+            fixed[idx] = int(val) if val.is_integer() else val  # exact 0, 1
+        key = (tuple(sorted(fixed.items())), simplify)
+        with _lazy_lock:
+            if key not in self._specializations:
+                self._specializations[key] = self._specialize(fixed,
+                                                              simplify)
+            return self._specializations[key]
+
+    def _specialize(self, fixed, simplify):
+        subs = dict((self.params[idx], val) for idx, val in fixed.items())
+
+        def _subs(exprs):
+            exprs = [expr.subs(subs) if hasattr(expr, 'subs') else expr
+                     for expr in exprs]
+            return exprs if simplify is None else [
+                simplify(expr) for expr in exprs]
+
+        kwargs = dict(
+            roots=None if self.roots is None else _subs(self.roots),
+            band=self.band, names=self.names, fused=self.fused,
+            sparse=self.sparse, cache=self.cache,
+            registry=self.registry or False, jac_executor=self.jac_executor,
+            lambdify=self.lambdify, lambdify_unpack=self.lambdify_unpack,
+            lambdify_array=self.lambdify_array, Matrix=self.Matrix,
+            Symbol=self.Symbol, Dummy=self.Dummy, symarray=self.symarray)
+        if self._jac is False or (self._jac is not True and
+                                  simplify is None):
+            kwargs['jac'] = self._jac if self._jac is False else self.Matrix(
+                self._jac.shape[0], self._jac.shape[1],
+                _subs(chain(*self._jac.tolist())))  # pruned by subs
+        if not isinstance(self._dfdx, bool):
+            kwargs['dfdx'] = _subs(self._dfdx)
+        else:
+            kwargs['dfdx'] = self._dfdx
+        if self.pre_processors or self.post_processors:
+            indices = np.array(sorted(fixed))
+            insert = partial(_insert_params, indices,
+                             np.array([fixed[idx] for idx in indices],
+                                      dtype=np.float64))
+            delete = partial(_delete_params, indices)
+            kwargs['pre_processors'] = [insert] + self.pre_processors + [
+                delete]
+            kwargs['post_processors'] = [insert] + self.post_processors + [
+                delete]
+        return SymbolicSys(
+            zip(self.dep, _subs(self.exprs)), self.indep,
+            [p for idx, p in enumerate(self.params) if idx not in fixed],
+            **kwargs)
+
     @property
     def ny(self):
         """ Number of dependent variables in the system. """
         return len(self.exprs)
 
+    def _worker_recipe(self):
+        """ Recipe for rebuilding the internal system from its expressions.
+
+        The jacobian and ``dfdx``, if already derived, are passed along so
+        that worker processes only need to lambdify the expressions
+        (otherwise they are derived in the workers, when needed). The
+        symbolic backend in the worker is chosen by ``$PYODESYS_SYM_BACKEND``.
+        """
+        args = (list(zip(self.dep, self.exprs)), self.indep,
+                list(self.params))
+        jac = self._jac
+        if hasattr(jac, 'tolist'):
+            jac = jac.tolist()  # e.g. symengine matrices are not picklable
+        kwargs = dict(jac=jac, dfdx=self._dfdx, roots=self.roots,
+                      band=self.band, fused=self.fused, sparse=self.sparse,
+                      cache=self.cache)
+        return _structural_key(args, kwargs), partial(
+            SymbolicSys, *args, **kwargs)
+
     def _args(self, x=None, y=None, params=()):
         if x is None:
             x = self.indep
@@ -266,16 +702,54 @@ class SymbolicSys(OdeSys):
             args = (x,) + args
         return args + tuple(params)
 
+    def _get_cache_key(self, positional=False):
+        """ Hash of the structure of the system (see ``cache``). The
+        ``positional`` one (for the lambdified callbacks, taking positional
+        arguments) is equal for systems differing only in their dummies
+        (e.g. :class:`PartiallySolvedSystem`). """
+        if self._cache_key is None:
+            rep = _structural_repr(
+                self.dep, self.exprs, self.indep, list(self.params),
+                self.band, self.roots, self._given[0], self._given[1],
+                _backend_id(self.Matrix))
+            self._cache_key = tuple(
+                hashlib.sha1(r.encode('utf-8')).hexdigest()
+                for r in (rep, _number_dummies(rep)))
+        return self._cache_key[positional]
+
+    def _cached(self, name, build, dump=None, load=None, positional=False):
+        """ ``build()`` stored in ``self.cache`` (see
+        :func:`pyodesys.cache.cached`) under a key from ``name`` and the
+        structure of the system (see :meth:`_get_cache_key`). """
+        if self.cache is None:
+            return build()
+        return cached(self.cache, _structural_key(
+            self._get_cache_key(positional), name), build, dump, load)
+
+    def _jac_shape(self):
+        """ Shape of the jacobian (without deriving it) """
+        if self._jac is not True:
+            return tuple(self.get_jac().shape)
+        elif self.band is None:
+            return self.ny, self.ny
+        else:
+            return 1 + sum(self.band), self.ny
+
     def get_jac(self):
-        """ Derives the jacobian from ``self.exprs`` and ``self.dep``. """
+        """ Derives the jacobian from ``self.exprs`` and ``self.dep``
+        (only the entries which may be non-zero, see ``jac_executor``). """
         if self._jac is True:
-            if self.band is None:
-                f = self.Matrix(1, self.ny, lambda _, q: self.exprs[q])
-                self._jac = f.jacobian(self.dep)
-            else:
-                # Banded
-                self._jac = self.Matrix(banded_jacobian(
-                    self.exprs, self.dep, *self.band))
+            def derive():
+                if self.band is None:
+                    rows = sparse_jacobian(self.exprs, self.dep,
+                                           self.jac_executor)
+                    return self.Matrix(self.ny, self.ny, list(chain(*rows)))
+                else:
+                    # Banded
+                    return self.Matrix(banded_jacobian(
+                        self.exprs, self.dep, *self.band).tolist())
+            self._jac = self._cached('jac', derive, lambda jac: jac.tolist(),
+                                     self.Matrix)
         elif self._jac is False:
             return False
 
@@ -287,69 +761,367 @@ class SymbolicSys(OdeSys):
             if self.indep is None:
                 self._dfdx = [0]*self.ny
             else:
-                self._dfdx = [expr.diff(self.indep) for expr in self.exprs]
+                self._dfdx = self._cached('dfdx', lambda: [
+                    expr.diff(self.indep) for expr in self.exprs])
         elif self._dfdx is False:
             return False
         return self._dfdx
 
+    def _lambdify_xyp(self, exprs, cse=False, name=None, size=1, extra=()):
+        """ Lambdifies ``exprs`` into a callback ``cb(x, y, p)``.
+
+        With ``self.lambdify_array`` the generated code indexes into the
+        vectors ``y`` & ``p`` (there is no unpacking into scalar arguments,
+        i.e. no limit on the number of arguments). ``cse=True`` asks for
+        common subexpression elimination (if supported by the backend).
+        A callback offering ``inplace`` (see :meth:`_inplace_callback`)
+        keeps it. A ``name`` (e.g. 'f') makes the result cacheable (see
+        ``cache`` & ``registry`` in :class:`SymbolicSys`, ``size``: number
+        of expressions), ``exprs`` may then be a callable returning them
+        (only called if not cached). The symbols in ``extra`` are taken
+        from ``p`` (after the parameters).
+        """
+        def build(exprs=exprs):
+            if callable(exprs):
+                exprs = exprs()
+            if self.lambdify_array:
+                subs = dict([(yi, self.Symbol('_y[%d]' % i)) for i, yi in
+                             enumerate(self.dep)] +
+                            [(pi, self.Symbol('_p[%d]' % i)) for i, pi in
+                             enumerate(chain(self.params, extra))])
+                if hasattr(exprs, 'xreplace'):  # matrix
+                    exprs = exprs.xreplace(subs)
+                else:
+                    exprs = [getattr(expr, 'xreplace', lambda _: expr)(subs)
+                             for expr in exprs]
+                x = self.Symbol('_x') if self.indep is None else self.indep
+                args = [x, self.Symbol('_y'), self.Symbol('_p')]
+            else:
+                args = list(chain(self._args(), self.params, extra))
+            try:
+                return self.lambdify(args, exprs,
+                                     **(dict(cse=True) if cse else {}))
+            except TypeError:  # e.g. pysym, numba (always eliminates)
+                return self.lambdify(args, exprs)
+        if name is None:
+            cb = build()
+        else:
+            key = ('lambdify', name, cse, self.lambdify_array,
+                   _callable_id(self.lambdify))
+            cb = self._shared(key, lambda: self._cached(
+                key, build, self._dump_lambdified, self._load_lambdified,
+                positional=True), size)
+        if self.lambdify_array:
+            return cb
+        unpack = self.lambdify_unpack
+
+        def xyp(x, y, p):
+            if unpack:
+                return cb(*self._args(x, y, p))
+            else:
+                return cb(self._args(x, y, p))
+        if hasattr(cb, 'inplace'):
+            xyp.inplace = cb.inplace
+        return xyp
+
+    def _shared(self, name, build, size):
+        """ ``build()`` shared through ``self.registry`` """
+        if self.registry is None:
+            return build()
+        key = _structural_key(self._get_cache_key(positional=True), name,
+                              _callable_token(self.lambdify))
+        entry = self.registry.get(key)
+        if entry is None:
+            # the entry keeps self.lambdify (i.e. the ids in key) alive
+            entry = self.lambdify, build()
+            self.registry.set(key, entry, size)
+        return entry[1]
+
+    def _dump_lambdified(self, cb):
+        """ Cache entry for a callback from ``self.lambdify`` (or None) """
+        if not isinstance(cb, types.FunctionType):
+            return cb  # e.g. symengine & numba (picklable)
+        if not cb.__code__.co_filename.startswith('<lambdifygenerated'):
+            return None
+        extra = set(cb.__globals__) - set(self.lambdify([], 0).__globals__)
+        if any(re.match(r'^[A-Za-z_]\w*$', name) for name in extra):
+            return None  # e.g. implemented functions
+        try:
+            return ('source', cb.__name__, inspect.getsource(cb))
+        except (IOError, OSError, TypeError):
+            return None
+
+    def _load_lambdified(self, entry):
+        """ Inverse of :meth:`_dump_lambdified` """
+        if not isinstance(entry, tuple):
+            return entry
+        _, name, source = entry
+        namespace = dict(self.lambdify([], 0).__globals__)
+        exec(compile(source, '<cached>', 'exec'), namespace)
+        return namespace[name]
+
     def get_f_ty_callback(self):
         """ Generates a callback for evaluating ``self.exprs``. """
-        cb = self.lambdify(list(chain(self._args(), self.params)), self.exprs)
+        cb = self._lambdified['f'] = self._lambdify_xyp(
+            self.exprs, name='f', size=self.ny)
 
         def f(x, y, params=()):
-            if self.lambdify_unpack:
-                return np.asarray(cb(*self._args(x, y, params)))
-            else:
-                return np.asarray(cb(self._args(x, y, params)))
+            return np.asarray(cb(x, _tolist(y), _tolist(params)))
         return f
 
     def get_j_ty_callback(self):
         """ Generates a callback for evaluating the jacobian. """
-        j_exprs = self.get_jac()
-        if j_exprs is False:
+        if self._jac is False:
             return None
-        cb = self.lambdify(list(chain(self._args(), self.params)), j_exprs)
+        cb = self._lambdified['j'] = self._lambdify_xyp(
+            self.get_jac, name='j', size=int(np.prod(self._jac_shape())))
 
         def j(x, y, params=()):
-            if self.lambdify_unpack:
-                return np.asarray(cb(*self._args(x, y, params)))
-            else:
-                return np.asarray(cb(self._args(x, y, params)))
+            return np.asarray(cb(x, _tolist(y), _tolist(params)))
         return j
 
+    def get_jac_sparsity(self):
+        """ Sparsity pattern of the jacobian (None unless ``sparse``).
+
+        Returns
+        -------
+        Pair of int arrays ``(colptrs, rowvals)`` in compressed sparse
+        column (CSC) format.
+        """
+        if not self.sparse or self._jac is False:
+            return None
+
+        def pattern():
+            jac = self.get_jac()
+            colptrs, rowvals = [0], []
+            for ci in range(self.ny):
+                rowvals.extend(ri for ri in range(self.ny)
+                               if jac[ri, ci] != 0)
+                colptrs.append(len(rowvals))
+            return (np.array(colptrs, dtype=np.int32),
+                    np.array(rowvals, dtype=np.int32))
+        return self._cached('sparsity', pattern)
+
+    def get_j_csc_callback(self):
+        """ Generates a callback for evaluating the entries of the jacobian
+        in its sparsity pattern (see :meth:`get_jac_sparsity`). """
+        if self.sparsity is None:
+            return None
+        colptrs, rowvals = self.sparsity
+
+        def data():
+            jac = self.get_jac()
+            return [jac[ri, ci] for ci in range(self.ny) for ri in
+                    rowvals[colptrs[ci]:colptrs[ci+1]].tolist()]
+        cb = self._lambdified['j_csc'] = self._lambdify_xyp(
+            data, name='j_csc', size=len(rowvals))
+
+        def j_csc(x, y, params=()):
+            return np.asarray(cb(x, _tolist(y), _tolist(params)))
+        return j_csc
+
+    def get_jv_callback(self):
+        """ Generates a callback for evaluating jacobian-vector products,
+        ``jv(x, y, v, params)`` (see ``jv`` in :class:`OdeSys`), from the
+        directional derivatives of ``self.exprs`` (the jacobian is never
+        evaluated as a matrix). """
+        v = [self.Symbol('_v_%d' % i) for i in range(self.ny)]
+
+        def exprs():
+            if self._jac is not False and self.band is None:
+                jac = self.get_jac()
+                rows = [[jac[ri, ci] for ci in range(self.ny)]
+                        for ri in range(self.ny)]
+            else:
+                rows = sparse_jacobian(self.exprs, self.dep,
+                                       self.jac_executor)
+            return [sum((elem*vi for elem, vi in zip(row, v) if elem != 0),
+                        0) for row in rows]
+        cb = self._lambdified['jv'] = self._lambdify_xyp(
+            exprs, name='jv', size=self.ny, extra=v)
+
+        def jv(x, y, v, params=()):
+            return np.asarray(cb(x, _tolist(y), list(_tolist(params)) +
+                                 list(_tolist(v))))
+        return jv
+
+    def get_band_preconditioner(self, ml, mu, block_size=None):
+        """ Preconditioner for Krylov integrators (see
+        :class:`pyodesys.integrators.RosenbrockKrylov`) from the band
+        ``(ml, mu)`` of the jacobian (see :func:`banded_jacobian`), entries
+        outside it are dropped.
+
+        Parameters
+        ----------
+        ml, mu: int
+            number of lower & upper bands
+        block_size: int (optional)
+            keep only the diagonal blocks (of this size) of the band,
+            e.g. ``(block_size - 1,)*2`` for a block-diagonal approximation
+
+        Returns
+        -------
+        Callable ``preconditioner(x, y, p, hd)`` returning ``psolve(r)``
+        (solving the banded approximation of :math:`(I - hd J) z = r`).
+        """
+        from scipy.linalg import solve_banded
+        shape = (1 + ml + mu, self.ny)
+
+        def exprs():
+            packed = banded_jacobian(self.exprs, self.dep, ml, mu)
+            if block_size is not None:
+                for ri in range(shape[0]):
+                    for ci in range(self.ny):
+                        if (ci + ri - mu)//block_size != ci//block_size:
+                            packed[ri, ci] = 0
+            return packed.flatten().tolist()
+        cb = self._lambdify_xyp(exprs, name='band_%d_%d_%s' % (
+            ml, mu, block_size), size=shape[0]*shape[1])
+
+        def preconditioner(x, y, params, hd):
+            packed = -hd*np.asarray(cb(x, _tolist(y), _tolist(params)),
+                                    dtype=np.float64).reshape(shape)
+            packed[mu, :] += 1
+            return partial(solve_banded, (ml, mu), packed)
+        return preconditioner
+
     def get_dfdx_callback(self):
         """ Generate a callback for evaluating derivative of ``self.exprs`` """
-        dfdx_exprs = self.get_dfdx()
-        if dfdx_exprs is False:
+        if self._dfdx is False:
             return None
-        cb = self.lambdify(list(chain(self._args(), self.params)), dfdx_exprs)
+        cb = self._lambdified['dfdx'] = self._lambdify_xyp(
+            self.get_dfdx, name='dfdx', size=self.ny)
 
         def dfdx(x, y, params=()):
-            if self.lambdify_unpack:
-                return np.asarray(cb(*self._args(x, y, params)))
-            else:
-                return np.asarray(cb(self._args(x, y, params)))
+            return np.asarray(cb(x, _tolist(y), _tolist(params)))
         return dfdx
 
+    def _get_batch_callback(self, exprs, shape, name):
+        """ Broadcasting callback for ``exprs`` (or a callable returning
+        them) of ``shape`` (see :class:`OdeSys`) """
+        if not self.lambdify_unpack:
+            return None  # OdeSys falls back to looping
+        nout = int(np.prod(shape))
+        cb = self._lambdify_xyp(lambda: list(
+            exprs() if callable(exprs) else exprs), name=name, size=nout)
+
+        def batch_cb(x, Y, P=()):
+            X, Y, P = _batch_args(x, Y, P)
+            N = Y.shape[0]
+            vals = cb(X, Y.T, P.T)  # rows: variables/parameters
+            out = np.empty((N, nout))
+            for idx, val in enumerate(vals):
+                out[:, idx] = val
+            return out.reshape((N,) + shape)
+        return batch_cb
+
+    def get_f_ty_batch_callback(self):
+        """ Generates a batched callback for evaluating ``self.exprs``.
+
+        See :class:`OdeSys` for the calling convention.
+        """
+        return self._get_batch_callback(self.exprs, (self.ny,), 'f_batch')
+
+    def get_j_ty_batch_callback(self):
+        """ Generates a batched callback for evaluating the jacobian. """
+        if self._jac is False:
+            return None
+        return self._get_batch_callback(self.get_jac, self._jac_shape(),
+                                        'j_batch')
+
+    def get_dfdx_batch_callback(self):
+        """ Generates a batched callback for evaluating ``dfdx`` """
+        if self._dfdx is False:
+            return None
+        return self._get_batch_callback(self.get_dfdx, (self.ny,),
+                                        'dfdx_batch')
+
+    def get_fj_callback(self):
+        """ Generates a callback evaluating ``self.exprs``, the jacobian
+        and ``dfdx`` in one pass (see ``fj`` in :class:`OdeSys`). """
+        if self._jac is False:
+            return None
+        jshape = self._jac_shape()
+        has_dfdx = self._dfdx is not False
+        nf, nj = self.ny, jshape[0]*jshape[1]
+
+        def flat():
+            j_exprs = self.get_jac()
+            return list(self.exprs) + [j_exprs[ri, ci] for ri in range(
+                jshape[0]) for ci in range(jshape[1])] + (
+                    list(self.get_dfdx()) if has_dfdx else [])
+        cb = self._lambdified['fj'] = self._lambdify_xyp(
+            flat, cse=True, name='fj', size=nf + nj + (nf if has_dfdx else 0))
+
+        def fj(x, y, params=()):
+            out = np.asarray(cb(x, _tolist(y), _tolist(params)))
+            return (out[:nf], out[nf:nf+nj].reshape(jshape),
+                    out[nf+nj:] if has_dfdx else None)
+        return fj
+
+    def _inplace_callback(self, name, params):
+        """ See :meth:`OdeSys._inplace_callback`.
+
+        The parameters are converted once, backends offering an ``inplace``
+        method (``cb.inplace(args, out)`` with all arguments in one array,
+        e.g. symengine & numba) write directly into the output array. Other
+        backends (e.g. sympy) still get ``y`` as a list and return a new
+        sequence in every call (copied into the output array).
+        """
+        if getattr(self, name + '_cb') is None:  # (built on first use)
+            return None
+        cb = self._lambdified.get(name, None)
+        if cb is None:
+            return super(SymbolicSys, self)._inplace_callback(name, params)
+        inplace = getattr(cb, 'inplace', None)
+        if inplace is None:
+            p = list(_tolist(params))
+
+            def evaluate(x, y, out, v=None):
+                out[...] = cb(x, _tolist(y), p if v is None else
+                              p + list(_tolist(v)))
+        else:
+            nx, ny, npar = (0 if self.indep is None else 1), self.ny, len(
+                params)
+            a = np.empty(nx + ny + npar + (ny if name == 'jv' else 0))
+            a[nx+ny:nx+ny+npar] = params
+
+            def evaluate(x, y, out, v=None):
+                if nx:
+                    a[0] = x
+                a[nx:nx+ny] = y
+                if v is not None:
+                    a[nx+ny+npar:] = v
+                if out.flags.c_contiguous:
+                    inplace(a, out.reshape(-1))
+                else:
+                    flat = np.empty(out.size)
+                    inplace(a, flat)
+                    out[...] = flat.reshape(out.shape)
+
+        if name == 'jv':  # v follows the parameters
+            return lambda x, y, v, out: evaluate(x, y, out, v)
+        if name != 'fj':
+            return evaluate
+        return _inplace_fj(evaluate, self.ny, self._jac_shape(),
+                           self._dfdx is not False)
+
     def get_roots_callback(self):
         """ Generate a callback for evaluating ``self.roots`` """
         if self.roots is None:
             return None
-        cb = self.lambdify(list(chain(self._args(), self.params)), self.roots)
+        cb = self._lambdified['roots'] = self._lambdify_xyp(
+            self.roots, name='roots', size=len(self.roots))
 
         def roots(x, y, params=()):
-            if self.lambdify_unpack:
-                return np.asarray(cb(*self._args(x, y, params)))
-            else:
-                return np.asarray(cb(self._args(x, y, params)))
+            return np.asarray(cb(x, _tolist(y), _tolist(params)))
         return roots
 
     # Not working yet:
-    def _integrate_mpmath(self, xout, y0, params=()):
+    def _integrate_mpmath(self, intern_xout, intern_y0, intern_p, **kwargs):
         """ Not working at the moment, need to fix
         (low priority - taylor series is a poor method)"""
         raise NotImplementedError
-        xout, y0, self.internal_params = self.pre_process(xout, y0, params)
         from mpmath import odefun
 
         def rhs(x, y):
@@ -362,13 +1134,12 @@ class SymbolicSys(OdeSys):
             ]
         rhs.ncall = 0
 
-        cb = odefun(rhs, xout[0], y0)
+        cb = odefun(rhs, intern_xout[0], intern_y0)
         yout = []
-        for x in xout:
+        for x in intern_xout:
             yout.append(cb(x))
-        info = {'nrhs': rhs.ncall}
-        return self.post_process(
-            xout, yout, self.internal_params)[:2] + (info,)
+        return {'nfev': rhs.ncall, 'internal_xout': intern_xout,
+                'internal_yout': yout}
 
     def _get_analytic_stiffness_cb(self):
         J = self.get_jac()
@@ -382,8 +1153,8 @@ class SymbolicSys(OdeSys):
                 return np.asarray(cb(self._args(x, y, params)))
         return eigen_values
 
-    def analytic_stiffness(self, xyp=None):
-        """ Running stiffness ratio from last integration.
+    def analytic_stiffness(self, xyp):
+        """ Running stiffness ratio of a result.
 
         Calculate sittness ratio, i.e. the ratio between the largest and
         smallest absolute eigenvalue of the (analytic) jacobian matrix.
@@ -421,18 +1192,25 @@ class TransformedSys(SymbolicSys):
                  indep_transf=None, params=(), exprs_process_cb=None,
                  **kwargs):
         dep, exprs = zip(*dep_exprs)
+        kwargs['cache'] = cache = _get_cache(kwargs.get('cache', False))
+        backend = _backend_id(kwargs.get('Matrix', None) or _Matrix())
+
+        def _transform(transform, fw, bw, *args):
+            return cached(cache, _structural_key(
+                transform.__name__, fw, bw, dep, exprs, args, backend),
+                lambda: transform(fw, bw, list(zip(dep, exprs)), *args))
+
         if dep_transf is not None:
             self.dep_fw, self.dep_bw = zip(*dep_transf)
-            exprs = transform_exprs_dep(self.dep_fw, self.dep_bw,
-                                        list(zip(dep, exprs)))
+            exprs = _transform(transform_exprs_dep, self.dep_fw, self.dep_bw)
 
         else:
             self.dep_fw, self.dep_bw = None, None
 
         if indep_transf is not None:
             self.indep_fw, self.indep_bw = indep_transf
-            exprs = transform_exprs_indep(self.indep_fw, self.indep_bw,
-                                          list(zip(dep, exprs)), indep)
+            exprs = _transform(transform_exprs_indep, self.indep_fw,
+                               self.indep_bw, indep)
         else:
             self.indep_fw, self.indep_bw = None, None
 
@@ -499,22 +1277,29 @@ class TransformedSys(SymbolicSys):
                    indep_transf, p, **kwargs)
 
     def _back_transform_out(self, xout, yout, params):
-        args = self._args(xout, yout.T, params)
-        if self.lambdify_unpack:
-            return (xout if self.b_indep is None else self.b_indep(*args),
-                    np.array(self.b_dep(*args)).T, params)
-        else:
-            return (xout if self.b_indep is None else self.b_indep(args),
-                    np.array(self.b_dep(args)).T, params)
+        xout, yout = np.asarray(xout), np.asarray(yout)
+        args = self._args(xout, _last_axis(yout), _last_axis(
+            np.asarray(params)[..., None, :]))
+        new_y = _stack_last(self._call(self.b_dep, args), yout.shape)
+        if self.b_indep is None:
+            return xout, new_y, params
+        return self._call(self.b_indep, args), new_y, params
 
     def _forward_transform_xy(self, x, y, p):
-        args = self._args(x, y, p)
+        x, y, p = np.asarray(x), np.asarray(y), np.asarray(p)
+        new_y = _stack_last(self._call(self.f_dep, self._args(
+            x[..., 0], _last_axis(y), _last_axis(p))), y.shape)
+        if self.f_indep is None:
+            return x, new_y, p
+        return self._call(self.f_indep, self._args(
+            x, _last_axis(y[..., None, :]), _last_axis(p[..., None, :]))
+        ), new_y, p
+
+    def _call(self, cb, args):
         if self.lambdify_unpack:
-            return (x if self.f_indep is None else self.f_indep(*args),
-                    self.f_dep(*args), p)
+            return cb(*args)
         else:
-            return (x if self.f_indep is None else self.f_indep(args),
-                    self.f_dep(args), p)
+            return cb(args)
 
 
 def symmetricsys(dep_tr=None, indep_tr=None, **kwargs):
@@ -670,14 +1455,13 @@ class ScaledSys(TransformedSys):
         )
 
 
-def _skip(indices, iterable):
-    return np.asarray([elem for idx, elem in enumerate(
-        iterable) if idx not in indices])
+def _skip(indices, arr):
+    return np.delete(np.asarray(arr), indices, axis=-1)
 
 
 def _append(arr, *iterables):
     if isinstance(arr, np.ndarray):
-        return np.concatenate((arr,) + iterables)
+        return np.concatenate((arr,) + iterables, axis=-1)
     arr = arr[:]
     for iterable in iterables:
         arr += type(arr)(iterable)
@@ -688,6 +1472,19 @@ def _concat(*args):
     return np.concatenate(list(map(np.atleast_1d, args)))
 
 
+def _last_axis(arr):
+    """ Components of ``arr`` along its last axis """
+    return tuple(np.moveaxis(np.asarray(arr), -1, 0))
+
+
+def _stack_last(vals, shape):
+    """ Stack ``vals`` along the last axis of an array of ``shape`` """
+    out = np.empty(shape[:-1] + (len(vals),))
+    for idx, val in enumerate(vals):
+        out[..., idx] = val
+    return out
+
+
 class PartiallySolvedSystem(SymbolicSys):
     """ Use analytic expressions for some dependent variables
 
@@ -749,10 +1546,13 @@ class PartiallySolvedSystem(SymbolicSys):
             new_kw['names'] = original_system.names
         if 'band' not in new_kw and original_system.band is not None:
             new_kw['band'] = original_system.band
+        if 'cache' not in new_kw:
+            new_kw['cache'] = original_system.cache
 
         def pre_processor(x, y, p):
+            x, y, p = map(np.asarray, (x, y, p))
             return (x, _skip(analytic_ids, y), _append(
-                p, [x[0]], y))
+                p.astype(np.float64), x[..., :1], y))
 
         def post_processor(x, y, p):
             new_y = np.empty(y.shape[:-1] + (y.shape[-1]+nanalytic,))
@@ -766,7 +1566,7 @@ class PartiallySolvedSystem(SymbolicSys):
                 else:
                     new_y[..., idx] = y[..., intern_idx]
                     intern_idx += 1
-            return x, new_y, p[:-(1+original_system.ny)]
+            return x, new_y, p[..., :-(1+original_system.ny)]
 
         def _wrap_procs(procs):
             return
@@ -780,6 +1580,7 @@ class PartiallySolvedSystem(SymbolicSys):
             zip(new_dep, new_exprs), original_system.indep, new_params,
             lambdify=original_system.lambdify,
             lambdify_unpack=original_system.lambdify_unpack,
+            lambdify_array=original_system.lambdify_array,
             Matrix=original_system.Matrix,
             Symbol=original_system.Symbol,
             Dummy=original_system.Dummy,
@@ -790,12 +1591,10 @@ class PartiallySolvedSystem(SymbolicSys):
                               analytic_exprs)
 
         def analytic(x, y, params):
-            args = np.empty((len(x), 1+self.ny+len(params)))
-            args[:, 0] = x
-            args[:, 1:self.ny+1] = y
-            args[:, self.ny+1:] = params
+            args = np.broadcast_arrays(x, *(_last_axis(y) + _last_axis(
+                np.asarray(params)[..., None, :])))
             if ori_sys.lambdify_unpack:
-                return np.asarray(cb(*(args.T)))
+                return np.asarray(cb(*args))
             else:
-                return np.asarray(cb(args.T))
+                return np.asarray(cb(args))
         return analytic
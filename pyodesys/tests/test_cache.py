@@ -0,0 +1,34 @@
+from __future__ import absolute_import
+
+import os
+
+from ..cache import DiskCache, cached
+
+
+def test_DiskCache(tmpdir):
+    cache = DiskCache(str(tmpdir), max_size=3500)
+    for idx, key in enumerate('abc'):
+        assert cache.set(key, key.encode('ascii')*1000)
+        os.utime(cache._file(key), (idx, idx))
+    assert cache.get('a') == b'a'*1000  # now the most recently used
+    assert cache.set('d', b'd'*1000)
+    assert cache.get('b') is None  # evicted
+    assert [cache.get(key)[:1] for key in 'acd'] == [b'a', b'c', b'd']
+    assert cache.set('e', lambda: None) is False  # not picklable
+    cache.clear()
+    assert cache.get('a', 42) == 42
+
+
+def test_cached(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    calls = []
+
+    def build():
+        calls.append(None)
+        return {'x': 3}
+    for _ in range(2):
+        assert cached(cache, 'k', build, dump=lambda d: d['x'],
+                      load=lambda x: {'x': x}) == {'x': 3}
+    assert len(calls) == 1
+    assert cached(None, 'k', build) == {'x': 3}
+    assert len(calls) == 2
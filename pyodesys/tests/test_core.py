@@ -4,6 +4,7 @@ from __future__ import (absolute_import, division, print_function)
 import pytest
 import numpy as np
 from .. import OdeSys
+from ..core import _dense_banded
 
 
 def vdp_f(t, y, p):
@@ -33,7 +34,8 @@ def test_params():
     assert info['nfev'] > 0
 
 
-@pytest.mark.parametrize('solver', ['scipy', 'gsl', 'cvode', 'odeint'])
+@pytest.mark.parametrize('solver', ['scipy', 'gsl', 'cvode', 'odeint',
+                                    'solve_ivp'])
 def test_adaptive(solver):
     odes = OdeSys(vdp_f, vdp_j, vdp_dfdt)
     kwargs = dict(params=[2.0])
@@ -44,7 +46,8 @@ def test_adaptive(solver):
                        rtol=.2 if solver == 'odeint' else 1e-5)
 
 
-@pytest.mark.parametrize('solver', ['scipy', 'gsl', 'odeint', 'cvode'])
+@pytest.mark.parametrize('solver', ['scipy', 'gsl', 'odeint', 'cvode',
+                                    'solve_ivp'])
 def test_predefined(solver):
     odes = OdeSys(vdp_f, vdp_j, vdp_dfdt)
     xout = [0, 0.7, 1.3, 2]
@@ -91,12 +94,13 @@ def test_pre_post_processors():
     k = 3.7
     A = 42
     tend = 7
-    xout, yout, info = odesys.integrate(np.asarray([0, tend]), np.asarray([A]),
-                                        [k], atol=1e-12, rtol=1e-12,
-                                        name='vode', method='adams')
+    result = odesys.integrate(np.asarray([0, tend]), np.asarray([A]), [k],
+                              atol=1e-12, rtol=1e-12, name='vode',
+                              method='adams')
+    xout, yout, info = result
     yref = A*np.exp(-k*xout)
     assert np.allclose(yout.flatten(), yref)
-    assert np.allclose(odesys.internal_yout.flatten(), -odesys.internal_xout)
+    assert np.allclose(result.internal_yout.flatten(), -result.internal_xout)
 
 
 def test_custom_module():
@@ -117,3 +121,341 @@ def test_custom_module():
     assert np.allclose(yout[0], [1, 0])
     assert np.allclose(yout[-1], [-1.89021896, -0.71633577])
     assert info['nfev'] == 4*149
+
+
+def test_DormandPrince54():
+    from pyodesys.integrators import DormandPrince54
+    odes = OdeSys(vdp_f, vdp_j)
+    xout, yout, info = odes.integrate(
+        [0, 2], [1, 0], params=[2.0], integrator=DormandPrince54)
+    assert info['success']
+    assert np.allclose(yout[0], [1, 0])
+    assert np.allclose(yout[-1], [-1.89021896, -0.71633577])
+    xout, yout, info = odes.integrate(
+        [0, 1, 2], [1, 0], params=[2.0], integrator=DormandPrince54)
+    assert np.allclose(yout, [[1, 0], [0.44449086, -1.32847148],
+                              [-1.89021896, -0.71633577]])
+
+
+def test_integrate_batch__DormandPrince54():
+    from pyodesys.integrators import DormandPrince54
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = np.linspace(0, 2, 7)
+    Y0 = [[1, 0], [0.5, 0.5], [0, 1], [1, 0]]
+    P = [[2.0], [1.0], [0.5], [0.0]]
+    xb, yb, info = odes.integrate_batch(xout, Y0, P, atol=1e-10, rtol=1e-10,
+                                        integrator=DormandPrince54)
+    assert yb.shape == (4, 7, 2)
+    assert np.all(info['success'])
+    assert len(set(info['n_steps'])) > 1  # individual step size control
+    for idx in range(4):
+        _, yref, _ = odes.integrate(xout, Y0[idx], P[idx], atol=1e-10,
+                                    rtol=1e-10, integrator='scipy')
+        assert np.allclose(yb[idx], yref)
+
+
+def test_Rosenbrock23():
+    from pyodesys.integrators import Rosenbrock23
+    odes = OdeSys(vdp_f, vdp_j)
+    xout, yout, info = odes.integrate(
+        [0, 1, 2], [1, 0], params=[2.0], integrator=Rosenbrock23,
+        atol=1e-10, rtol=1e-10)
+    assert info['success']
+    assert np.allclose(yout, [[1, 0], [0.44449086, -1.32847148],
+                              [-1.89021896, -0.71633577]])
+
+
+def test__lu_factor():
+    from pyodesys.integrators import _lu_factor, _lu_solve
+    A = np.random.random((5, 4, 4)) - 0.5
+    A[0] = [[0, 1, 0, 0], [1, 0, 0, 0], [0, 0, 0, 2], [0, 0, 3, 0]]  # pivots
+    b = np.random.random((5, 4))
+    LU, piv = _lu_factor(A)
+    ref = [np.linalg.solve(a, bb) for a, bb in zip(A, b)]
+    assert np.allclose(_lu_solve(LU, piv, b), ref)
+    assert np.allclose(_lu_solve(LU, piv, 2*b), 2*np.array(ref))  # reuse
+
+
+def vdp_jv(t, y, v, p):
+    return vdp_j(t, y, p).dot(v)
+
+
+def test_RosenbrockKrylov():
+    from pyodesys.integrators import RosenbrockKrylov
+    odes = OdeSys(vdp_f, jv=vdp_jv)
+    xout, yout, info = odes.integrate(
+        [0, 1, 2], [1, 0], params=[2.0], integrator=RosenbrockKrylov,
+        atol=1e-10, rtol=1e-10)
+    assert info['success'] and info['njvev'] > 0
+    assert np.allclose(yout, [[1, 0], [0.44449086, -1.32847148],
+                              [-1.89021896, -0.71633577]])
+    xb, yb, info = odes.integrate_batch(
+        [0, 1, 2], [[1, 0], [1, 0]], [[2.0], [2.0]],
+        integrator=RosenbrockKrylov, atol=1e-10, rtol=1e-10)
+    assert np.allclose(yb[0], yout) and np.allclose(yb[1], yout)
+    with pytest.raises(ValueError):
+        OdeSys(vdp_f, vdp_j).integrate([0, 2], [1, 0], params=[2.0],
+                                       integrator=RosenbrockKrylov)
+
+
+@pytest.mark.parametrize('jac_reuse', [1, 5])
+def test_integrate_batch__Rosenbrock23(jac_reuse):
+    from pyodesys.integrators import Rosenbrock23
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = np.linspace(0, 2, 5)
+    Y0 = [[1, 0], [0.5, 0.5], [2, 0]]
+    P = [[2.0], [1.0], [1000.0]]  # last one is stiff
+    xb, yb, info = odes.integrate_batch(
+        xout, Y0, P, atol=1e-9, rtol=1e-9, integrator=Rosenbrock23,
+        jac_reuse=jac_reuse)
+    assert yb.shape == (3, 5, 2)
+    assert np.all(info['success'])
+    if jac_reuse == 1:
+        assert np.all(info['njev'] == info['n_steps'])
+    else:  # W-method: a reused jacobian keeps the order
+        assert np.all(info['njev'] < info['n_steps']/2)
+    for idx in range(3):
+        _, yref, _ = odes.integrate(xout, Y0[idx], P[idx], atol=1e-11,
+                                    rtol=1e-11, integrator='scipy',
+                                    name='vode', method='bdf', nsteps=5000)
+        assert np.allclose(yb[idx], yref, rtol=1e-6, atol=1e-6)
+
+
+def test_integrate_batch():
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = [0, 1, 2]
+    Y0 = [[1, 0], [0.5, 0.5], [0, 1]]
+    P = [[2.0], [1.0], [0.5]]
+    xb, yb, info = odes.integrate_batch(xout, Y0, P, integrator='scipy')
+    assert xb.shape == (3, 3)
+    assert yb.shape == (3, 3, 2)
+    assert info['nfev'].shape == (3,)
+    assert np.all(info['success'])
+    for idx in range(3):
+        _, yref, _ = odes.integrate(xout, Y0[idx], P[idx], integrator='scipy')
+        assert np.allclose(yb[idx], yref)
+
+
+def test_integrate_batch__empty():
+    odes = OdeSys(vdp_f, vdp_j)
+    with pytest.raises(ValueError):
+        odes.integrate_batch([0, 1, 2], np.empty((0, 2)), [2.0])
+    with pytest.raises(ValueError):
+        odes.integrate_batch([0, 1, 2], [1, 0], np.empty((0, 1)))
+
+
+def test_integrate_batch__processors():
+    def pre(x, y, p):
+        return x*p[..., :1], y/y[..., :1], np.concatenate(
+            (p, y[..., :1]), axis=-1)
+
+    def post(x, y, p):
+        return x/p[..., :1], y*p[..., None, 1:], p[..., :1]
+
+    def dvdu(x, y, p):
+        return [-y[0]]
+
+    odesys = OdeSys(dvdu, pre_processors=[pre], post_processors=[post])
+    A, k = np.array([[3.0], [5.0]]), np.array([[2.0], [0.5]])
+    xout = np.linspace(0, 1, 5)
+    for vectorized in (True, False):
+        if not vectorized:
+            odesys.pre_processors = [lambda x, y, p: (
+                np.asarray(x)*p[0], y/y[0], [p[0], y[0]])]
+            odesys.post_processors = [lambda x, y, p: (
+                x/p[0], y*p[1], [p[0]])]
+        xb, yb, info = odesys.integrate_batch(
+            xout, A, k, vectorized_processors=vectorized, atol=1e-10,
+            rtol=1e-10)
+        assert np.allclose(xb, np.array([xout, xout]))
+        assert np.allclose(yb[..., 0], A*np.exp(-k*xout))
+
+
+def test_integrate_batch__process_pool():
+    from concurrent.futures import ProcessPoolExecutor
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = [0, 1, 2]
+    Y0 = [[1, 0], [0.5, 0.5], [0, 1]]
+    P = [[2.0], [1.0], [0.5]]
+    xref, yref, nfo_ref = odes.integrate_batch(xout, Y0, P)
+    xb, yb, info = odes.integrate_batch(xout, Y0, P, executor='process',
+                                        nworkers=2, chunksize=2)
+    assert np.allclose(yb, yref)
+    assert np.all(info['nfev'] == nfo_ref['nfev'])
+    with ProcessPoolExecutor(2) as pool:
+        for _ in range(2):
+            xb, yb, info = odes.integrate_batch(xout, Y0, P, executor=pool,
+                                                chunksize=1)
+            assert np.allclose(yb, yref)
+
+
+def test_integrate__threads():
+    from concurrent.futures import ThreadPoolExecutor
+    odes = OdeSys(vdp_f, vdp_j)
+    mus = np.linspace(0.5, 3, 8)
+    xout = np.linspace(0, 2, 5)
+    refs = [odes.integrate(xout, [1, 0], [mu]).yout for mu in mus]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda mu: odes.integrate(
+            xout, [1, 0], [mu]), mus))
+    for mu, ref, result in zip(mus, refs, results):
+        assert np.allclose(result.yout, ref)
+        assert np.allclose(result.internal_params, [mu])
+
+
+def test_integrate_batch__threads():
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = np.linspace(0, 2, 7)
+    Y0 = np.random.random((13, 2))
+    P = 1 + np.random.random((13, 1))
+    xref, yref, nfo_ref = odes.integrate_batch(xout, Y0, P)
+    xb, yb, info = odes.integrate_batch(xout, Y0, P, executor='thread',
+                                        nworkers=3, chunksize=2)
+    assert np.allclose(xb, xref)
+    assert np.allclose(yb, yref)
+    assert np.all(info['nfev'] == nfo_ref['nfev'])
+    assert info['internal_yout'].shape == (13, 7, 2)
+    assert info['throughput'].shape == (3,)
+    assert sorted(set(info['worker'])) <= [0, 1, 2]
+
+
+@pytest.mark.parametrize('xout', [[0, 2], np.linspace(0, 2, 25)])
+def test_integrate_iter(xout):
+    odes = OdeSys(vdp_f, vdp_j, post_processors=[
+        lambda x, y, p: (x, 2*y, p)])
+    ref = odes.integrate(xout, [1, 0], [2.0], integrator='scipy')
+    info = {}
+    chunks = list(odes.integrate_iter(xout, [1, 0], [2.0], chunk_size=10,
+                                      info=info, integrator='scipy'))
+    assert all(len(x) == 10 for x, _ in chunks[:-1])
+    assert 0 < len(chunks[-1][0]) <= 10
+    assert np.allclose(np.concatenate([x for x, _ in chunks]), ref.xout)
+    assert np.allclose(np.concatenate([y for _, y in chunks]), ref.yout)
+    assert info['success'] and info['nfev'] == ref.info['nfev']
+
+
+def test_integrate_iter__dopri5():
+    ncall = [0]
+
+    def f(t, y, p):
+        ncall[0] += 1
+        return vdp_f(t, y, p)
+    odes = OdeSys(f)
+    ref = odes.integrate([0, 2], [1, 0], [2.0], integrator='scipy',
+                         dense_output=True)
+    assert len(ref.xout) > 40
+    ncall[0], info = 0, {}
+    chunks = odes.integrate_iter([0, 2], [1, 0], [2.0], chunk_size=10,
+                                 info=info, integrator='scipy')
+    x, y = next(chunks)
+    assert len(x) == 10 and ncall[0] < ref.info['nfev']/2  # not run to end
+    xs, ys = map(np.concatenate, zip((x, y), *chunks))
+    assert info['success'] and xs[-1] == 2
+    assert np.all(np.diff(xs) > 0)
+    assert np.allclose(ys, ref.dense_output(xs), atol=1e-5)
+
+
+def test_integrate_iter__custom_module():
+    from pyodesys.integrators import RK4_example_integartor
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = np.linspace(0, 2, 150)
+    info = {}
+    chunks = list(odes.integrate_iter(xout, [1, 0], [2.0], chunk_size=100,
+                                      info=info,
+                                      integrator=RK4_example_integartor))
+    assert [len(x) for x, _ in chunks] == [100, 50]
+    assert np.allclose(chunks[-1][1][-1], [-1.89021896, -0.71633577])
+    assert info['nfev'] == 4*149
+
+
+@pytest.mark.parametrize('xout', [[0, 2], np.linspace(0, 2, 25)])
+def test_integrate__sink(tmpdir, xout):
+    odes = OdeSys(vdp_f, vdp_j)
+    ref = odes.integrate(xout, [1, 0], [2.0], integrator='scipy')
+    fname = str(tmpdir.join('yout.dat'))
+    result = odes.integrate(xout, [1, 0], [2.0], integrator='scipy',
+                            sink=fname, chunk_size=7)
+    assert isinstance(result.yout, np.memmap)
+    assert result.internal_yout is result.yout
+    assert np.allclose(result.xout, ref.xout)
+    assert np.allclose(result.yout, ref.yout)
+    assert np.allclose(np.fromfile(fname).reshape(ref.yout.shape), ref.yout)
+
+    odes2 = OdeSys(vdp_f, vdp_j, post_processors=[
+        lambda x, y, p: (x, 2*y, p)])
+    buf = np.zeros((300, 2))
+    result2 = odes2.integrate(xout, [1, 0], [2.0], integrator='scipy',
+                              sink=buf)
+    assert result2.internal_yout is None
+    assert np.allclose(buf[:len(ref.xout)], 2*ref.yout)
+    assert np.allclose(result2.yout, 2*ref.yout)
+
+
+@pytest.mark.parametrize('name', ['dopri5', 'vode', None])
+def test_integrate__dense_output(name):
+    odes = OdeSys(vdp_f, vdp_j)
+    xout = np.linspace(0, 2, 17)
+    kw = dict(atol=1e-10, rtol=1e-10, integrator='scipy', name=name)
+    ref = odes.integrate(xout, [1, 0], [2.0], **kw)
+    result = odes.integrate([0, 2], [1, 0], [2.0], dense_output=True, **kw)
+    assert len(result.xout) > 5
+    assert np.allclose(result.dense_output(xout), ref.yout, atol=1e-6)
+    assert np.allclose(result.dense_output(1.0), ref.yout[8], atol=1e-6)
+    result2 = odes.integrate(xout, [1, 0], [2.0], dense_output=True, **kw)
+    assert np.allclose(result2.xout, xout)
+    assert np.allclose(result2.yout, ref.yout, atol=1e-6)
+
+
+def test_integrate__solve_ivp__jac_sparsity():
+    odes = OdeSys(vdp_f, sparsity=([0, 2, 4], [0, 1, 0, 1]))
+    xout, yout, info = odes.integrate([0, 2], [1, 0], params=[2.0],
+                                      integrator='solve_ivp', method='Radau')
+    assert info['success'] and info['njev'] > 0
+    assert np.allclose(yout[-1, :], [-1.89021896, -0.71633577], rtol=1e-5)
+
+
+def _decay_f(x, y, p):
+    return [-p[0]*y[0]] + [p[i-1]*y[i-1] - p[i]*y[i] for i in range(1, len(y))]
+
+
+def _decay_j(y, p):
+    ny = len(y)
+    return np.diag(-np.asarray(p[:ny], dtype=float)) + np.diag(p[:ny-1], -1)
+
+
+def test_OdeSys__fd_jacobian():
+    nfev = [0]
+
+    def f(x, y, p):
+        nfev[0] += 1
+        return _decay_f(x, y, p)
+
+    ny, p = 40, np.linspace(1, 2, 40)
+    y = np.random.random(ny)
+    banded = OdeSys(f, band=(1, 0))
+    packed = banded.j_cb(0, y, p)
+    assert nfev[0] == 3  # f(y) & two groups of columns
+    assert packed.shape == (2, ny)
+    assert np.allclose(_dense_banded(packed, 1, 0), _decay_j(y, p))
+
+    colptrs = np.append(np.arange(0, 2*ny, 2), 2*ny - 1)
+    rowvals = np.minimum(np.arange(2*ny - 1) - np.arange(2*ny - 1)//2,
+                         ny - 1)
+    sparse = OdeSys(f, sparsity=(colptrs, rowvals))
+    nfev[0] = 0
+    assert np.allclose(sparse.j_cb(0, y, p), _decay_j(y, p))
+    assert nfev[0] == 3
+    assert np.allclose(sparse.j_csc_cb(0, y, p), _decay_j(y, p).T[
+        _decay_j(y, p).T != 0])
+    assert np.all(np.isfinite(sparse.stiffness(([0, 1], [y, y], p))))
+
+    xout, y0 = np.linspace(0, 1, 5), np.eye(ny)[0]
+    _, yref, _ = OdeSys(f, lambda x, y, p: _decay_j(y, p)).integrate(
+        xout, y0, p, integrator='scipy', atol=1e-10, rtol=1e-10)
+    for odes, kw in [(banded, dict(integrator='scipy', name='vode',
+                                   method='bdf')),
+                     (sparse, dict(integrator='solve_ivp'))]:
+        _, yout, info = odes.integrate(xout, y0, p, atol=1e-10, rtol=1e-10,
+                                       **kw)
+        assert info['success'] and info['njev'] > 0
+        assert np.allclose(yout, yref, atol=1e-7)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from ..symbolic import SymbolicSys
+from .test_symbolic import decay_rhs
+from .bateman import bateman_full  # analytic, never mind the details
+
+try:
+    _compiler = shutil.which(os.environ.get('CC', 'cc'))
+except AttributeError:  # Python 2
+    from distutils.spawn import find_executable
+    _compiler = find_executable(os.environ.get('CC', 'cc'))
+
+requires_cc = pytest.mark.skipif(_compiler is None,
+                                 reason='C compiler not found')
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setenv('PYODESYS_CACHE_DIR', str(tmpdir))
+    return str(tmpdir)
+
+
+@requires_cc
+@pytest.mark.parametrize('band', [None, (1, 0)])
+def test_NativeSys(cache_dir, band):
+    from ..native import NativeSys
+    k = [7., 3, 2]
+    native = NativeSys.from_callback(decay_rhs, len(k)+1, len(k), band=band)
+    symbolic = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                         band=band)
+    assert os.path.dirname(native.module_path) == cache_dir
+    y = np.random.random(len(k)+1)
+    for attr in ('f_cb', 'j_cb', 'dfdx_cb'):
+        assert np.allclose(getattr(native, attr)(0.5, y, k),
+                           getattr(symbolic, attr)(0.5, y, k))
+    fout = np.empty(len(k)+1)
+    assert native.f_cb(0.5, y, k, out=fout) is fout
+    assert np.allclose(fout, symbolic.f_cb(0.5, y, k))
+    with pytest.raises(ValueError):
+        native.f_cb(0.5, y[:2], k)
+
+    Y = np.random.random((5, len(k)+1))
+    P = np.random.random((5, len(k)))
+    for attr in ('f_batch_cb', 'j_batch_cb', 'dfdx_batch_cb'):
+        assert np.allclose(getattr(native, attr)(0.5, Y, P),
+                           getattr(symbolic, attr)(0.5, Y, P))
+
+    y0 = [1, 0, 0, 0]
+    xout, yout, info = native.integrate([0, 1], y0, k, integrator='scipy')
+    ref = np.array(bateman_full(y0, k+[0], xout - xout[0], exp=np.exp)).T
+    assert info['success']
+    assert np.allclose(yout, ref)
+
+    other = NativeSys.from_callback(decay_rhs, len(k)+1, len(k), band=band)
+    assert other.module_path == native.module_path  # cached
+
+
+@requires_cc
+def test_NativeSys_roots(cache_dir):
+    import sympy as sp
+    from ..native import NativeSys
+    x, y, k = sp.symbols('x y k')
+    native = NativeSys([(y, -k*y)], x, [k], roots=[y - 0.5, x - 1])
+    assert native.nroots == 2
+    assert np.allclose(native.roots_cb(0.25, [2.0], [3.0]), [1.5, -0.75])
+
+
+@requires_cc
+def test_NativeSys_fused(cache_dir):
+    from ..native import NativeSys
+    k = [7., 3, 2]
+    native = NativeSys.from_callback(decay_rhs, len(k)+1, len(k), fused=True)
+    y = np.random.random(len(k)+1)
+    f, j, dfdx = native.fj_cb(0.5, y, k)
+    assert np.allclose(f, native.f_cb(0.5, y, k))
+    assert np.allclose(j, native.j_cb(0.5, y, k))
+    assert np.allclose(dfdx, native.dfdx_cb(0.5, y, k))
+    jout, dfdx_out = np.empty((len(k)+1,)*2), np.empty(len(k)+1)
+    native._inplace_callback('fj', k)(0.5, y, None, jout, dfdx_out)
+    assert np.allclose(jout, j) and np.allclose(dfdx_out, dfdx)
+    fout = np.empty(len(k)+1)
+    native._inplace_callback('f', k)(0.5, y, fout)
+    assert np.allclose(fout, f)
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_NumbaLambdify(cache_dir, parallel):
+    pytest.importorskip('numba')
+    import sympy as sp
+    from ..native import NumbaLambdify
+    x, y = sp.symbols('x y')
+    cb = NumbaLambdify([x, y], sp.Matrix([[x*y, 0], [sp.exp(x) + y, 1]]),
+                       parallel=parallel)
+    assert np.allclose(cb(2, 3), [[6, 0], [np.exp(2) + 3, 1]])
+    X, Y = np.array([1., 2.]), np.array([[3.], [5.]])
+    res = cb(X, Y)
+    assert res.shape == (2, 2, 2, 2)
+    assert np.allclose(res[0, 0], X*Y)
+    assert np.allclose(res[1, 0], np.exp(X) + Y)
+    assert np.allclose(res[1, 1], 1)
+    assert any(name.endswith('.nbi') for name in os.listdir(
+        os.path.join(cache_dir, '__pycache__')))  # on-disk numba cache
+
+
+_numba_parallel_then_pool = """
+import numpy as np, sympy as sp
+from pyodesys.native import NumbaLambdify
+from pyodesys.symbolic import SymbolicSys
+x, y = sp.symbols('x y')
+cb = NumbaLambdify([x, y], [x*y, x + y], parallel=True)
+assert cb(np.array([1., 2.]), np.array([[3.], [5.]])).shape == (2, 2, 2)
+odesys = SymbolicSys.from_callback(lambda t, y, p: [-p[0]*y[0]], 1, 1)
+xout, yout, info = odesys.integrate_batch(
+    np.linspace(0, 1, 5), np.ones((4, 1)), np.ones((4, 1)),
+    executor='process', nworkers=2, integrator='scipy')
+assert yout.shape == (4, 5, 1)
+from pyodesys.util import sparse_jacobian
+assert sparse_jacobian([x*y, 2*y], [x, y], 'process', 2) == [[y, x], [0, 2]]
+"""
+
+
+def test_NumbaLambdify__parallel_then_process_pool(cache_dir):
+    # forked workers used to hang the parent (numba's workqueue layer),
+    # integrate_batch & sparse_jacobian now spawn their workers
+    pytest.importorskip('numba')
+    import subprocess
+    import sys
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.dirname(__file__)))] +
+        os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    proc = subprocess.Popen([sys.executable, '-c', _numba_parallel_then_pool],
+                            env=env)
+    try:
+        assert proc.wait(timeout=300) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+
+def test_SymbolicSys__numba_backend(cache_dir, monkeypatch):
+    pytest.importorskip('numba')
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', 'numba')
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k))
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', 'sympy')
+    ref_sys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k))
+    y = np.random.random(len(k)+1)
+    for attr in ('f_cb', 'j_cb', 'dfdx_cb'):
+        assert np.allclose(getattr(odesys, attr)(0.5, y, k),
+                           getattr(ref_sys, attr)(0.5, y, k))
+    Y = np.random.random((5, len(k)+1))
+    P = np.random.random((5, len(k)))
+    for attr in ('f_batch_cb', 'j_batch_cb'):
+        assert np.allclose(getattr(odesys, attr)(0.5, Y, P),
+                           getattr(ref_sys, attr)(0.5, Y, P))
+
+    y0 = [1, 0, 0, 0]
+    xout, yout, info = odesys.integrate([0, 1], y0, k, integrator='scipy')
+    ref = np.array(bateman_full(y0, k+[0], xout - xout[0], exp=np.exp)).T
+    assert info['success']
+    assert np.allclose(yout, ref)
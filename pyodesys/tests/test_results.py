@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pytest
+
+from .. import OdeSys, Result
+from .test_core import vdp_f, vdp_j
+
+
+def test_Result():
+    odes = OdeSys(vdp_f, vdp_j)
+    result = odes.integrate([0, 1, 2], [1, 0], params=[2.0],
+                            integrator='scipy')
+    assert isinstance(result, Result)
+    xout, yout, info = result
+    assert xout is result.xout and yout is result.yout
+    assert result[2] is info
+    assert result.internal_yout.shape == (3, 2)
+    assert np.allclose(result.internal_params, [2.0])
+    with pytest.raises(AttributeError):
+        result.xout = None
+    with pytest.raises(AttributeError):
+        result.foo = 42
+    assert not hasattr(odes, 'internal_yout')
+
+
+def test_Result_stiffness():
+    odes = OdeSys(vdp_f, vdp_j)
+    result = odes.integrate([0, 1, 2], [1, 0], params=[2.0])
+    ratios = result.stiffness()
+    assert ratios.shape == (3,)
+    assert np.allclose(ratios, odes.stiffness((result.xout, result.yout,
+                                               result.params)))
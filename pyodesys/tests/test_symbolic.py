@@ -3,6 +3,7 @@
 from __future__ import print_function, absolute_import, division
 
 import math
+import os
 
 import numpy as np
 import sympy as sp
@@ -404,6 +405,33 @@ def test_PartiallySolvedSystem():
     assert np.allclose(yout, ref)
 
 
+@pytest.mark.parametrize('xout', [[0, 1], np.linspace(0, 1, 17)])
+def test_PartiallySolvedSystem__sink(tmpdir, xout):
+    odesys = SymbolicSys.from_callback(
+        lambda x, y, p: [
+            -p[0]*y[0],
+            p[0]*y[0] - p[1]*y[1],
+            p[1]*y[1] - p[2]*y[2]
+        ], 3, 3)
+    dep0 = odesys.dep[0]
+    partsys = PartiallySolvedSystem(odesys, lambda x0, y0, p0: {
+        dep0: y0[0]*sp.exp(-p0[0]*(odesys.indep-x0))
+    })
+    y0 = [3, 2, 1]
+    k = [3.5, 2.5, 1.5]
+    for integrator in ['scipy', 'solve_ivp']:
+        ref = partsys.integrate(xout, y0, k, integrator=integrator)
+        fname = str(tmpdir.join('yout_%s.dat' % integrator))
+        result = partsys.integrate(xout, y0, k, integrator=integrator,
+                                   sink=fname, chunk_size=5)
+        assert result.yout.shape == ref.yout.shape == (len(ref.xout), 3)
+        assert np.allclose(result.yout, ref.yout)
+        buf = np.zeros((500, 3))
+        result = partsys.integrate(xout, y0, k, integrator=integrator,
+                                   sink=buf)
+        assert np.allclose(buf[:len(ref.xout)], ref.yout)
+
+
 def test_PartiallySolvedSystem__using_y():
     odesys = SymbolicSys.from_callback(
         lambda x, y, p: [
@@ -437,3 +465,408 @@ def test_SymbolicSys_from_other():
     assert np.allclose(ref, analytic)
     yout, nfo0 = transformed_scaled.predefined(y0, tout+1)
     assert np.allclose(yout, analytic)
+
+
+def test_TransformedSys_integrate_batch():
+    k = [7., 3, 2]
+    ts = symmetricsys(logexp, logexp).from_callback(
+        decay_rhs, len(k)+1, len(k))
+    Y0 = np.array([[1, 1e-20, 1e-20, 1e-20], [2, 1, 1e-20, 1e-20]])
+    tout = np.logspace(-12, 0, 7)
+    xout, yout, info = ts.integrate_batch(
+        tout, Y0, k, integrator='scipy', atol=1e-8, rtol=1e-8)
+    assert yout.shape == (2, 7, 4)
+    for y0, x, y in zip(Y0, xout, yout):
+        ref = np.array(bateman_full(y0, k+[0], x - x[0], exp=np.exp)).T
+        assert np.allclose(y, ref, rtol=1e-6, atol=1e-6)
+
+
+def test_PartiallySolvedSystem_integrate_batch():
+    odesys = SymbolicSys.from_callback(
+        lambda x, y, p: [
+            -p[0]*y[0],
+            p[0]*y[0] - p[1]*y[1],
+            p[1]*y[1] - p[2]*y[2]
+        ], 3, 3)
+    dep0 = odesys.dep[0]
+    partsys = PartiallySolvedSystem(odesys, lambda x0, y0, p0: {
+        dep0: y0[0]*sp.exp(-p0[0]*(odesys.indep-x0))
+    })
+    Y0 = [[3, 2, 1], [1, 2, 3]]
+    K = [[3.5, 2.5, 1.5], [1.5, 2.5, 3.5]]
+    xout, yout, info = partsys.integrate_batch(
+        np.linspace(0, 1, 9), Y0, K, integrator='scipy')
+    assert yout.shape == (2, 9, 3)
+    for x, y, y0, k in zip(xout, yout, Y0, K):
+        ref = np.array(bateman_full(y0, k, x - x[0], exp=np.exp)).T
+        assert np.allclose(y, ref)
+
+
+def test_SymbolicSys_integrate_batch__process_pool():
+    k = [7., 3, 2]
+    ss = ScaledSys.from_callback(decay_rhs, len(k)+1, len(k), dep_scaling=7)
+    Y0 = np.array([[1, .1, .2, .3], [2, 1, .5, .1], [.2, .3, 3, 1]])
+    tout = np.linspace(0, 1, 5)
+    xout, yout, info = ss.integrate_batch(
+        tout, Y0, k, executor='process', nworkers=2, integrator='scipy')
+    for y0, x, y in zip(Y0, xout, yout):
+        ref = np.array(bateman_full(y0, k+[0], x - x[0], exp=np.exp)).T
+        assert np.allclose(y, ref)
+
+
+def test_SymbolicSys__worker_recipe__lazy():
+    odesys = SymbolicSys.from_callback(decay_rhs, 3, 2)
+    key, recipe = odesys._worker_recipe()
+    assert odesys._jac is True
+    assert recipe.keywords['jac'] is True
+    odesys.get_jac()
+    key2, recipe2 = odesys._worker_recipe()
+    assert key2 != key
+    assert len(recipe2.keywords['jac']) == 3
+    assert odesys._worker_recipe()[0] == key2
+
+
+@pytest.mark.parametrize('band', [None, (1, 0)])
+def test_SymbolicSys_batch_callbacks(band):
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       band=band)
+    Y = np.random.random((5, len(k)+1))
+    P = np.random.random((5, len(k)))
+    x = np.linspace(0, 1, 5)
+    for cb, batch_cb in [(odesys.f_cb, odesys.f_batch_cb),
+                         (odesys.j_cb, odesys.j_batch_cb),
+                         (odesys.dfdx_cb, odesys.dfdx_batch_cb)]:
+        out = batch_cb(x, Y, P)
+        ref = np.array([cb(x[i], Y[i], P[i]) for i in range(5)])
+        assert out.shape == ref.shape
+        assert np.allclose(out, ref)
+    assert np.allclose(odesys.f_batch_cb(0, Y, k),
+                       [decay_rhs(0, y, k) for y in Y])
+
+
+@pytest.mark.parametrize('band', [None, (1, 0)])
+def test_SymbolicSys_fused(band):
+    from pyodesys.integrators import Rosenbrock23
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       band=band, fused=True)
+    y = np.random.random(len(k)+1)
+    f, j, dfdx = odesys.fj_cb(0.5, y, k)
+    assert np.allclose(f, odesys.f_cb(0.5, y, k))
+    assert np.allclose(j, odesys.j_cb(0.5, y, k))
+    assert np.allclose(dfdx, odesys.dfdx_cb(0.5, y, k))
+    assert SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k)).fj_cb is None
+
+    y0 = [1, 0, 0, 0]
+    xout = np.linspace(0, 1, 7)
+    yout, info = odesys.predefined(y0, xout, k, integrator=Rosenbrock23,
+                                   atol=1e-9, rtol=1e-9)
+    ref = np.array(bateman_full(y0, k+[0], xout - xout[0], exp=np.exp)).T
+    assert np.allclose(yout, ref, atol=1e-6)
+
+
+def test_SymbolicSys__banded_Rosenbrock23():
+    from pyodesys.integrators import Rosenbrock23
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       band=(1, 0))
+    y0 = [1, 0, 0, 0]
+    xout, yout, info = odesys.integrate(1, y0, k, integrator=Rosenbrock23,
+                                        atol=1e-9, rtol=1e-9)
+    assert info['success']
+    ref = np.array(bateman_full(y0, k+[0], xout - xout[0], exp=np.exp)).T
+    assert np.allclose(yout, ref, atol=1e-6)
+
+
+def test_SymbolicSys__many_unknowns():
+    n = 600  # more arguments than sympy.lambdify could unpack (Python < 3.7)
+    odesys = SymbolicSys.from_callback(decay_rhs, n, n-1, jac=False)
+    assert odesys.lambdify_array
+    k = np.random.random(n-1)
+    y = np.random.random(n)
+    assert np.allclose(odesys.f_cb(0, y, k), decay_rhs(0, y, k))
+    Y = np.random.random((3, n))
+    assert np.allclose(odesys.f_batch_cb(0, Y, k),
+                       [decay_rhs(0, y, k) for y in Y])
+    xout, yout, info = odesys.integrate([0, 1], np.ones(n), k,
+                                        integrator='scipy')
+    assert info['success']
+
+
+@pytest.mark.parametrize('backend', ['sympy', 'symengine', 'numba'])
+def test_SymbolicSys__inplace_callback(backend, monkeypatch, tmpdir):
+    if backend != 'sympy':
+        pytest.importorskip(backend)
+    monkeypatch.setenv('PYODESYS_CACHE_DIR', str(tmpdir))
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', backend)
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       fused=True)
+    y = np.random.random(len(k)+1)
+    f, jac, dfdx = [np.empty(len(k)+1), np.empty((len(k)+1,)*2, order='F'),
+                    np.empty(len(k)+1)]
+    odesys._inplace_callback('f', k)(0.5, y, f)
+    odesys._inplace_callback('j', k)(0.5, y, jac)  # not C-contiguous
+    odesys._inplace_callback('dfdx', k)(0.5, y, dfdx)
+    assert np.allclose(f, odesys.f_cb(0.5, y, k))
+    assert np.allclose(jac, odesys.j_cb(0.5, y, k))
+    assert np.allclose(dfdx, odesys.dfdx_cb(0.5, y, k))
+    jac2, dfdx2 = np.empty_like(jac), np.empty_like(dfdx)
+    odesys._inplace_callback('fj', k)(0.5, y, None, jac2, dfdx2)
+    assert np.allclose(jac2, jac) and np.allclose(dfdx2, dfdx)
+
+
+@pytest.mark.parametrize('band', [None, (1, 0)])
+def test_SymbolicSys__symengine_backend(band, monkeypatch):
+    pytest.importorskip('symengine')
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', 'symengine')
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       band=band)
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', 'sympy')
+    ref_sys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                        band=band)
+    y = np.random.random(len(k)+1)
+    for attr in ('f_cb', 'j_cb', 'dfdx_cb'):
+        assert np.allclose(getattr(odesys, attr)(0.5, y, k),
+                           getattr(ref_sys, attr)(0.5, y, k))
+    Y = np.random.random((5, len(k)+1))
+    P = np.random.random((5, len(k)))
+    for attr in ('f_batch_cb', 'j_batch_cb', 'dfdx_batch_cb'):
+        assert np.allclose(getattr(odesys, attr)(0.5, Y, P),
+                           getattr(ref_sys, attr)(0.5, Y, P))
+
+    y0 = [1, 0, 0, 0]
+    xout, yout, info = odesys.integrate([0, 1], y0, k, integrator='scipy')
+    ref = np.array(bateman_full(y0, k+[0], xout - xout[0], exp=np.exp)).T
+    assert info['success']
+    assert np.allclose(yout, ref)
+
+
+def test_TransformedSys_dense_output():
+    k = [7., 3, 2]
+    ts = symmetricsys(logexp, logexp).from_callback(
+        decay_rhs, len(k)+1, len(k))
+    y0 = [1, 1e-3, 1e-3, 1e-3]
+    result = ts.integrate([1e-6, 1], y0, k, integrator='scipy',
+                          dense_output=True, atol=1e-10, rtol=1e-10)
+    x = np.linspace(1e-3, 1, 31)
+    ref = np.array(bateman_full(y0, k+[0], x - 1e-6, exp=np.exp)).T
+    assert np.allclose(result.dense_output(x), ref, rtol=1e-6, atol=1e-8)
+
+
+def test_SymbolicSys__lazy():
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       registry=False)
+    assert odesys._jac is True  # not derived yet
+    xout, yout, info = odesys.integrate(1, [1, 0, 0, 0], k,
+                                        integrator='scipy', name='dopri5')
+    assert info['success']
+    assert odesys._jac is True  # explicit stepper: no jacobian needed
+    assert odesys.warmup() is odesys
+    assert odesys._jac is not True
+    assert np.allclose(odesys.j_cb(0, yout[-1], k), odesys.j_batch_cb(
+        0, yout[-1:], [k])[0])
+
+
+@pytest.mark.parametrize('backend', ['sympy', 'symengine', 'numba'])
+def test_SymbolicSys__cache(backend, monkeypatch, tmpdir):
+    if backend != 'sympy':
+        pytest.importorskip(backend)
+    from ..cache import DiskCache
+    monkeypatch.setenv('PYODESYS_CACHE_DIR', str(tmpdir))
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', backend)
+    cache = DiskCache()
+    tmpdir = tmpdir.join('objects')
+    k = [7., 3, 2]
+    ref = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                    cache=cache, registry=False).warmup()
+    nentries = len(os.listdir(str(tmpdir)))
+    assert nentries > 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("symbolic work on warm start")
+    monkeypatch.setattr(SymbolicSys, '_dump_lambdified', fail)
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       cache=cache, registry=False).warmup()
+    assert len(os.listdir(str(tmpdir))) == nentries  # nothing rebuilt
+    y = np.random.random(len(k)+1)
+    for attr in ('f_cb', 'j_cb', 'dfdx_cb'):
+        assert np.allclose(getattr(odesys, attr)(0.5, y, k),
+                           getattr(ref, attr)(0.5, y, k))
+    xout, yout, info = odesys.integrate(1, [1, 0, 0, 0], k,
+                                        integrator='scipy')
+    assert info['success']
+
+
+def test_SymbolicSys__registry():
+    from ..cache import MemoryCache
+    registry = MemoryCache()
+    k = [7., 3, 2]
+    ori = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                    registry=registry).warmup()
+    assert registry.stats['hits'] == 0
+    nentries = registry.stats['entries']
+    other = SymbolicSys.from_other(ori, registry=registry).warmup()
+    assert registry.stats['hits'] == nentries
+    assert other._jac is True  # shared callbacks: no need to derive
+    assert other._lambdified['j'] is ori._lambdified['j']
+    y = np.random.random(len(k)+1)
+    assert np.allclose(other.j_cb(0, y, k), ori.j_cb(0, y, k))
+    SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k), registry=registry,
+                              lambdify=sp.lambdify).f_cb
+    assert registry.stats['entries'] == nentries + 1  # other lambdify
+    dep0 = ori.dep[0]
+    partsys1, partsys2 = [PartiallySolvedSystem(
+        ori, lambda x0, y0, p0: {dep0: y0[0]*sp.exp(-p0[0]*(ori.indep-x0))},
+        registry=registry) for _ in range(2)]
+    assert partsys1.f_cb is not partsys2.f_cb
+    assert partsys1._lambdified['f'] is partsys2._lambdified['f']  # dummies
+    registry.max_size = registry.size - 1
+    SymbolicSys.from_callback(decay_rhs, len(k), len(k)-1,
+                              registry=registry).f_cb
+    assert registry.stats['evictions'] > 0
+    assert registry.size <= registry.max_size
+
+
+@pytest.mark.parametrize('backend', ['sympy', 'symengine'])
+def test_SymbolicSys__sparse(backend, monkeypatch):
+    if backend != 'sympy':
+        pytest.importorskip(backend)
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', backend)
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       sparse=True)
+    colptrs, rowvals = odesys.sparsity
+    assert colptrs.tolist() == [0, 2, 4, 6, 6]
+    assert rowvals.tolist() == [0, 1, 1, 2, 2, 3]
+    y = np.random.random(len(k)+1)
+    data = odesys.j_csc_cb(0, y, k)
+    from scipy.sparse import csc_matrix
+    jac = csc_matrix((data, rowvals, colptrs), shape=(len(y),)*2)
+    assert np.allclose(jac.toarray(), odesys.j_cb(0, y, k))
+    assert SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k)).sparsity \
+        is None
+
+    y0 = [1, 0, 0, 0]
+    xout = np.linspace(0, 1, 7)
+    for method in ('BDF', 'Radau'):
+        yout, info = odesys.predefined(y0, xout, k, integrator='solve_ivp',
+                                       method=method, atol=1e-10, rtol=1e-10)
+        assert info['success'] and info['njev'] > 0
+        ref = np.array(bateman_full(y0, k+[0], xout, exp=np.exp)).T
+        assert np.allclose(yout, ref, atol=1e-7)
+    with pytest.raises(ValueError):
+        SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k), sparse=True,
+                                  band=(1, 0))
+
+
+def test_SymbolicSys__reorder():
+    k = [7., 3, 2, 5, 4]
+    n = len(k) + 1
+    scramble = [3, 0, 5, 1, 4, 2]
+    inverse = np.argsort(scramble)
+
+    def f(t, y, p):
+        return [decay_rhs(t, [y[i] for i in inverse], p)[i] for i in scramble]
+
+    odesys = SymbolicSys.from_callback(f, n, len(k), reorder=True)
+    assert odesys.band in [(1, 0), (0, 1)]
+    assert odesys.get_jac().shape == (2, n)  # packed
+    assert SymbolicSys.from_other(odesys).band == odesys.band
+    y0 = np.array([1., 0, 0, 0, 0, 0])
+    xout = np.linspace(0, 1, 7)
+    yout, info = odesys.predefined(y0[scramble], xout, k, integrator='scipy',
+                                   atol=1e-10, rtol=1e-10)
+    ref = np.array(bateman_full(y0, k+[0], xout, exp=np.exp)).T
+    assert np.allclose(yout, ref[:, scramble], atol=1e-7)
+    with pytest.raises(ValueError):
+        SymbolicSys.from_callback(f, n, len(k), reorder=True, band=(1, 0))
+
+
+def test_SymbolicSys__reorder__banded():
+    def f(t, y, p):  # tridiagonal chain, already banded
+        return [(y[i-1] if i > 0 else 0) - 2*y[i] +
+                (y[i+1] if i < len(y) - 1 else 0) for i in range(len(y))]
+
+    odesys = SymbolicSys.from_callback(f, 6, reorder=True)
+    assert odesys.permutation is None
+    assert odesys.band == (1, 1)
+    assert not odesys.pre_processors and not odesys.post_processors
+
+
+@pytest.mark.parametrize('backend', ['sympy', 'symengine'])
+def test_SymbolicSys__jv(backend, monkeypatch):
+    from pyodesys.integrators import RosenbrockKrylov
+    if backend != 'sympy':
+        pytest.importorskip(backend)
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', backend)
+    k = [7., 3, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k))
+    y, v = np.random.random(len(k)+1), np.random.random(len(k)+1)
+    assert np.allclose(odesys.jv_cb(0.5, y, v, k),
+                       odesys.j_cb(0.5, y, k).dot(v))
+    out = np.empty(len(k)+1)
+    odesys._inplace_callback('jv', k)(0.5, y, v, out)
+    assert np.allclose(out, odesys.j_cb(0.5, y, k).dot(v))
+
+    y0 = [1, 0, 0, 0]
+    xout = np.linspace(0, 1, 7)
+    ref = np.array(bateman_full(y0, k+[0], xout, exp=np.exp)).T
+    nlin = []
+    for prec in [None, odesys.get_band_preconditioner(1, 0),
+                 odesys.get_band_preconditioner(1, 1, block_size=2)]:
+        yout, info = odesys.predefined(y0, xout, k, atol=1e-9, rtol=1e-9,
+                                       integrator=RosenbrockKrylov,
+                                       preconditioner=prec)
+        assert info['success']
+        assert np.allclose(yout, ref, atol=1e-6)
+        nlin.append(info['n_lin_iters'])
+    assert nlin[1] <= 3*info['n_steps']  # exact: one iteration per stage
+    assert nlin[1] < nlin[2] < nlin[0]
+
+
+@pytest.mark.parametrize('backend', ['sympy', 'symengine'])
+def test_SymbolicSys__specialize(backend, monkeypatch):
+    if backend != 'sympy':
+        pytest.importorskip(backend)
+    monkeypatch.setenv('PYODESYS_SYM_BACKEND', backend)
+    k = [7., 0, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k),
+                                       sparse=True)
+    spec = odesys.specialize(k)
+    assert spec is odesys.specialize(np.array(k))
+    assert len(spec.params) == 0
+    assert len(spec.sparsity[1]) < len(odesys.sparsity[1])  # k[1] == 0
+    y0 = [1, 0, 0, 0]
+    xout = np.linspace(0, 1, 7)
+    ref, _ = odesys.predefined(y0, xout, k, atol=1e-10, rtol=1e-10)
+    yout, info = spec.predefined(y0, xout, atol=1e-10, rtol=1e-10)
+    assert np.allclose(yout, ref, atol=1e-7)
+
+    odesys.get_jac()  # substituted rather than derived again
+    part = odesys.specialize({odesys.params[1]: 0})
+    assert part is odesys.specialize({1: 0.0})
+    assert part is odesys.specialize({np.int64(1): 0.0})
+    assert list(part.params) == [odesys.params[0], odesys.params[2]]
+    assert part._jac is not True
+    yout, info = part.predefined(y0, xout, [k[0], k[2]], atol=1e-10,
+                                 rtol=1e-10)
+    assert np.allclose(yout, ref, atol=1e-7)
+
+
+def test_PartiallySolvedSystem__specialize():
+    k = [7., 0, 2]
+    odesys = SymbolicSys.from_callback(decay_rhs, len(k)+1, len(k))
+    dep0 = odesys.dep[0]
+    partsys = PartiallySolvedSystem(odesys, lambda x0, y0, p0: {
+        dep0: y0[0]*sp.exp(-p0[0]*(odesys.indep-x0))})
+    spec = partsys.specialize({1: 0})
+    y0 = [1, 0, 0, 0]
+    xout = np.linspace(0, 1, 7)
+    yout, info = spec.predefined(y0, xout, [k[0], k[2]])
+    assert np.allclose(yout, partsys.predefined(y0, xout, k)[0])
+    xb, yb, info = spec.integrate_batch(xout, [y0, y0], [[k[0], k[2]]]*2)
+    assert np.allclose(yb[1], yout)
@@ -1,7 +1,15 @@
 from __future__ import absolute_import
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import sympy as sp
+
 from ..symbolic import SymbolicSys
-from ..util import banded_jacobian
+from ..util import (
+    banded_jacobian, group_columns, reverse_cuthill_mckee, sparse_jacobian
+)
 from .test_symbolic import decay_dydt_factory
 
 
@@ -15,3 +23,43 @@ def test_banded_jacobian():
         [-k[0], -k[1], 0],
         [k[0], k[1], 0],
     ]
+
+
+@pytest.mark.parametrize('executor', [None, 'thread', 'process'])
+def test_sparse_jacobian(executor):
+    k = [4, 3, 2, 1]
+    odesys = SymbolicSys.from_callback(decay_dydt_factory(k), len(k)+1)
+    ref = sp.Matrix(odesys.exprs).jacobian(odesys.dep)
+    if executor == 'thread':
+        executor = ThreadPoolExecutor(2)
+    jac = sparse_jacobian(odesys.exprs, odesys.dep, executor, nworkers=2)
+    assert sp.Matrix(jac) == ref
+    assert sum(1 for row in jac for elem in row if elem != 0) == 2*len(k)
+
+
+def test_reverse_cuthill_mckee():
+    n = 12
+    x = sp.symbols('x:%d' % n)
+    y = [-2*x[i] + (x[i-1] if i > 0 else 0) + (x[i+1] if i < n-1 else 0)
+         for i in range(n)]  # tridiagonal jacobian
+    scramble = [5, 0, 9, 3, 11, 7, 1, 10, 2, 8, 4, 6]
+    perm, band = reverse_cuthill_mckee([y[i] for i in scramble],
+                                       [x[i] for i in scramble])
+    assert sorted(perm) == list(range(n))
+    assert band == (1, 1)
+    assert reverse_cuthill_mckee(y[:1], x[:1]) == ([0], (0, 0))
+    assert reverse_cuthill_mckee(y, x) == (list(range(n)), (1, 1))
+
+
+def test_group_columns():
+    n, ml, mu = 10, 2, 1
+    rows = [list(range(max(0, ci - mu), min(n, ci + ml + 1)))
+            for ci in range(n)]
+    colptrs = np.cumsum([0] + [len(r) for r in rows])
+    rowvals = np.concatenate(rows)
+    groups = group_columns(colptrs, rowvals)
+    assert len(groups) == ml + mu + 1
+    assert sorted(np.concatenate(groups).tolist()) == list(range(n))
+    for group in groups:
+        covered = np.concatenate([rows[ci] for ci in group])
+        assert len(set(covered)) == len(covered)  # structurally orthogonal
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import (absolute_import, division, print_function)
 
+import multiprocessing
+import os
 
 import numpy as np
 import inspect
@@ -46,11 +48,214 @@ def banded_jacobian(y, x, ml, mu):
         packed[ri-ci+mu, ci] = val
 
     for ri in range(ny):
+        free = _free_symbols(y[ri], x)
         for ci in range(max(0, ri-ml), min(nx, ri+mu+1)):
-            set(ri, ci, y[ri].diff(x[ci]))
+            if x[ci] in free:
+                set(ri, ci, y[ri].diff(x[ci]))
     return packed
 
 
+def _free_symbols(expr, x):
+    """ Symbols ``expr`` may depend upon (all of ``x`` if unknown) """
+    if hasattr(expr, 'free_symbols'):
+        return expr.free_symbols
+    return x if hasattr(expr, 'diff') else ()
+
+
+def _jacobian_rows(y, x):
+    index = dict((xi, ci) for ci, xi in enumerate(x))
+    rows = []
+    for expr in y:
+        row = [0]*len(x)
+        for xi in _free_symbols(expr, x):
+            ci = index.get(xi, None)
+            if ci is not None:
+                row[ci] = expr.diff(xi)
+        rows.append(row)
+    return rows
+
+
+def sparse_jacobian(y, x, executor=None, nworkers=None):
+    """ Calculates the jacobian, differentiating only the entries which may
+    be non-zero (i.e. ``x[ci]`` among the ``free_symbols`` of ``y[ri]``),
+    i.e. O(nnz) rather than O(len(y)*len(x)) derivatives.
+
+    Parameters
+    ----------
+    y: array_like of expressions
+    x: array_like of symbols
+    executor: None, str or ``concurrent.futures.Executor`` instance
+        How to distribute the rows (in chunks):
+            - None: in the calling thread
+            - 'process': a new ``ProcessPoolExecutor`` is used (its
+              workers are started with 'spawn').
+            - ``Executor`` instance: e.g. a reused process pool (the
+              expressions need to be picklable).
+    nworkers: int (default: None)
+        Number of workers (default: number of CPUs).
+
+    Returns
+    -------
+    List of rows (lists of length ``len(x)``, zero entries are ``0``).
+
+    Examples
+    --------
+    >>> import sympy as sp
+    >>> x, y = sp.symbols('x y')
+    >>> sparse_jacobian([x*y, 2*y], [x, y])
+    [[y, x], [0, 2]]
+
+    """
+    y, x = list(y), list(x)
+    if executor is None:
+        return _jacobian_rows(y, x)
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    if executor == 'process':
+        with _process_pool(nworkers) as pool:
+            return sparse_jacobian(y, x, pool, nworkers)
+    elif isinstance(executor, str):
+        raise ValueError("Unknown executor: %s" % executor)
+    chunksize = max(1, len(y) // (4*nworkers))
+    futures = [executor.submit(_jacobian_rows, y[i:i+chunksize], x)
+               for i in range(0, len(y), chunksize)]
+    return [row for future in futures for row in future.result()]
+
+
+def _process_pool(nworkers):
+    """ ``ProcessPoolExecutor`` starting its workers with 'spawn' (forking is
+    unsafe once e.g. numba's workqueue threading layer has been used, see
+    ``parallel`` in :class:`pyodesys.native.NumbaLambdify`). """
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(
+        nworkers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def group_columns(colptrs, rowvals, nrows=None):
+    """ Groups of structurally orthogonal columns (no two columns of a group
+    share a row), e.g. for estimating a sparse jacobian with one difference
+    per group (Curtis, Powell & Reid, greedy in column order).
+
+    Parameters
+    ----------
+    colptrs: array_like of ints
+    rowvals: array_like of ints
+        sparsity pattern in compressed sparse column format
+    nrows: int (default: number of columns)
+
+    Returns
+    -------
+    List of int arrays (column indices)
+
+    Examples
+    --------
+    >>> [g.tolist() for g in group_columns([0, 2, 5, 8, 10],
+    ...                                    [0, 1, 0, 1, 2, 1, 2, 3, 2, 3])]
+    [[0, 3], [1], [2]]
+
+    """
+    ncols = len(colptrs) - 1
+    if nrows is None:
+        nrows = ncols
+    used, groups = [], []  # rows covered by each group
+    for ci in range(ncols):
+        rows = np.asarray(rowvals[colptrs[ci]:colptrs[ci+1]], dtype=int)
+        for gi in range(len(groups)):
+            if not used[gi][rows].any():
+                break
+        else:
+            gi = len(groups)
+            used.append(np.zeros(nrows, dtype=bool))
+            groups.append([])
+        used[gi][rows] = True
+        groups[gi].append(ci)
+    return [np.array(group, dtype=int) for group in groups]
+
+
+def _levels(neighbours, root):
+    """ Level structure of the component of ``root`` (breadth first) """
+    levels, seen = [[root]], set([root])
+    while True:
+        level = sorted(set(nb for node in levels[-1] for nb in
+                           neighbours[node]) - seen)
+        if not level:
+            return levels
+        seen.update(level)
+        levels.append(level)
+
+
+def reverse_cuthill_mckee(y, x):
+    """ Ordering of ``x`` minimising the bandwidth of the jacobian of ``y``
+    (reverse Cuthill-McKee on the structure, i.e. ``free_symbols``).
+
+    Parameters
+    ----------
+    y: array_like of expressions
+    x: array_like of symbols
+
+    Returns
+    -------
+    perm: list of int
+        ``perm[i]`` is the index of the i:th variable in the new ordering
+        (the given ordering unless the reordered jacobian is narrower)
+    band: pair of ints
+        number of lower and upper bands of the reordered jacobian
+        (``(ml, mu)`` as in :func:`banded_jacobian`)
+
+    Examples
+    --------
+    >>> import sympy as sp
+    >>> a, b, c = sp.symbols('a b c')
+    >>> reverse_cuthill_mckee([-a + c, -b, -c + b], [a, b, c])
+    ([1, 2, 0], (1, 0))
+
+    """
+    x = list(x)
+    n = len(x)
+    index = dict((xi, ci) for ci, xi in enumerate(x))
+    entries = [(ri, ci) for ri, expr in enumerate(y) for ci in (
+        index.get(xi, None) for xi in _free_symbols(expr, x))
+        if ci is not None and ci != ri]
+    neighbours = [set() for _ in range(n)]
+    for ri, ci in entries:
+        neighbours[ri].add(ci)
+        neighbours[ci].add(ri)
+    degree = [len(nbs) for nbs in neighbours]
+
+    order, visited = [], [False]*n
+    for start in sorted(range(n), key=lambda i: (degree[i], i)):
+        if visited[start]:
+            continue
+        levels = _levels(neighbours, start)
+        while True:  # pseudo-peripheral starting node (George & Liu)
+            candidate = min(levels[-1], key=lambda i: (degree[i], i))
+            candidate_levels = _levels(neighbours, candidate)
+            if len(candidate_levels) <= len(levels):
+                break
+            start, levels = candidate, candidate_levels
+        visited[start] = True
+        component = [start]
+        for node in component:  # (grows while iterating)
+            for nb in sorted(neighbours[node], key=lambda i: (degree[i], i)):
+                if not visited[nb]:
+                    visited[nb] = True
+                    component.append(nb)
+        order.extend(component)
+    perm = order[::-1]
+    band, given = _bandwidth(entries, perm), _bandwidth(entries, range(n))
+    if sum(given) <= sum(band):
+        return list(range(n)), given
+    return perm, band
+
+
+def _bandwidth(entries, perm):
+    """ (ml, mu) of the structure ``entries`` (row, col) reordered by perm """
+    new_index = dict((old, new) for new, old in enumerate(perm))
+    ml = max([new_index[ri] - new_index[ci] for ri, ci in entries] + [0])
+    mu = max([new_index[ci] - new_index[ri] for ri, ci in entries] + [0])
+    return ml, mu
+
+
 def check_transforms(fw, bw, symbs):
     """ Verify validity of a pair of forward and backward transformations
 
@@ -138,16 +343,28 @@ def ensure_3args(func):
     Parameters
     ----------
     func: callable
-        with two or three positional arguments
+        with two or three positional arguments (additional arguments
+        need default values)
 
     Returns
     -------
     callable which possibly ignores a third positional argument
     """
-    nargs = len(inspect.getargspec(func)[0])
+    argspec = inspect.getargspec(func)
+    nargs, ndefaults = len(argspec[0]), len(argspec[3] or ())
     if nargs == 2:
         return lambda x, y, _ignored: func(x, y)
-    elif nargs == 3:
+    elif nargs == 3 or (nargs > 3 and nargs - ndefaults <= 3):
         return func
     else:
         raise NotImplementedError
+
+
+def get_cache_dir():
+    """ Directory for compiled modules & cached data
+    (``$PYODESYS_CACHE_DIR``) """
+    path = os.environ.get('PYODESYS_CACHE_DIR', os.path.join(
+        os.path.expanduser('~'), '.cache', 'pyodesys'))
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path